@@ -0,0 +1,57 @@
+"""
+Compares the reduce based kg id extraction Overlay and Question.yank used to do with BindingIndex, for growing
+numbers of answers. No neo4j needed, from the KITCHEN directory:
+
+    python PLATER/benchmarks/binding_benchmark.py
+"""
+import argparse
+import time
+from functools import reduce
+
+from PLATER.services.util.binding_index import BindingIndex
+
+
+def make_answers(count):
+    return [{
+        'node_bindings': [{'qg_id': 'n0', 'kg_id': f'CURIE:{i}'},
+                          {'qg_id': 'n1', 'kg_id': [f'CURIE:{i + 1}', f'CURIE:{i + 2}']}],
+        'edge_bindings': [{'qg_id': 'e0', 'kg_id': [f'edge_{i}', f'edge_{i + 1}']}]
+    } for i in range(count)]
+
+
+def reduce_node_ids(answers):
+    # how node ids used to be pulled out of answers, concatenating lists makes this quadratic.
+    return set(
+        reduce(lambda a, b: a + b,
+               map(lambda node_binding: node_binding['kg_id']
+                   if isinstance(node_binding['kg_id'], list) else [node_binding['kg_id']],
+                   reduce(lambda a, b: a + b, map(lambda ans: ans['node_bindings'], answers), [])), []))
+
+
+def time_call(call):
+    start = time.perf_counter()
+    result = call()
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark kg id extraction from answers.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000, 1000000])
+    parser.add_argument('--reduce-limit', type=int, default=20000,
+                        help='skip the reduce based version above this many answers, it takes too long.')
+    args = parser.parse_args()
+    for size in args.sizes:
+        answers = make_answers(size)
+        index_time, index = time_call(lambda: BindingIndex(answers))
+        line = f'{size:>8} answers  binding index {index_time * 1000:10.2f} ms'
+        if size <= args.reduce_limit:
+            reduce_time, node_ids = time_call(lambda: reduce_node_ids(answers))
+            assert node_ids == index.node_ids
+            line += f'  reduce {reduce_time * 1000:10.2f} ms'
+        else:
+            line += '  reduce    skipped'
+        print(line)
+
+
+if __name__ == '__main__':
+    main()
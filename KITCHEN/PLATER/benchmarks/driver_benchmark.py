@@ -0,0 +1,81 @@
+"""
+Compares the http and bolt drivers on node, hop and query workloads.
+
+Needs a neo4j with some data in it, eg. a local container:
+
+    docker run -p 7474:7474 -p 7687:7687 --env NEO4J_AUTH=neo4j/pass neo4j:3.5
+
+and the neo4j package for the bolt driver (`pip install neo4j`). Then, from the KITCHEN directory:
+
+    python PLATER/benchmarks/driver_benchmark.py --host localhost --password pass
+"""
+import argparse
+import asyncio
+import time
+
+from PLATER.services.util.bolt_driver import Neo4jBoltDriver
+from PLATER.services.util.graph_adapter import GraphInterface, Neo4jHTTPDriver
+from PLATER.services.util.question import Question
+
+
+async def time_workload(name, make_call, iterations, concurrency):
+    limiter = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def timed():
+        async with limiter:
+            start = time.perf_counter()
+            await make_call()
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[timed() for _ in range(iterations)])
+    total = time.perf_counter() - start
+    latencies.sort()
+    print(f'  {name:<6} {iterations / total:8.1f} req/s  '
+          f'p50 {latencies[len(latencies) // 2] * 1000:8.2f} ms  '
+          f'p99 {latencies[int(len(latencies) * 0.99)] * 1000:8.2f} ms')
+
+
+async def run_benchmark(graph_interface, iterations, concurrency):
+    node = (await graph_interface.get_examples('named_thing'))[0]
+    node_type, curie = 'named_thing', node['id']
+    question = {
+        'query_graph': {
+            'nodes': [{'id': 'n0', 'type': node_type, 'curie': curie}, {'id': 'n1', 'type': 'named_thing'}],
+            'edges': [{'id': 'e0', 'source_id': 'n0', 'target_id': 'n1'}]
+        }
+    }
+    await time_workload('node', lambda: graph_interface.get_node(node_type, curie), iterations, concurrency)
+    await time_workload('hop', lambda: graph_interface.get_single_hops(node_type, 'named_thing', curie),
+                        iterations, concurrency)
+    await time_workload('query', lambda: Question(question).answer(graph_interface), iterations, concurrency)
+    await graph_interface.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark neo4j http and bolt drivers.')
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--http-port', type=int, default=7474)
+    parser.add_argument('--bolt-port', type=int, default=7687)
+    parser.add_argument('--user', default='neo4j')
+    parser.add_argument('--password', default='neo4j')
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=16)
+    args = parser.parse_args()
+    auth = (args.user, args.password)
+    graph_interface = GraphInterface._GraphInterface(args.host, args.http_port, auth)
+    drivers = {
+        'http': lambda: Neo4jHTTPDriver(host=args.host, port=args.http_port, auth=auth),
+        'bolt': lambda: Neo4jBoltDriver(host=args.host, port=args.bolt_port, auth=auth)
+    }
+    for name, make_driver in drivers.items():
+        print(f'{name} driver:')
+        graph_interface.driver = make_driver()
+        event_loop = asyncio.new_event_loop()
+        event_loop.run_until_complete(run_benchmark(graph_interface, args.iterations, args.concurrency))
+        event_loop.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""
+Compares apoc.algo.cover with the plain cypher fallback overlay uses when apoc is not installed, on node sets
+of growing size taken from the graph.
+
+Needs a neo4j with apoc and some data in it, eg. a local container:
+
+    docker run -p 7474:7474 --env NEO4J_AUTH=neo4j/pass --env NEO4JLABS_PLUGINS='["apoc"]' neo4j:3.5
+
+Then, from the KITCHEN directory:
+
+    python PLATER/benchmarks/overlay_benchmark.py --host localhost --password pass
+"""
+import argparse
+import asyncio
+import time
+
+from PLATER.services.util.graph_adapter import GraphInterface
+
+
+async def time_query(name, find_edges, ids, iterations):
+    latencies = []
+    edge_count = 0
+    for _ in range(iterations):
+        start = time.perf_counter()
+        edge_count = len((await find_edges(ids))[0]['result'])
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    print(f'  {name:<8} {edge_count:8} edges  p50 {latencies[len(latencies) // 2] * 1000:9.2f} ms  '
+          f'max {latencies[-1] * 1000:9.2f} ms')
+    return edge_count
+
+
+async def run_benchmark(graph_interface, sizes, iterations):
+    # take nodes from the neighbourhoods of connected nodes, so the sets have edges among them
+    rows = await graph_interface.run_cypher_batched(
+        'MATCH (a:named_thing)--(b:named_thing) RETURN DISTINCT b.id as id LIMIT $limit', {'limit': max(sizes)}
+    )
+    node_ids = [row['id'] for row in rows]
+    for size in sizes:
+        ids = node_ids[:size]
+        print(f'{len(ids)} nodes:')
+        apoc_edges = await time_query('apoc', graph_interface.run_apoc_cover, ids, iterations)
+        cypher_edges = await time_query('cypher', graph_interface.run_node_set_edges, ids, iterations)
+        if apoc_edges != cypher_edges:
+            print(f'  edge counts differ, apoc {apoc_edges} cypher {cypher_edges}')
+    await graph_interface.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark overlay support edge queries.')
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=7474)
+    parser.add_argument('--user', default='neo4j')
+    parser.add_argument('--password', default='neo4j')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000, 5000])
+    parser.add_argument('--iterations', type=int, default=10)
+    args = parser.parse_args()
+    graph_interface = GraphInterface._GraphInterface(args.host, args.port, (args.user, args.password))
+    if not graph_interface.supports_apoc():
+        raise SystemExit('The benchmark compares against apoc, which this neo4j does not have.')
+    event_loop = asyncio.new_event_loop()
+    event_loop.run_until_complete(run_benchmark(graph_interface, args.sizes, args.iterations))
+    event_loop.close()
+
+
+if __name__ == '__main__':
+    main()
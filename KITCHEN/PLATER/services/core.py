@@ -32,7 +32,8 @@ class Plater:
             (
                 self.config.get('NEO4J_USERNAME'),
                 self.config.get('NEO4J_PASSWORD')
-            )
+            ),
+            build_tag=build_tag
         )
         if validate:
             logger.debug('[0] Validation turned on.')
@@ -1,13 +1,20 @@
+import asyncio
+import json
 import urllib
 
 from jinja2 import Environment, PackageLoader
 from starlette.applications import Starlette
 from starlette.requests import Request
-from starlette.responses import HTMLResponse, JSONResponse
+from starlette.responses import HTMLResponse, JSONResponse, Response, StreamingResponse
 from starlette.routing import Route
 from starlette.schemas import OpenAPIResponse
 
 from PLATER.services.config import config
+from PLATER.services.util import deadline
+from PLATER.services.util.admission import AdmissionController
+from PLATER.services.util.answer_cache import AnswerCache
+from PLATER.services.util.result_cursor import CursorStore, CursorStoreFull, ResultCursor
+from PLATER.services.util.support_edge_cache import SupportEdgeCache
 from PLATER.services.util.bl_helper import BLHelper
 from PLATER.services.util.graph_adapter import GraphInterface
 from PLATER.services.util.logutil import LoggingUtil
@@ -38,9 +45,41 @@ class EndpointFactory:
     PREDICATES_ENDPOINT = 'predicates'
     QUERY_ENDPOINT = 'query'
 
+    # admission groups, and how many of their requests run at once unless configured otherwise. Heavy groups
+    # together stay well below the neo4j connection pool size, leaving room for lookups.
+    QUERY_ADMISSION_GROUP = 'query'
+    OVERLAY_ADMISSION_GROUP = 'overlay'
+    CYPHER_ADMISSION_GROUP = 'cypher'
+    LOOKUP_ADMISSION_GROUP = 'lookup'
+    ADMISSION_GROUP_CONCURRENCY = {
+        QUERY_ADMISSION_GROUP: 16,
+        OVERLAY_ADMISSION_GROUP: 8,
+        CYPHER_ADMISSION_GROUP: 4,
+        LOOKUP_ADMISSION_GROUP: 64
+    }
+
     def __init__(self, graph_interface: GraphInterface):
         self.graph_interface = graph_interface
         self.bl_helper = BLHelper(config.get('BL_HOST', 'https://bl-lookup-sri.renci.org'))
+        self.build_tag = None
+        self.answer_cache = AnswerCache(
+            max_entries=int(config.get('answer_cache_max_entries', 1000)),
+            max_bytes=int(config.get('answer_cache_max_bytes', 512 * 1024 * 1024)),
+            cache_dir=config.get('answer_cache_dir')
+        )
+        self.support_edge_cache = SupportEdgeCache(
+            max_bytes=int(config.get('overlay_cache_max_bytes', 64 * 1024 * 1024))
+        )
+        self.cursor_store = CursorStore(
+            ttl=float(config.get('cursor_ttl', 300)),
+            max_cursors=int(config.get('max_cursors', 16))
+        )
+        # `admission_<group>_concurrency` config sets the limit of a group, 0 leaves it unlimited.
+        self.admission = AdmissionController(retry_after=int(config.get('admission_retry_after', 5)))
+        for group, max_concurrent in EndpointFactory.ADMISSION_GROUP_CONCURRENCY.items():
+            self.admission.add_group(group, int(config.get(f'admission_{group}_concurrency', max_concurrent)),
+                                     max_queued=int(config.get('admission_queue_size', 32)),
+                                     queue_timeout=float(config.get('admission_queue_timeout', 30)))
         self._endpoint_loader = {
             EndpointFactory.ABOUT_ENDPOINT: lambda kwargs: self.create_about_endpoint(),
             EndpointFactory.HOP_ENDPOINT_TYPE: lambda kwargs: self.create_hop_endpoint(**kwargs),
@@ -63,6 +102,7 @@ class EndpointFactory:
         :return: starlette web application.
         :rtype: Starlette
         """
+        self.build_tag = build_tag
         graph_schema = self.graph_interface.get_schema()
         # first create Hop endpoints
         endpoints = []
@@ -185,11 +225,37 @@ class EndpointFactory:
         routes = list(map(lambda endpoint: endpoint, endpoints))
         app = Starlette(
             debug=int(config.get('logging_level')) == 10,
-            routes=routes
+            routes=routes,
+            on_startup=[self.on_startup],
+            on_shutdown=[self.on_shutdown]
         )
 
         return app
 
+    async def on_startup(self):
+        """
+        Logs the graph driver's connection pool settings once the server's event loop is up, and starts building
+        the graph summary and hub index if they're not there yet, or refreshing them if the graph changed.
+        """
+        if hasattr(self.graph_interface, 'get_pool_stats'):
+            logger.debug(f'Neo4j connection pool stats: {self.graph_interface.get_pool_stats()}')
+        if hasattr(self.graph_interface, 'build_summary'):
+            asyncio.ensure_future(self.graph_interface.build_summary())
+        if hasattr(self.graph_interface, 'build_hub_index'):
+            asyncio.ensure_future(self.graph_interface.build_hub_index())
+        if hasattr(self.graph_interface, 'refresh_snapshot'):
+            asyncio.ensure_future(self.graph_interface.refresh_snapshot())
+
+    async def on_shutdown(self):
+        """
+        Releases the graph driver's connections.
+        """
+        await self.cursor_store.close()
+        logger.debug(f'Admission stats: {self.admission.get_stats()}')
+        if hasattr(self.graph_interface, 'close'):
+            logger.debug(f'Neo4j connection pool stats: {self.graph_interface.get_pool_stats()}')
+            await self.graph_interface.close()
+
     def create_hop_endpoint(self, source_type, target_type):
         """
         Returns a Json endpoint for returning triplets for every related node types in the graph.
@@ -204,10 +270,19 @@ class EndpointFactory:
 
         async def get_handler(request: Request) -> JSONResponse:
             curie = request.path_params['curie']
-            response = await graph_interface.get_single_hops(source_type, target_type, curie)
+            try:
+                limit = request.query_params.get('limit')
+                limit = int(limit) if limit is not None else None
+                offset = int(request.query_params.get('offset', 0))
+                assert (limit is None or limit >= 0) and offset >= 0, 'limit and offset should not be negative.'
+            except (ValueError, AssertionError) as e:
+                return JSONResponse({"Error": f"{str(type(e))} - {e}"}, 400)
+            response = await graph_interface.get_single_hops(source_type, target_type, curie,
+                                                             limit=limit, offset=offset)
             return JSONResponse(response)
 
-        return Route(f"/{source_type}/{target_type}/{{curie}}", get_handler)
+        return Route(f"/{source_type}/{target_type}/{{curie}}",
+                     self.admission.guard(EndpointFactory.LOOKUP_ADMISSION_GROUP, get_handler))
 
     def create_node_endpoint(self, node_type):
         """
@@ -224,7 +299,8 @@ class EndpointFactory:
             response = await graph_interface.get_node(node_type, curie)
             return JSONResponse(response)
 
-        return Route(f'/{node_type}/{{curie}}', get_handler)
+        return Route(f'/{node_type}/{{curie}}',
+                     self.admission.guard(EndpointFactory.LOOKUP_ADMISSION_GROUP, get_handler))
 
     def create_cypher_endpoint(self):
         """
@@ -238,10 +314,13 @@ class EndpointFactory:
         async def post_handler(request: Request) -> JSONResponse:
             query = await request.json()
             query = query['query']
-            response = await graph_interface.run_cypher(query)
-            return JSONResponse(response)
 
-        return Route('/cypher', post_handler, methods=['post'])
+            async def respond():
+                return JSONResponse(await graph_interface.run_cypher(query))
+            return await self.respond_within_deadline(request, respond())
+
+        return Route('/cypher', self.admission.guard(EndpointFactory.CYPHER_ADMISSION_GROUP, post_handler),
+                     methods=['post'])
 
     def create_open_api_schema_endpoint(self, build_tag):
         """
@@ -383,6 +462,27 @@ class EndpointFactory:
                             'schema': {
                                 'type': 'string'
                             }
+                        },
+                        {
+                            'name': 'limit',
+                            'in': 'query',
+                            'description': 'Max number of paths to return.',
+                            'required': False,
+                            'schema': {
+                                'type': 'integer',
+                                'minimum': 0
+                            }
+                        },
+                        {
+                            'name': 'offset',
+                            'in': 'query',
+                            'description': 'Number of paths to skip, use with `limit` to page through results.',
+                            'required': False,
+                            'schema': {
+                                'type': 'integer',
+                                'minimum': 0,
+                                'default': 0
+                            }
                         }
                     ],
                     'responses': {
@@ -515,10 +615,8 @@ class EndpointFactory:
                 f'type_{key}': f"{key}'s type" for key in edge_ids + node_ids
             })
             class GI_MOCK:
-                pass
-            async def run(a, b): return None
-            GI_MOCK.run_cypher = run
-            GI_MOCK.convert_to_dict = lambda x,y :  [db_returns]
+                async def stream_cypher(self, cypher, parameters=None):
+                    yield db_returns
             q = Question(example_question)
             answer_eg = await q.answer(GI_MOCK(), yank=False)
             answer_eg[Question.KNOWLEDGE_GRAPH_KEY] = {}
@@ -527,6 +625,89 @@ class EndpointFactory:
             answer_eg[Question.KNOWLEDGE_GRAPH_KEY][Question.EDGES_LIST_KEY] = [db_returns[edge_id] for edge_id in
                                                                                 edge_ids]
 
+            stream_parameter = {
+                'name': 'stream',
+                'in': 'query',
+                'description': 'Stream the response back as results are read from the graph.',
+                'required': False,
+                'schema': {
+                    'type': 'boolean',
+                    'example': False
+                }
+            }
+
+            max_results_parameter = {
+                'name': 'max_results',
+                'in': 'query',
+                'description': 'Most results to return, capped by the server unless results are paged with '
+                               '`page_size`. Responses cut short have `truncated` set.',
+                'required': False,
+                'schema': {
+                    'type': 'integer',
+                    'example': 100
+                }
+            }
+
+            timeout_parameter = {
+                'name': 'timeout',
+                'in': 'query',
+                'description': 'Seconds to spend answering at most, capped by the server. Queries still running '
+                               'after that are stopped and a 504 is returned. A streamed response already '
+                               'under way is ended early instead, with "truncated": true and an "Error".',
+                'required': False,
+                'schema': {
+                    'type': 'number',
+                    'example': 60
+                }
+            }
+
+            max_connectivity_parameter = {
+                'name': 'max_connectivity',
+                'in': 'query',
+                'description': 'Leave out answers going through hub nodes, nodes not pinned to curies only match '
+                               'nodes with fewer edges than this.',
+                'required': False,
+                'schema': {
+                    'type': 'integer',
+                    'example': 5000
+                }
+            }
+
+            paging_parameters = [{
+                'name': 'page_size',
+                'in': 'query',
+                'description': 'Return results a page at a time. The response has a `next_cursor` while there are '
+                               'more results.',
+                'required': False,
+                'schema': {
+                    'type': 'integer',
+                    'example': 100
+                }
+            }, {
+                'name': 'cursor',
+                'in': 'query',
+                'description': '`next_cursor` of the previous page, to get the next one. A cursor lives in the '
+                               'server process that opened it, behind a load balancer pages have to reach the same '
+                               'one. A page timing out ends its cursor.',
+                'required': False,
+                'schema': {
+                    'type': 'string'
+                }
+            }]
+
+            attributes_parameter = {
+                'name': 'attributes',
+                'in': 'query',
+                'description': 'Comma separated node and edge attributes to return in the knowledge graph, '
+                               'eg. `name,category`. Ids, types and edge end points are always returned. Names '
+                               'can only have letters, digits and underscores.',
+                'required': False,
+                'schema': {
+                    'type': 'string',
+                    'example': 'name,category'
+                }
+            }
+
             paths['/reasonerapi'] = {
                  'get': {
                      'deprecated': True,
@@ -554,6 +735,8 @@ class EndpointFactory:
                     'description': 'Given a question graph return question graph plus answers.',
                     'operationId': 'post_question' + build_tag,
                     'summary': 'post a TrAPI query graph. (Please use `query` endpoint as support might discontinue).',
+                    'parameters': [stream_parameter, attributes_parameter, max_results_parameter,
+                                   max_connectivity_parameter, timeout_parameter] + paging_parameters,
                     'requestBody': {
                         'description': 'Reasoner api question.',
                         'content': {
@@ -587,6 +770,8 @@ class EndpointFactory:
                     'description': 'Given a question graph return question graph plus answers.',
                     'operationId': 'post_question_query' + build_tag,
                     'summary': 'Post a TrAPI query graph and get back answers.',
+                    'parameters': [stream_parameter, attributes_parameter, max_results_parameter,
+                                   max_connectivity_parameter, timeout_parameter] + paging_parameters,
                     'requestBody': {
                         'description': 'Reasoner api question.',
                         'content': {
@@ -929,7 +1114,7 @@ class EndpointFactory:
                             })
                 return JSONResponse(reformatted_schema)
 
-        return Route('/simple_spec', get_handler)
+        return Route('/simple_spec', self.admission.guard(EndpointFactory.LOOKUP_ADMISSION_GROUP, get_handler))
 
     def create_reasoner_api_endpoint(self):
         """
@@ -947,38 +1132,49 @@ class EndpointFactory:
         async def post_handler(request: Request) -> JSONResponse:
             try:
                 request_json = await request.json()
-                question = Question(request_json)
+                question = Question(request_json, attributes=EndpointFactory.get_requested_attributes(request),
+                                    max_results=EndpointFactory.get_max_results(request),
+                                    max_connectivity=EndpointFactory.get_max_connectivity(request))
             except Exception as e:
                  return JSONResponse({"Error": f"{str(type(e))} - {e}"}, 400)
-            response = await question.answer(graph_interface)
-            return JSONResponse(response)
+            return await self.answer_question(request, request_json, question)
+
+        admitted_post_handler = self.admission.guard(EndpointFactory.QUERY_ADMISSION_GROUP, post_handler)
 
         async def wrapper(request: Request) -> JSONResponse:
             if request.method == 'GET':
                 return await get_handler(request)
             else:
-                return await post_handler(request)
+                return await admitted_post_handler(request)
         return Route('/reasonerapi', wrapper, methods=['GET', 'POST'])
 
     def create_query_api_endpoint(self):
-        graph_interface = self.graph_interface
 
         async def post_handler(request: Request) -> JSONResponse:
             try:
                 request_json = await request.json()
-                question = Question(request_json)
+                question = Question(request_json, attributes=EndpointFactory.get_requested_attributes(request),
+                                    max_results=EndpointFactory.get_max_results(request),
+                                    max_connectivity=EndpointFactory.get_max_connectivity(request))
             except Exception as e:
                 return JSONResponse({"Error": f"{str(type(e))} - {e}"}, 400)
-            response = await question.answer(graph_interface)
-            return JSONResponse(response)
+            return await self.answer_question(request, request_json, question)
 
-        return Route('/query', post_handler, methods=['POST'])
+        return Route('/query', self.admission.guard(EndpointFactory.QUERY_ADMISSION_GROUP, post_handler),
+                     methods=['POST'])
 
     def create_graph_summary_api_endpoint(self):
         async def get_handler(request: Request) -> JSONResponse:
             self.graph_interface.get_schema()
             summary = self.graph_interface.summary
-            return JSONResponse(summary)
+            if summary is not None:
+                return JSONResponse(summary)
+            # still being generated, serve what we have so far.
+            progress = self.graph_interface.summary_progress
+            return JSONResponse(self.graph_interface.partial_summary, headers={
+                'X-Summary-Status': progress['status'],
+                'X-Summary-Progress': f"{progress['completed']}/{progress['total']}"
+            })
 
         return Route('/graph/summary', get_handler)
 
@@ -991,10 +1187,15 @@ class EndpointFactory:
             except Exception as e:
                 return JSONResponse({"Error": f"{str(type(e))} - {e}"}, 400)
             from PLATER.services.util.overlay import Overlay
-            overlay_class = Overlay(self.graph_interface)
-            return JSONResponse(await overlay_class.overlay_support_edges(request_json))
+            self.support_edge_cache.validate(self.build_tag, getattr(self.graph_interface, 'fingerprint', None))
+            overlay_class = Overlay(self.graph_interface, self.support_edge_cache)
 
-        return Route('/overlay', post_handler, methods=['POST'])
+            async def respond():
+                return JSONResponse(await overlay_class.overlay_support_edges(request_json))
+            return await self.respond_within_deadline(request, respond())
+
+        return Route('/overlay', self.admission.guard(EndpointFactory.OVERLAY_ADMISSION_GROUP, post_handler),
+                     methods=['POST'])
 
     def create_about_endpoint(self):
         async def get_handler(request: Request) -> JSONResponse:
@@ -1008,6 +1209,217 @@ class EndpointFactory:
 
         return Route('/about', get_handler)
 
+    async def answer_question(self, request: Request, request_json: dict, question: Question) -> Response:
+        """
+        Answers a TrAPI question, serving it from the answer cache when the same question was answered before
+        on this graph.
+        :param request: incoming request.
+        :type request: Request
+        :param request_json: request body.
+        :type request_json: dict
+        :param question: question made from the request body.
+        :type question: Question
+        :return: answer response.
+        :rtype: Response
+        """
+        page_size = request.query_params.get('page_size')
+        cursor_id = request.query_params.get('cursor')
+        if page_size is not None or cursor_id is not None:
+            return await self.answer_question_page(request, question, page_size, cursor_id)
+        self.answer_cache.validate(self.build_tag, getattr(self.graph_interface, 'fingerprint', None))
+        options = {}
+        if question.attributes is not None:
+            options['attributes'] = question.attributes
+        if question.max_results is not None:
+            options['max_results'] = question.max_results
+        if question.max_connectivity is not None:
+            options['max_connectivity'] = question.max_connectivity
+        cache_key = AnswerCache.make_key(request_json, options)
+        cached = await self.answer_cache.get(cache_key)
+        if cached is not None:
+            return Response(cached, media_type='application/json')
+        if EndpointFactory.is_streaming_requested(request):
+            try:
+                timeout = EndpointFactory.get_query_timeout(request)
+            except Exception as e:
+                return JSONResponse({"Error": f"{str(type(e))} - {e}"}, 400)
+            return StreamingResponse(deadline.iterate_within(question.answer_stream(self.graph_interface), timeout,
+                                                             EndpointFactory.wait_for_disconnect(request),
+                                                             question.stream_interruption),
+                                     media_type='application/json')
+
+        async def respond():
+            response = await question.answer(self.graph_interface)
+            # serialize the same way JSONResponse does, so cached answers are byte for byte the same.
+            content = json.dumps(response, ensure_ascii=False, allow_nan=False, indent=None,
+                                 separators=(',', ':')).encode('utf-8')
+            await self.answer_cache.put(cache_key, content)
+            return Response(content, media_type='application/json')
+        return await self.respond_within_deadline(request, respond())
+
+    async def answer_question_page(self, request: Request, question: Question, page_size, cursor_id) -> Response:
+        """
+        Answers a page of a TrAPI question. The first page runs the answer query and opens a cursor on its
+        results, following pages are read off the cursor, whose id is returned as `next_cursor` while there are
+        more results.
+        :param request: incoming request, its body already read.
+        :type request: Request
+        :param question: question made from the request body, ignored when reading from a cursor.
+        :type question: Question
+        :param page_size: number of results per page, `default_page_size` config if None.
+        :type page_size: str
+        :param cursor_id: id of the cursor to read the page from, None for the first page.
+        :type cursor_id: str
+        :return: page response.
+        :rtype: Response
+        """
+        try:
+            page_size = int(page_size if page_size is not None else config.get('default_page_size', 1000))
+            assert page_size > 0, 'page_size should be positive.'
+        except Exception as e:
+            return JSONResponse({"Error": f"{str(type(e))} - {e}"}, 400)
+        if cursor_id is not None:
+            cursor = self.cursor_store.get(cursor_id)
+            if cursor is None:
+                return JSONResponse({"Error": f"Unknown or expired cursor `{cursor_id}`."}, 404)
+        else:
+            try:
+                cursor = self.cursor_store.create(question, question.run_query(self.graph_interface))
+            except CursorStoreFull as e:
+                return JSONResponse({"Error": str(e)}, 503, headers={'Retry-After': str(self.admission.retry_after)})
+
+        async def respond():
+            async with cursor.lock:
+                try:
+                    rows = await cursor.take(page_size)
+                    response = await cursor.question.answer_rows(self.graph_interface, ResultCursor.iterate(rows))
+                finally:
+                    # a page cut off by its deadline drops the cursor.
+                    await self.cursor_store.release(cursor)
+            if cursor.has_next:
+                response['next_cursor'] = cursor.id
+            return JSONResponse(response)
+        return await self.respond_within_deadline(request, respond())
+
+    async def respond_within_deadline(self, request: Request, respond) -> Response:
+        """
+        Makes the response to a request within `get_query_timeout` seconds. Neo4j queries still running once the
+        deadline passes, or the client disconnects, are terminated.
+        :param request: incoming request, its body already read.
+        :type request: Request
+        :param respond: awaitable making the response.
+        :return: response, 504 if the deadline passed.
+        :rtype: Response
+        """
+        try:
+            timeout = EndpointFactory.get_query_timeout(request)
+        except Exception as e:
+            respond.close()
+            return JSONResponse({"Error": f"{str(type(e))} - {e}"}, 400)
+        try:
+            return await deadline.run_within(respond, timeout, EndpointFactory.wait_for_disconnect(request))
+        except asyncio.TimeoutError:
+            logger.warning(f'{request.url.path} timed out after {timeout} seconds.')
+            return JSONResponse({"Error": f"Timed out after {timeout} seconds."}, 504)
+        except deadline.ClientDisconnected:
+            logger.info(f'Client disconnected, stopped answering {request.url.path}.')
+            # nobody is left to read it.
+            return Response(status_code=499)
+
+    @staticmethod
+    async def wait_for_disconnect(request: Request):
+        """
+        Waits for the client of a request to disconnect. Only to be used once the request body is read.
+        :param request: incoming request.
+        :type request: Request
+        """
+        while (await request.receive())['type'] != 'http.disconnect':
+            pass
+
+    @staticmethod
+    def get_query_timeout(request: Request):
+        """
+        Seconds a request may spend querying neo4j. `query_timeout` config by default, requests can ask for less
+        with the `timeout` query parameter. A config of 0 means no limit.
+        :param request: incoming request.
+        :type request: Request
+        :return: timeout, None if there is no limit.
+        :rtype: float
+        """
+        default = float(config.get('query_timeout', 300))
+        requested = request.query_params.get('timeout')
+        if requested is None:
+            return default or None
+        requested = float(requested)
+        assert requested > 0, 'timeout should be positive.'
+        return min(requested, default) if default else requested
+
+    @staticmethod
+    def is_streaming_requested(request: Request) -> bool:
+        """
+        Checks if answers should be streamed back, either by `stream` query parameter or `stream_responses` config.
+        :param request: incoming request.
+        :type request: Request
+        :return: True if response should be streamed.
+        :rtype: bool
+        """
+        stream = request.query_params.get('stream', config.get('stream_responses', False))
+        return str(stream).lower() in ('true', '1', 'yes')
+
+    @staticmethod
+    def get_max_results(request: Request):
+        """
+        Most results to answer a question with. `max_results` config by default, requests can ask for another
+        number with the `max_results` query parameter, up to `max_results_cap` config (`max_results` if not set).
+        A config of 0 means no limit. Paged requests are not limited unless they ask to be, as every response only
+        holds a page.
+        :param request: incoming request.
+        :type request: Request
+        :return: max results, None if there is no limit.
+        :rtype: int
+        """
+        paged = 'page_size' in request.query_params or 'cursor' in request.query_params
+        default = int(config.get('max_results', 50000))
+        cap = int(config.get('max_results_cap', default))
+        requested = request.query_params.get('max_results')
+        if requested is None:
+            return None if paged else default or None
+        requested = int(requested)
+        assert requested > 0, 'max_results should be positive.'
+        return min(requested, cap) if cap and not paged else requested
+
+    @staticmethod
+    def get_max_connectivity(request: Request):
+        """
+        Reads the `max_connectivity` query parameter, nodes of the answers not pinned to curies must have fewer
+        edges than that. Defaults to `max_connectivity` config, a config of 0 means no limit.
+        :param request: incoming request.
+        :type request: Request
+        :return: max connectivity, None if there is no limit.
+        :rtype: int
+        """
+        requested = request.query_params.get('max_connectivity')
+        if requested is None:
+            return int(config.get('max_connectivity', 0)) or None
+        requested = int(requested)
+        assert requested > 0, 'max_connectivity should be positive.'
+        return requested
+
+    @staticmethod
+    def get_requested_attributes(request: Request):
+        """
+        Reads the knowledge graph attributes asked for by the `attributes` query parameter, eg.
+        `?attributes=name,category`.
+        :param request: incoming request.
+        :type request: Request
+        :return: attribute names, None if all attributes should be returned.
+        :rtype: list
+        """
+        attributes = request.query_params.get('attributes')
+        if attributes is None:
+            return None
+        return [attribute.strip() for attribute in attributes.split(',') if attribute.strip()]
+
     def create_endpoint(self, endpoint_type, **kwargs) -> Route:
         """
         Interfaces creation of endpoints.
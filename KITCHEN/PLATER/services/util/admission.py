@@ -0,0 +1,176 @@
+import asyncio
+from collections import deque
+
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response, StreamingResponse
+
+from PLATER.services.config import config
+from PLATER.services.util.logutil import LoggingUtil
+
+logger = LoggingUtil.init_logging(__name__,
+                                  config.get('logging_level'),
+                                  config.get('logging_format')
+                                  )
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request can't be let in, `status_code` tells why."""
+
+    def __init__(self, status_code: int, message: str):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class AdmissionGroup:
+    """
+    Lets `max_concurrent` requests of a group of routes run at once. Up to `max_queued` more wait for a slot, in
+    order of arrival, for at most `queue_timeout` seconds.
+    """
+
+    def __init__(self, name: str, max_concurrent: int, max_queued: int = 32, queue_timeout: float = 30):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queued = max_queued
+        self.queue_timeout = queue_timeout
+        self.running = 0
+        self._waiting = deque()
+        self._stats = {'admitted': 0, 'queued': 0, 'rejected_full': 0, 'rejected_timeout': 0}
+
+    async def acquire(self):
+        """
+        Waits for a slot.
+        :raises AdmissionRejected: 429 if the queue is full, 503 if no slot freed up in time.
+        """
+        if self.running < self.max_concurrent and not self._waiting:
+            self.running += 1
+            self._stats['admitted'] += 1
+            return
+        if len(self._waiting) >= self.max_queued:
+            self._stats['rejected_full'] += 1
+            raise AdmissionRejected(429, f'Too many {self.name} requests, try again later.')
+        waiter = asyncio.get_event_loop().create_future()
+        self._waiting.append(waiter)
+        self._stats['queued'] += 1
+        try:
+            await asyncio.wait([waiter], timeout=self.queue_timeout)
+        except asyncio.CancelledError:
+            if waiter.done():
+                # the slot was handed over right before, pass it on.
+                self.release()
+            else:
+                waiter.cancel()
+                self._waiting.remove(waiter)
+            raise
+        if not waiter.done():
+            waiter.cancel()
+            self._waiting.remove(waiter)
+            self._stats['rejected_timeout'] += 1
+            raise AdmissionRejected(503, f'Timed out waiting for a free {self.name} slot, try again later.')
+        self._stats['admitted'] += 1
+
+    def release(self):
+        """
+        Frees a slot, handing it over to the next waiting request if any.
+        """
+        while self._waiting:
+            waiter = self._waiting.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.running -= 1
+
+    def get_stats(self) -> dict:
+        stats = dict(self._stats)
+        stats.update({
+            'max_concurrent': self.max_concurrent,
+            'running': self.running,
+            'waiting': len(self._waiting)
+        })
+        return stats
+
+
+class SlotHoldingResponse:
+    """
+    Streamed response holding on to an admission slot until it's sent. The slot is released however sending ends,
+    and if the response is dropped without being sent at all.
+    """
+
+    def __init__(self, response: StreamingResponse, group: AdmissionGroup):
+        self.response = response
+        self._group = group
+
+    def release(self):
+        group, self._group = self._group, None
+        if group is not None:
+            group.release()
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await self.response(scope, receive, send)
+        finally:
+            self.release()
+
+    def __getattr__(self, name):
+        # status, headers and such of the wrapped response.
+        response = self.__dict__.get('response')
+        if response is None:
+            raise AttributeError(name)
+        return getattr(response, name)
+
+    def __del__(self):
+        self.release()
+
+
+class AdmissionController:
+    """
+    Per route group concurrency limits. Heavy routes (queries, overlay, cypher) get small groups of their own so a
+    few expensive requests can't use up the instance, cheap lookups get a larger one and never wait behind them.
+    """
+
+    def __init__(self, retry_after: int = 5):
+        """
+        :param retry_after: seconds rejected clients are told to wait before retrying.
+        """
+        self.retry_after = retry_after
+        self.groups = {}
+
+    def add_group(self, name: str, max_concurrent: int, max_queued: int = 32, queue_timeout: float = 30):
+        """
+        Adds a group of routes sharing a limit. A `max_concurrent` of 0 leaves the group unlimited.
+        """
+        if max_concurrent > 0:
+            self.groups[name] = AdmissionGroup(name, max_concurrent, max_queued, queue_timeout)
+
+    def guard(self, group_name: str, handler):
+        """
+        Wraps a request handler so it only runs once its group has a free slot. Streamed responses hold on to the
+        slot until they are sent.
+        :param group_name: group of the handler's route.
+        :type group_name: str
+        :param handler: request handler.
+        :return: guarded request handler.
+        """
+        group = self.groups.get(group_name)
+        if group is None:
+            return handler
+
+        async def guarded_handler(request: Request) -> Response:
+            try:
+                await group.acquire()
+            except AdmissionRejected as e:
+                logger.warning(f'Rejected {request.url.path} -- {e}')
+                return JSONResponse({"Error": str(e)}, e.status_code, headers={'Retry-After': str(self.retry_after)})
+            try:
+                response = await handler(request)
+            except BaseException:
+                group.release()
+                raise
+            if isinstance(response, StreamingResponse):
+                return SlotHoldingResponse(response, group)
+            group.release()
+            return response
+
+        return guarded_handler
+
+    def get_stats(self) -> dict:
+        return {name: group.get_stats() for name, group in self.groups.items()}
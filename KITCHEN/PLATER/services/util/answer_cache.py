@@ -0,0 +1,162 @@
+import asyncio
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from collections import OrderedDict
+
+from PLATER.services.config import config
+from PLATER.services.util.logutil import LoggingUtil
+
+logger = LoggingUtil.init_logging(__name__,
+                                  config.get('logging_level'),
+                                  config.get('logging_format')
+                                  )
+
+
+class AnswerCache:
+    """
+    LRU cache of serialized answers. Bounded by number of entries and by total bytes, with an optional on disk
+    tier that survives restarts. Entries are only valid for the graph they were computed on, which is identified
+    by the build tag and the graph fingerprint.
+    """
+
+    # directory of `cache_dir` the on disk tier lives in, with a directory per build and one per graph in it. Only
+    # this directory is ever cleaned up, so `cache_dir` can be shared with other files and other builds.
+    DISK_DIRECTORY = 'plater_answer_cache'
+
+    def __init__(self, max_entries: int = 1000, max_bytes: int = 512 * 1024 * 1024, cache_dir: str = None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.cache_dir = cache_dir
+        self._entries = OrderedDict()
+        self._size = 0
+        self._fingerprint = None
+        # directory answers are kept in on disk, only set once the graph fingerprint is known.
+        self._disk_directory = None
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0 and self.max_bytes > 0
+
+    @staticmethod
+    def make_key(request_json: dict, options: dict = None) -> str:
+        """
+        Canonical hash of a request, insensitive to key order.
+        :param request_json: request body.
+        :type request_json: dict
+        :param options: any request options affecting the answer, eg. query parameters.
+        :type options: dict
+        :return: hex digest
+        :rtype: str
+        """
+        canonical = json.dumps([request_json, options or {}], sort_keys=True, separators=(',', ':'))
+        return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+    def validate(self, build_tag: str, graph_fingerprint: dict):
+        """
+        Drops all entries if the graph changed since they were cached. While the graph fingerprint isn't known
+        answers are only cached in memory, and the disk tier is left alone.
+        :param build_tag: build tag of the graph.
+        :type build_tag: str
+        :param graph_fingerprint: counts identifying the state of the graph, see `GraphInterface.get_fingerprint`.
+        None if not known.
+        :type graph_fingerprint: dict
+        """
+        fingerprint = AnswerCache.make_key({'build_tag': build_tag, 'graph': graph_fingerprint})
+        if fingerprint == self._fingerprint:
+            return
+        if self._fingerprint is not None:
+            logger.info(f'Graph changed, dropping {len(self._entries)} cached answers.')
+        self._fingerprint = fingerprint
+        self._entries.clear()
+        self._size = 0
+        self._disk_directory = None
+        if self.cache_dir and graph_fingerprint is not None:
+            build_directory = os.path.join(self.cache_dir, AnswerCache.DISK_DIRECTORY,
+                                           hashlib.sha256(str(build_tag).encode('utf-8')).hexdigest())
+            # answers cached on disk for earlier states of this build's graph are of no use anymore.
+            os.makedirs(build_directory, exist_ok=True)
+            for entry in os.listdir(build_directory):
+                if entry != fingerprint:
+                    shutil.rmtree(os.path.join(build_directory, entry), ignore_errors=True)
+            self._disk_directory = os.path.join(build_directory, fingerprint)
+            os.makedirs(self._disk_directory, exist_ok=True)
+
+    def _disk_path(self, key):
+        return os.path.join(self._disk_directory, key)
+
+    def _read_disk(self, key):
+        try:
+            with open(self._disk_path(key), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def _write_disk(self, key, value):
+        # write to a temp file of its own first so readers never see half written answers, and concurrent
+        # writers of the same key don't mix.
+        with tempfile.NamedTemporaryFile(dir=self._disk_directory, suffix='.tmp', delete=False) as f:
+            f.write(value)
+        try:
+            os.replace(f.name, self._disk_path(key))
+        except OSError:
+            os.remove(f.name)
+            raise
+
+    def _add(self, key, value):
+        if key in self._entries:
+            self._size -= len(self._entries.pop(key))
+        self._entries[key] = value
+        self._size += len(value)
+        while self._entries and (len(self._entries) > self.max_entries or self._size > self.max_bytes):
+            _, evicted = self._entries.popitem(last=False)
+            self._size -= len(evicted)
+
+    async def get(self, key: str):
+        """
+        Looks up an answer, first in memory then on disk.
+        :param key: cache key see `make_key`.
+        :type key: str
+        :return: serialized answer or None.
+        :rtype: bytes
+        """
+        if not self.enabled:
+            return None
+        value = self._entries.get(key)
+        if value is not None:
+            self._entries.move_to_end(key)
+        elif self._disk_directory:
+            value = await asyncio.get_event_loop().run_in_executor(None, self._read_disk, key)
+            if value is not None:
+                self._add(key, value)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    async def put(self, key: str, value: bytes):
+        """
+        Stores a serialized answer.
+        :param key: cache key see `make_key`.
+        :type key: str
+        :param value: serialized answer.
+        :type value: bytes
+        """
+        if not self.enabled or len(value) > self.max_bytes:
+            return
+        self._add(key, value)
+        if self._disk_directory:
+            await asyncio.get_event_loop().run_in_executor(None, self._write_disk, key, value)
+
+    def get_stats(self) -> dict:
+        return {
+            'entries': len(self._entries),
+            'bytes': self._size,
+            'hits': self.hits,
+            'misses': self.misses
+        }
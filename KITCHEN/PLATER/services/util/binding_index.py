@@ -0,0 +1,32 @@
+"""Tools for pulling knowledge graph ids out of TrAPI answer bindings."""
+
+# same keys as Question's spec vars.
+KG_ID_KEY = 'kg_id'
+NODE_BINDINGS_KEY = 'node_bindings'
+EDGE_BINDINGS_KEY = 'edge_bindings'
+
+
+def binding_kg_ids(bindings):
+    """Yield the kg ids of a list of bindings, set valued bindings (lists of ids) are flattened."""
+    for binding in bindings:
+        kg_id = binding[KG_ID_KEY]
+        if isinstance(kg_id, list):
+            yield from kg_id
+        else:
+            yield kg_id
+
+
+class BindingIndex:
+    """Node and edge ids bound in a list of answers, extracted in a single linear pass."""
+
+    def __init__(self, answers):
+        """Index the bindings of answers."""
+        self.node_ids = set()
+        self.edge_ids = set()
+        # distinct node ids of each answer, in binding order.
+        self.answer_node_ids = []
+        for answer in answers:
+            answer_node_ids = list(dict.fromkeys(binding_kg_ids(answer[NODE_BINDINGS_KEY])))
+            self.answer_node_ids.append(answer_node_ids)
+            self.node_ids.update(answer_node_ids)
+            self.edge_ids.update(binding_kg_ids(answer.get(EDGE_BINDINGS_KEY, [])))
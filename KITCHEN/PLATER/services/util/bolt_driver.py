@@ -0,0 +1,170 @@
+import asyncio
+import traceback
+
+from PLATER.services.config import config
+from PLATER.services.util import deadline
+from PLATER.services.util.graph_adapter import Neo4jDriver
+from PLATER.services.util.logutil import LoggingUtil
+
+try:
+    import neo4j
+    from neo4j.graph import Node, Path, Relationship
+except ImportError:
+    neo4j = None
+
+logger = LoggingUtil.init_logging(__name__,
+                                  config.get('logging_level'),
+                                  config.get('logging_format')
+                                  )
+
+
+def to_plain(value):
+    """
+    Converts values of bolt records to what neo4j's http endpoint would return for them.
+    :param value: record value.
+    :return: json serializable value.
+    """
+    if isinstance(value, (Node, Relationship)):
+        return {key: to_plain(item) for key, item in value.items()}
+    if isinstance(value, Path):
+        # paths come back as alternating node and relationship properties.
+        path = [to_plain(value.start_node)]
+        for relationship in value.relationships:
+            path += [to_plain(relationship), to_plain(relationship.end_node)]
+        return path
+    if isinstance(value, (list, tuple)):
+        return [to_plain(item) for item in value]
+    if isinstance(value, dict):
+        return {key: to_plain(item) for key, item in value.items()}
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return value
+    # temporal and spatial types
+    return str(value)
+
+
+class Neo4jBoltDriver(Neo4jDriver):
+    """
+    Talks to neo4j over bolt, using the official neo4j driver (the `bolt` extra). Connections are pooled by the
+    neo4j driver, and records are streamed as they are received.
+    """
+
+    def __init__(self, host: str, port: int, auth: set, scheme: str = 'bolt'):
+        if neo4j is None:
+            raise ImportError('Bolt driver needs the neo4j package, install it with `pip install neo4j`.')
+        self._host = host
+        self._port = port
+        self._uri = f'{scheme}://{host}:{port}'
+        self._auth = tuple(auth)
+        self._supports_apoc = None
+        self._pool_size = int(config.get('neo4j_pool_size', 60))
+        # async drivers are bound to the event loop they were made on.
+        self._drivers = {}
+        self._sync_driver = neo4j.GraphDatabase.driver(self._uri, auth=self._auth,
+                                                       max_connection_pool_size=self._pool_size)
+        self._stats = {
+            'drivers_created': 0,
+            'requests_total': 0,
+            'requests_in_flight': 0,
+            'requests_in_flight_peak': 0
+        }
+        logger.debug('PINGING NEO4J')
+        self.ping()
+        self.make_indexes(config.get('edge_index_name', 'edge_id_index'))
+        logger.debug('CHECKING IF NEO4J SUPPORTS APOC')
+        self.check_apoc_support()
+        logger.debug(f'SUPPORTS APOC : {self._supports_apoc}')
+
+    def get_driver(self):
+        """
+        Returns the async neo4j driver bound to the running event loop.
+        """
+        loop = asyncio.get_event_loop()
+        for stale_loop in [l for l in self._drivers if l.is_closed()]:
+            del self._drivers[stale_loop]
+        driver = self._drivers.get(loop)
+        if driver is None:
+            driver = neo4j.AsyncGraphDatabase.driver(self._uri, auth=self._auth,
+                                                     max_connection_pool_size=self._pool_size)
+            self._drivers[loop] = driver
+            self._stats['drivers_created'] += 1
+        return driver
+
+    async def close(self):
+        driver = self._drivers.pop(asyncio.get_event_loop(), None)
+        if driver is not None:
+            await driver.close()
+
+    def get_pool_stats(self) -> dict:
+        stats = dict(self._stats)
+        stats.update({
+            'pool_size': self._pool_size,
+            'open_drivers': len(self._drivers)
+        })
+        return stats
+
+    def ping(self):
+        try:
+            self._sync_driver.verify_connectivity()
+        except Exception as e:
+            logger.error(f"Error contacting Neo4j @ {self._uri} -- Exception raised -- {e}")
+            logger.debug(traceback.format_exc())
+            raise RuntimeError('Connection to Neo4j could not be established.')
+
+    @staticmethod
+    def make_response(results: list) -> dict:
+        """
+        Shapes (columns, rows) pairs like a response of the http transactional endpoint.
+        """
+        return {
+            'results': [{'columns': columns, 'data': [{'row': row} for row in rows]} for columns, rows in results],
+            'errors': []
+        }
+
+    async def stream_statements(self, statements):
+        queries = '; '.join(query for query, _ in statements)
+        self._stats['requests_total'] += 1
+        self._stats['requests_in_flight'] += 1
+        self._stats['requests_in_flight_peak'] = max(self._stats['requests_in_flight_peak'],
+                                                     self._stats['requests_in_flight'])
+        # statements run in one transaction, like they do over http. Under a deadline neo4j times the transaction
+        # out itself. Cancelled calls drop their connection, which terminates the transaction too.
+        timeout = deadline.call_timeout()
+        try:
+            async with self.get_driver().session() as session:
+                transaction = await session.begin_transaction(
+                    timeout=max(timeout, 0.001) if timeout is not None else None)
+                try:
+                    for query, parameters in statements:
+                        result = await transaction.run(query, parameters or {})
+                        columns = result.keys()
+                        async for record in result:
+                            yield {column: to_plain(record[column]) for column in columns}
+                    await transaction.commit()
+                finally:
+                    if not transaction.closed():
+                        # rolls back what wasn't committed.
+                        await transaction.close()
+        except neo4j.exceptions.Neo4jError as e:
+            logger.error(f'Neo4j returned `{e}` for cypher {queries}.')
+            raise RuntimeWarning(f'Error running cypher {queries}.')
+        finally:
+            self._stats['requests_in_flight'] -= 1
+
+    async def run(self, query, parameters=None):
+        columns = []
+        rows = []
+        async for row in self.stream_statements([(query, parameters)]):
+            columns = list(row.keys())
+            rows.append(list(row.values()))
+        return self.make_response([(columns, rows)])
+
+    def run_sync(self, query, parameters=None):
+        try:
+            with self._sync_driver.session() as session:
+                result = session.run(query, parameters or {})
+                columns = result.keys()
+                rows = [[to_plain(record[column]) for column in columns] for record in result]
+        except neo4j.exceptions.Neo4jError as e:
+            logger.error(f'Neo4j returned `{e}` for cypher {query}.')
+            raise RuntimeWarning(f'Error running cypher {query}.')
+        return self.make_response([(columns, rows)])
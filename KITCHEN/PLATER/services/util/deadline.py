@@ -0,0 +1,147 @@
+"""Per request deadlines for neo4j queries.
+
+Work done for a request runs with a deadline in its context. Drivers read it to time out their calls, and run
+queries so that they can be terminated on neo4j, since cancelling the call alone leaves neo4j running the query.
+"""
+import asyncio
+import contextlib
+import contextvars
+import math
+
+# event loop time by which queries of the running request have to be done, None if there is no deadline.
+_deadline = contextvars.ContextVar('query_deadline', default=None)
+
+
+class ClientDisconnected(Exception):
+    """Raised when the client went away before its request was answered."""
+
+
+def remaining():
+    """Seconds left until the deadline of the running request, None if there is no deadline."""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return max(deadline - asyncio.get_event_loop().time(), 0)
+
+
+def call_timeout():
+    """Seconds a driver call of the running request may take, None if it isn't timed out, see `unbounded`."""
+    seconds = remaining()
+    return None if seconds is None or math.isinf(seconds) else seconds
+
+
+@contextlib.contextmanager
+def unbounded():
+    """
+    Runs a block with queries that don't time out on their own, but still run so that they can be terminated:
+    cancelling the block stops them on neo4j. For queries outliving the request that starts them, whose reads are
+    bounded by the deadlines of the requests doing them.
+    """
+    token = _deadline.set(math.inf)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def current():
+    """Deadline (event loop time) of the running request, None if there is no deadline."""
+    return _deadline.get()
+
+
+def set_deadline(deadline):
+    """Runs the rest of the current task with `deadline` (event loop time), None for no deadline."""
+    _deadline.set(deadline)
+
+
+def clear():
+    """Runs the rest of the current task without a deadline."""
+    set_deadline(None)
+
+
+def start_task(awaitable, deadline):
+    """Starts a task with `deadline` (event loop time) in its context."""
+    token = _deadline.set(deadline)
+    try:
+        return asyncio.ensure_future(awaitable)
+    finally:
+        _deadline.reset(token)
+
+
+async def run_within(awaitable, timeout, disconnected=None):
+    """
+    Runs an awaitable with a deadline. It is cancelled, terminating the queries it has running, once `timeout`
+    seconds pass or the client disconnects.
+    :param awaitable: work to do.
+    :param timeout: seconds the work may take, no deadline if None or 0.
+    :type timeout: float
+    :param disconnected: awaitable done once the client disconnects.
+    :return: result of the awaitable.
+    :raises asyncio.TimeoutError: if the deadline passed.
+    :raises ClientDisconnected: if the client disconnected.
+    """
+    deadline = asyncio.get_event_loop().time() + timeout if timeout else None
+    task = start_task(awaitable, deadline)
+    watcher = asyncio.ensure_future(disconnected) if disconnected is not None else None
+    try:
+        done, _ = await asyncio.wait([w for w in (task, watcher) if w is not None], timeout=timeout or None,
+                                     return_when=asyncio.FIRST_COMPLETED)
+    except asyncio.CancelledError:
+        task.cancel()
+        raise
+    finally:
+        if watcher is not None:
+            watcher.cancel()
+    if task in done:
+        return task.result()
+    await cancel(task)
+    if watcher is not None and watcher in done and not watcher.cancelled():
+        raise ClientDisconnected()
+    raise asyncio.TimeoutError()
+
+
+async def iterate_within(iterator, timeout, disconnected=None, closing=None):
+    """
+    Iterates an async iterator with a deadline, see `run_within`. Iteration stops once the deadline passes or the
+    client disconnects, as streamed responses can't change their status any more. On a timeout a last item from
+    `closing` can end what was sent so far.
+    :param iterator: async iterator.
+    :param timeout: seconds the iteration may take, no deadline if None or 0.
+    :type timeout: float
+    :param disconnected: awaitable done once the client disconnects.
+    :param closing: called with a message on a timeout, returns the last item.
+    :return: async generator of the iterator's items.
+    """
+    loop = asyncio.get_event_loop()
+    deadline = loop.time() + timeout if timeout else None
+    watcher = asyncio.ensure_future(disconnected) if disconnected is not None else None
+    try:
+        while True:
+            step = start_task(iterator.__anext__(), deadline)
+            wait_for = None if deadline is None else max(deadline - loop.time(), 0)
+            done, _ = await asyncio.wait([w for w in (step, watcher) if w is not None], timeout=wait_for,
+                                         return_when=asyncio.FIRST_COMPLETED)
+            if step not in done:
+                await cancel(step)
+                if closing is not None and (watcher is None or watcher not in done):
+                    yield closing(f'Timed out after {timeout} seconds.')
+                return
+            try:
+                item = step.result()
+            except StopAsyncIteration:
+                return
+            yield item
+    finally:
+        if watcher is not None:
+            watcher.cancel()
+        if hasattr(iterator, 'aclose'):
+            await iterator.aclose()
+
+
+async def cancel(task):
+    """Cancels a task and waits for it to clean up."""
+    task.cancel()
+    try:
+        await task
+    except (asyncio.CancelledError, Exception):
+        pass
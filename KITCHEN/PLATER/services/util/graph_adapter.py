@@ -1,11 +1,18 @@
+import asyncio
 import base64
+import time
 import traceback
+from contextlib import asynccontextmanager
 
 import aiohttp
 import requests
 
 from PLATER.services.config import config
+from PLATER.services.util import deadline
+from PLATER.services.util.graph_snapshot import GraphSnapshot
 from PLATER.services.util.logutil import LoggingUtil
+from PLATER.services.util.neo4j_response_parser import Neo4jResponseParser
+from PLATER.services.util.qgraph_compiler import HUB_DEGREE_PROPERTY
 
 logger = LoggingUtil.init_logging(__name__,
                                   config.get('logging_level'),
@@ -13,108 +20,96 @@ logger = LoggingUtil.init_logging(__name__,
                                   )
 
 
-class Neo4jHTTPDriver:
-    def __init__(self, host: str, port: int,  auth: set, scheme: str = 'http'):
-        self._host = host
-        self._neo4j_transaction_endpoint = "/db/data/transaction/commit"
-        self._scheme = scheme
-        self._full_transaction_path = f"{self._scheme}://{self._host}:{port}{self._neo4j_transaction_endpoint}"
-        self._port = port
-        self._supports_apoc = None
-        self._header = {
-                'Accept': 'application/json; charset=UTF-8',
-                'Content-Type': 'application/json',
-                'Authorization': 'Basic %s' % base64.b64encode(f"{auth[0]}:{auth[1]}".encode('utf-8')).decode('utf-8')
-            }
-        # ping and raise error if neo4j doesn't respond.
-        logger.debug('PINGING NEO4J')
-        self.ping()
-        self.make_indexes(config.get('edge_index_name', 'edge_id_index'))
-        logger.debug('CHECKING IF NEO4J SUPPORTS APOC')
-        self.check_apoc_support()
-        logger.debug(f'SUPPORTS APOC : {self._supports_apoc}')
-
-    async def post_request_json(self, payload):
-        tcp_connector = aiohttp.TCPConnector(limit=60)
-        async with aiohttp.ClientSession(connector=tcp_connector) as session:
-            async with session.post(self._full_transaction_path, json=payload, headers=self._header) as response:
-                if response.status != 200:
-                    logger.error(f"[x] Problem contacting Neo4j server {self._host}:{self._port} -- {response.status}")
-                    txt = await response.text()
-                    logger.debug(f"[x] Server responded with {txt}")
-                else:
-                    return await response.json()
+class Neo4jDriver:
+    """
+    Interface of the drivers GraphInterface talks to neo4j through. Whatever the transport, results are shaped
+    like responses of neo4j's http transactional endpoint.
+    """
 
-    def ping(self):
+    @staticmethod
+    def make_statement(query, parameters=None):
         """
-        Pings the neo4j backend.
-        :return:
+        Makes a statement dictionary for the transactional endpoint.
+        :param query: Cypher query.
+        :type query: str
+        :param parameters: Values for `$param` placeholders in the query.
+        :type parameters: dict
+        :return: statement
+        :rtype: dict
         """
-        neo4j_db_labels_endpoint = "/db/data/labels"
-        ping_url = f"{self._scheme}://{self._host}:{self._port}{neo4j_db_labels_endpoint}"
-        # if we can't contact neo4j, we should exit.
-        try:
-            import time
-            now = time.time()
-            response = requests.get(ping_url, headers=self._header)
-            later = time.time()
-            time_taken = later - now
-            logger.debug(f'Contacting neo4j took {time_taken} seconds.')
-            if time_taken > 5:  # greater than 5 seconds it's not healthy
-                logger.warn(f"Contacting neo4j took more than 5 seconds ({time_taken}). Neo4j might be stressed.")
-            if response.status_code != 200:
-                raise Exception(f'server returned {response.status_code}')
-        except Exception as e:
-            logger.error(f"Error contacting Neo4j @ {ping_url} -- Exception raised -- {e}")
-            logger.debug(traceback.print_exc())
-            raise RuntimeError('Connection to Neo4j could not be established.')
+        statement = {
+            "statement": f"{query}"
+        }
+        if parameters:
+            statement["parameters"] = parameters
+        return statement
 
-    async def run(self, query):
+    async def run(self, query, parameters=None):
         """
         Runs a neo4j query async.
         :param query: Cypher query.
         :type query: str
+        :param parameters: Values for `$param` placeholders in the query.
+        :type parameters: dict
         :return: result of query.
         :rtype: dict
         """
-        # make the statement dictionary
-        payload = {
-            "statements": [
-                {
-                    "statement": f"{query}"
-                }
-            ]
-        }
-
-        response = await self.post_request_json(payload)
-        errors = response.get('errors')
-        if errors:
-            logger.error(f'Neo4j returned `{errors}` for cypher {query}.')
-            raise RuntimeWarning(f'Error running cypher {query}.')
-        return response
+        raise NotImplementedError()
 
-    def run_sync(self, query):
+    def run_sync(self, query, parameters=None):
         """
         Runs a neo4j query. Can cause the async loop to block.
         :param query:
+        :param parameters:
         :return:
         """
-        payload = {
-            "statements": [
-                {
-                    "statement": f"{query}"
-                }
-            ]
-        }
-        response = requests.post(
-            self._full_transaction_path,
-            headers=self._header,
-            json=payload).json()
-        errors = response.get('errors')
-        if errors:
-            logger.error(f'Neo4j returned `{errors}` for cypher {query}.')
-            raise RuntimeWarning(f'Error running cypher {query}.')
-        return response
+        raise NotImplementedError()
+
+    async def stream(self, query, parameters=None):
+        """
+        Runs a neo4j query async, yielding rows as they are read off the response.
+        :param query: Cypher query.
+        :type query: str
+        :param parameters: Values for `$param` placeholders in the query.
+        :type parameters: dict
+        :return: async generator of rows as dicts of column name to value.
+        """
+        async for row in self.stream_statements([(query, parameters)]):
+            yield row
+
+    def stream_statements(self, statements):
+        """
+        Runs several neo4j queries, yielding rows of all of them in order as they are read.
+        :param statements: list of (query, parameters) tuples.
+        :type statements: list
+        :return: async generator of rows as dicts of column name to value.
+        """
+        raise NotImplementedError()
+
+    async def run_batched(self, query, parameters=None):
+        """
+        Runs a neo4j query async, possibly in one round trip with other queries submitted around the same time.
+        :param query: Cypher query.
+        :type query: str
+        :param parameters: Values for `$param` placeholders in the query.
+        :type parameters: dict
+        :return: result of query, same as `run`.
+        :rtype: dict
+        """
+        return await self.run(query, parameters)
+
+    async def close(self):
+        """
+        Closes connections bound to the running event loop. To be called on application shutdown.
+        """
+        pass
+
+    def get_pool_stats(self) -> dict:
+        """
+        Returns connection pool usage metrics.
+        :rtype: dict
+        """
+        return {}
 
     def convert_to_dict(self, response: dict) -> list:
         """
@@ -194,91 +189,677 @@ class Neo4jHTTPDriver:
         return self._supports_apoc
 
 
+class Neo4jHTTPDriver(Neo4jDriver):
+    def __init__(self, host: str, port: int,  auth: set, scheme: str = 'http'):
+        self._host = host
+        # one aiohttp session (and connection pool) per event loop, reused by every statement.
+        self._sessions = {}
+        self._pool_size = int(config.get('neo4j_pool_size', 60))
+        self._keep_alive = float(config.get('neo4j_keep_alive', 30))
+        self._stream_chunk_size = int(config.get('neo4j_stream_chunk_size', 64 * 1024))
+        # statements queued by `run_batched`, per event loop, waiting to be sent in one transaction.
+        self._batches = {}
+        self._batch_window = float(config.get('neo4j_batch_window', 0.002))
+        self._batch_size = int(config.get('neo4j_batch_size', 32))
+        self._pool_stats = {
+            'sessions_created': 0,
+            'requests_total': 0,
+            'requests_in_flight': 0,
+            'requests_in_flight_peak': 0,
+            'batches_sent': 0,
+            'batched_statements': 0,
+            'transactions_terminated': 0
+        }
+        self._neo4j_transaction_endpoint = "/db/data/transaction/commit"
+        self._neo4j_open_transaction_endpoint = "/db/data/transaction"
+        self._scheme = scheme
+        self._full_transaction_path = f"{self._scheme}://{self._host}:{port}{self._neo4j_transaction_endpoint}"
+        self._open_transaction_path = f"{self._scheme}://{self._host}:{port}{self._neo4j_open_transaction_endpoint}"
+        self._port = port
+        self._supports_apoc = None
+        self._header = {
+                'Accept': 'application/json; charset=UTF-8',
+                'Content-Type': 'application/json',
+                'Authorization': 'Basic %s' % base64.b64encode(f"{auth[0]}:{auth[1]}".encode('utf-8')).decode('utf-8')
+            }
+        # ping and raise error if neo4j doesn't respond.
+        logger.debug('PINGING NEO4J')
+        self.ping()
+        self.make_indexes(config.get('edge_index_name', 'edge_id_index'))
+        logger.debug('CHECKING IF NEO4J SUPPORTS APOC')
+        self.check_apoc_support()
+        logger.debug(f'SUPPORTS APOC : {self._supports_apoc}')
+
+    def get_session(self) -> aiohttp.ClientSession:
+        """
+        Returns the session bound to the running event loop, creating it (and its connection pool) on first use.
+        :return: shared client session.
+        :rtype: aiohttp.ClientSession
+        """
+        loop = asyncio.get_event_loop()
+        # drop sessions of loops that are gone, their connections can't be reused anyway.
+        for stale_loop in [l for l in self._sessions if l.is_closed()]:
+            del self._sessions[stale_loop]
+        session = self._sessions.get(loop)
+        if session is None or session.closed:
+            tcp_connector = aiohttp.TCPConnector(limit=self._pool_size, keepalive_timeout=self._keep_alive)
+            session = aiohttp.ClientSession(connector=tcp_connector, headers=self._header)
+            self._sessions[loop] = session
+            self._pool_stats['sessions_created'] += 1
+            logger.debug(f'Created Neo4j connection pool of size {self._pool_size}.')
+        return session
+
+    async def close(self):
+        """
+        Closes the session bound to the running event loop. To be called on application shutdown.
+        """
+        session = self._sessions.pop(asyncio.get_event_loop(), None)
+        if session is not None and not session.closed:
+            await session.close()
+
+    def get_pool_stats(self) -> dict:
+        """
+        Returns connection pool usage metrics.
+        :return: pool size, number of live sessions and request counters.
+        :rtype: dict
+        """
+        stats = dict(self._pool_stats)
+        stats.update({
+            'pool_size': self._pool_size,
+            'keep_alive': self._keep_alive,
+            'open_sessions': len([s for s in self._sessions.values() if not s.closed])
+        })
+        return stats
+
+    def _request_started(self):
+        self._pool_stats['requests_total'] += 1
+        self._pool_stats['requests_in_flight'] += 1
+        self._pool_stats['requests_in_flight_peak'] = max(self._pool_stats['requests_in_flight_peak'],
+                                                          self._pool_stats['requests_in_flight'])
+
+    def _request_finished(self):
+        self._pool_stats['requests_in_flight'] -= 1
+
+    @asynccontextmanager
+    async def transaction_request(self, payload):
+        """
+        Posts statements to neo4j. Without a deadline (see `deadline.py`) they run in a transaction that commits
+        on its own. Under a deadline the call times out with it, and statements run in an open transaction,
+        committed once the response is read to the end, or terminated if the caller gives up on it before that
+        (deadline passed, client disconnected, stopped reading) so neo4j doesn't keep running abandoned queries.
+        :param payload: statements.
+        :type payload: dict
+        :return: async context manager of the response.
+        """
+        session = self.get_session()
+        remaining = deadline.remaining()
+        if remaining is None:
+            async with session.post(self._full_transaction_path, json=payload) as response:
+                yield response
+            return
+        timeout = aiohttp.ClientTimeout(total=deadline.call_timeout())
+        transaction = None
+        try:
+            async with session.post(self._open_transaction_path, json=payload, timeout=timeout) as response:
+                # the transaction is known before its statements are done running.
+                transaction = response.headers.get('Location')
+                yield response
+                read = response.content.at_eof()
+            if transaction is not None and read:
+                async with session.post(f'{transaction}/commit', json={'statements': []}, timeout=timeout) as commit:
+                    # a transaction whose statements failed is already rolled back, and gone.
+                    errors = (await commit.json()).get('errors') if commit.status != 404 else None
+                    if errors:
+                        logger.error(f'Neo4j returned `{errors}` committing {transaction}.')
+                transaction = None
+        finally:
+            if transaction is not None:
+                # sent in the background, the caller might be being cancelled.
+                asyncio.ensure_future(self.terminate_transaction(transaction))
+
+    async def terminate_transaction(self, transaction):
+        """
+        Rolls back an open transaction, terminating the statement it is running if any.
+        :param transaction: url of the transaction.
+        :type transaction: str
+        """
+        try:
+            async with self.get_session().delete(transaction) as response:
+                if response.status not in (200, 404):
+                    logger.warning(f'Could not terminate neo4j transaction {transaction} -- {response.status}')
+                    return
+            self._pool_stats['transactions_terminated'] += 1
+            logger.info(f'Terminated neo4j transaction {transaction}.')
+        except Exception as e:
+            logger.warning(f'Could not terminate neo4j transaction {transaction} -- {e}')
+
+    async def post_request_json(self, payload):
+        """
+        Posts statements to neo4j and reads the whole response.
+        :param payload: statements.
+        :type payload: dict
+        :return: response json.
+        :rtype: dict
+        :raises RuntimeWarning: if neo4j didn't answer with a result.
+        """
+        self._request_started()
+        try:
+            async with self.transaction_request(payload) as response:
+                if response.status not in (200, 201):
+                    logger.error(f"[x] Problem contacting Neo4j server {self._host}:{self._port} -- {response.status}")
+                    txt = await response.text()
+                    logger.debug(f"[x] Server responded with {txt}")
+                    raise RuntimeWarning(f'Neo4j server responded with status {response.status} -- {txt}')
+                return await response.json()
+        finally:
+            self._request_finished()
+
+    async def stream_statements(self, statements):
+        """
+        Runs several neo4j queries in one transaction, yielding rows of all of them in order as they are read off
+        the response.
+        :param statements: list of (query, parameters) tuples.
+        :type statements: list
+        :return: async generator of rows as dicts of column name to value.
+        """
+        payload = {
+            "statements": [
+                self.make_statement(query, parameters) for query, parameters in statements
+            ]
+        }
+        queries = '; '.join(query for query, _ in statements)
+        self._request_started()
+        try:
+            async with self.transaction_request(payload) as response:
+                if response.status not in (200, 201):
+                    logger.error(f"[x] Problem contacting Neo4j server {self._host}:{self._port} -- {response.status}")
+                    txt = await response.text()
+                    logger.debug(f"[x] Server responded with {txt}")
+                    raise RuntimeWarning(f'Error running cypher {queries}.')
+                parser = Neo4jResponseParser(response.content.iter_chunked(self._stream_chunk_size))
+                async for row in parser.rows():
+                    yield row
+                if parser.errors:
+                    logger.error(f'Neo4j returned `{parser.errors}` for cypher {queries}.')
+                    raise RuntimeWarning(f'Error running cypher {queries}.')
+        finally:
+            self._request_finished()
+
+    async def run_batched(self, query, parameters=None):
+        """
+        Runs a neo4j query async, along with any other statements queued within a short window
+        (`neo4j_batch_window` seconds, up to `neo4j_batch_size` statements) in a single transaction.
+        :param query: Cypher query.
+        :type query: str
+        :param parameters: Values for `$param` placeholders in the query.
+        :type parameters: dict
+        :return: result of query, same as `run`.
+        :rtype: dict
+        """
+        loop = asyncio.get_event_loop()
+        result = loop.create_future()
+        batch = self._batches.get(loop)
+        if batch is None:
+            batch = self._batches[loop] = []
+            loop.call_later(self._batch_window, self._flush_batch, loop, batch)
+        batch.append((query, parameters, result, deadline.current()))
+        if len(batch) >= self._batch_size:
+            self._flush_batch(loop, batch)
+        return await result
+
+    def _flush_batch(self, loop, batch):
+        # the batch might have been flushed already for being full.
+        if self._batches.get(loop) is batch:
+            del self._batches[loop]
+            asyncio.ensure_future(self._send_batch(batch))
+
+    async def _send_batch(self, batch):
+        """
+        Sends queued statements in one transaction and hands each caller its result.
+        """
+        # statements of several requests share the batch, it's given up on once all of them are.
+        caller_deadlines = [caller_deadline for _, _, _, caller_deadline in batch]
+        deadline.set_deadline(None if None in caller_deadlines else max(caller_deadlines))
+        self._pool_stats['batches_sent'] += 1
+        self._pool_stats['batched_statements'] += len(batch)
+        if len(batch) == 1:
+            query, parameters, result, _ = batch[0]
+            await self._run_into(result, query, parameters)
+            return
+        payload = {
+            "statements": [self.make_statement(query, parameters) for query, parameters, _, _ in batch]
+        }
+        try:
+            response = await self.post_request_json(payload)
+        except Exception as e:
+            for _, _, result, _ in batch:
+                if not result.done():
+                    result.set_exception(e)
+            return
+        if response.get('errors'):
+            # the whole transaction was rolled back, run statements on their own so only the bad ones fail.
+            await asyncio.gather(*[self._run_into(result, query, parameters)
+                                   for query, parameters, result, _ in batch])
+            return
+        for (_, _, result, _), statement_result in zip(batch, response['results']):
+            if not result.done():
+                result.set_result({'results': [statement_result], 'errors': []})
+
+    async def _run_into(self, result, query, parameters):
+        try:
+            response = await self.run(query, parameters)
+            if not result.done():
+                result.set_result(response)
+        except Exception as e:
+            if not result.done():
+                result.set_exception(e)
+
+    def ping(self):
+        """
+        Pings the neo4j backend.
+        :return:
+        """
+        neo4j_db_labels_endpoint = "/db/data/labels"
+        ping_url = f"{self._scheme}://{self._host}:{self._port}{neo4j_db_labels_endpoint}"
+        # if we can't contact neo4j, we should exit.
+        try:
+            import time
+            now = time.time()
+            response = requests.get(ping_url, headers=self._header)
+            later = time.time()
+            time_taken = later - now
+            logger.debug(f'Contacting neo4j took {time_taken} seconds.')
+            if time_taken > 5:  # greater than 5 seconds it's not healthy
+                logger.warn(f"Contacting neo4j took more than 5 seconds ({time_taken}). Neo4j might be stressed.")
+            if response.status_code != 200:
+                raise Exception(f'server returned {response.status_code}')
+        except Exception as e:
+            logger.error(f"Error contacting Neo4j @ {ping_url} -- Exception raised -- {e}")
+            logger.debug(traceback.print_exc())
+            raise RuntimeError('Connection to Neo4j could not be established.')
+
+    async def run(self, query, parameters=None):
+        """
+        Runs a neo4j query async.
+        :param query: Cypher query.
+        :type query: str
+        :param parameters: Values for `$param` placeholders in the query.
+        :type parameters: dict
+        :return: result of query.
+        :rtype: dict
+        """
+        # make the statement dictionary
+        payload = {
+            "statements": [
+                self.make_statement(query, parameters)
+            ]
+        }
+
+        response = await self.post_request_json(payload)
+        errors = response.get('errors')
+        if errors:
+            logger.error(f'Neo4j returned `{errors}` for cypher {query}.')
+            raise RuntimeWarning(f'Error running cypher {query}.')
+        return response
+
+    def run_sync(self, query, parameters=None):
+        """
+        Runs a neo4j query. Can cause the async loop to block.
+        :param query:
+        :param parameters:
+        :return:
+        """
+        payload = {
+            "statements": [
+                self.make_statement(query, parameters)
+            ]
+        }
+        response = requests.post(
+            self._full_transaction_path,
+            headers=self._header,
+            json=payload).json()
+        errors = response.get('errors')
+        if errors:
+            logger.error(f'Neo4j returned `{errors}` for cypher {query}.')
+            raise RuntimeWarning(f'Error running cypher {query}.')
+        return response
+
 class GraphInterface:
     """
     Singleton class for interfacing with the graph.
     """
 
     class _GraphInterface:
-        def __init__(self, host, port, auth):
-            self.driver = Neo4jHTTPDriver(host=host, port=port, auth=auth)
+        def __init__(self, host, port, auth, build_tag=None):
+            self.driver = self.make_driver(host, port, auth)
             self.schema = None
             self.summary = None
+            # summary being built, and how far along it is.
+            self.partial_summary = {}
+            self.summary_progress = {'status': 'pending', 'total': 0, 'completed': 0, 'timings': {}}
+            self._summary_task = None
+            # nodes with at least `min_degree` edges are marked with their degree, see `build_hub_index`.
+            self.hub_index = None
+            self._hub_index_task = None
+            self.fingerprint = None
+            # set when the loaded snapshot is of an older state of the graph, see `refresh_snapshot`.
+            self.snapshot_stale = False
+            self.snapshot = GraphSnapshot(build_tag, config.get('graph_snapshot_dir')) if build_tag else None
+
+        @staticmethod
+        def make_driver(host, port, auth) -> Neo4jDriver:
+            """
+            Makes the driver selected by `neo4j_driver` config, `http` (default) or `bolt`. Falls back to http if
+            bolt can't be used.
+            :param host: neo4j host.
+            :param port: neo4j http port.
+            :param auth: username and password.
+            :return: driver
+            :rtype: Neo4jDriver
+            """
+            if config.get('neo4j_driver', 'http') == 'bolt':
+                try:
+                    from PLATER.services.util.bolt_driver import Neo4jBoltDriver
+                    return Neo4jBoltDriver(host=host, port=config.get('NEO4J_BOLT_PORT', 7687), auth=auth)
+                except Exception as e:
+                    logger.warning(f'Could not use bolt driver, falling back to http -- {e}')
+            return Neo4jHTTPDriver(host=host, port=port, auth=auth)
 
         def get_schema(self):
             """
-            Gets the schema of the graph. To be used by. Also generates graph summary
+            Gets the schema of the graph. To be used by.
+            Schema and summary are read from the build's snapshot if there is one, otherwise the schema is
+            generated; the summary is built by `get_summary` or `build_summary`, which then save the snapshot.
+            The graph's fingerprint is taken on the way, see `get_fingerprint`.
             :return: Dict of structure source label as outer most keys, target labels as inner keys and list of predicates
             as value.
             :rtype: dict
             """
             self.schema_raw_result = {}
             if self.schema is None:
-                query = """
-                           MATCH (a)-[x]->(b) WITH
-                               filter(la in labels(a) where not la in ['Concept']) as las,
-                               filter(lb in labels(b) where not lb in ['Concept']) as lbs,
-                           type(x) as predicate
-                           UNWIND las as source_label
-                           UNWIND lbs as target_label 
-                           RETURN DISTINCT source_label, predicate, target_label
-                           """
-                result = self.driver.run_sync(query)
-                structured = self.convert_to_dict(result)
-                self.schema_raw_result = structured
-                schema_bag = {}
-                for triplet in structured:
-                    subject = triplet['source_label']
-                    predicate = triplet['predicate']
-                    objct = triplet['target_label']
-                    if subject not in schema_bag:
-                        schema_bag[subject] = {}
-                    if objct not in schema_bag[subject]:
-                        schema_bag[subject][objct] = []
-                    if predicate not in schema_bag[subject][objct]:
-                        schema_bag[subject][objct].append(predicate)
-                    # do reverse
-                    if objct not in schema_bag:
-                        schema_bag[objct] = {}
-                    if subject not in schema_bag[objct]:
-                        schema_bag[objct][subject] = []
-                    if predicate not in schema_bag[objct][subject]:
-                        schema_bag[objct][subject].append(predicate)
-                self.schema = schema_bag
-                if not self.summary:
-                    logger.info('generating graph summary')
-                    query = """
-                    MATCH (c) RETURN DISTINCT labels(c) as types, count(c) as count                
-                    """
-                    raw = self.convert_to_dict(self.driver.run_sync(query))
-                    summary = {
-
-                    }
-                    for node in raw:
-                        labels = node['types']
-                        count = node['count']
-                        query = f"""
-                        MATCH (:{':'.join(labels)})-[e]->(b) WITH DISTINCT e , b 
-                        RETURN 
-                            type(e) as edge_types, 
-                            count(e) as edge_counts,
-                            labels(b) as target_labels 
-                        """
-                        raw = self.convert_to_dict(self.driver.run_sync(query))
-                        summary_key = ':'.join(labels)
-                        summary[summary_key] = {
-                            'nodes_count': count
-                        }
-                        for row in raw:
-                            target_key = ':'.join(row['target_labels'])
-                            edge_name = row['edge_types']
-                            edge_count = row['edge_counts']
-                            summary[summary_key][target_key] = summary[summary_key].get(target_key, {})
-                            summary[summary_key][target_key][edge_name] = edge_count
-                    self.summary = summary
-                    logger.info(f'generated summary for {len(summary)} node types.')
+                self.fingerprint = self.get_fingerprint()
+                if self.snapshot:
+                    self.load_snapshot()
+                if self.schema is None:
+                    self.schema = self.generate_schema()
             return self.schema
 
+        def get_summary(self):
+            """
+            Gets the summary of the graph, generating it if needed. Blocks until it's ready.
+            :return: summary
+            :rtype: dict
+            """
+            self.get_schema()
+            if self.summary is None:
+                self.summary = self.generate_summary()
+                self.save_snapshot()
+            return self.summary
+
+        async def build_summary(self):
+            """
+            Generates the summary of the graph in the background of a running event loop, if it's not there yet.
+            Meanwhile `partial_summary` and `summary_progress` show how far it got.
+            """
+            if self.summary is not None:
+                return self.summary
+            if self._summary_task is None or self._summary_task.done():
+                self._summary_task = asyncio.ensure_future(self.generate_summary_async())
+            summary = await asyncio.shield(self._summary_task)
+            if self.summary is None:
+                self.summary = summary
+                self.save_snapshot()
+            return self.summary
+
+        def covers_connectivity(self, max_connectivity: int) -> bool:
+            """
+            Tells if the hub index can exclude nodes with `max_connectivity` or more edges. It only marks nodes with
+            at least `hub_min_degree` (config) edges, and isn't there until `build_hub_index` is done.
+            :param max_connectivity: degree from which nodes are hubs.
+            :type max_connectivity: int
+            :rtype: bool
+            """
+            return self.hub_index is not None and max_connectivity >= self.hub_index['min_degree']
+
+        async def build_hub_index(self):
+            """
+            Sets the degree of nodes with at least `hub_min_degree` (config) edges as their `HUB_DEGREE_PROPERTY`,
+            so queries can leave hubs out without counting degrees. Done once per build, the index is recorded in
+            the build's snapshot. To be run at start up, not from within a request.
+            This writes to the graph, so it's only done if `hub_index_write` (config) is on, which should be the
+            case for a single instance per graph. Otherwise, or if writing fails, queries count degrees.
+            """
+            if str(config.get('hub_index_write', False)).lower() not in ('true', '1', 'yes'):
+                return self.hub_index
+            min_degree = int(config.get('hub_min_degree', 1000))
+            if self.hub_index is not None and self.hub_index['min_degree'] <= min_degree:
+                return self.hub_index
+            if self._hub_index_task is None or self._hub_index_task.done():
+                self._hub_index_task = asyncio.ensure_future(self.generate_hub_index(min_degree))
+            try:
+                self.hub_index = await asyncio.shield(self._hub_index_task)
+            except Exception as e:
+                logger.error(f'Failed to build hub index, degrees are counted by queries instead -- {e}')
+                logger.debug(traceback.format_exc())
+                return self.hub_index
+            self.save_snapshot()
+            return self.hub_index
+
+        async def generate_hub_index(self, min_degree: int):
+            """
+            Marks the nodes with at least `min_degree` edges with their degree, clearing marks left by a previous
+            index.
+            :param min_degree: least degree of the nodes marked.
+            :type min_degree: int
+            :return: hub index, `min_degree` and number of `nodes` marked.
+            :rtype: dict
+            """
+            # scans the whole graph, it's not bound by the deadline of whichever request is running.
+            deadline.clear()
+            logger.info(f'indexing nodes with {min_degree} or more edges.')
+            start = time.time()
+            await self.driver.run(f"""
+            MATCH (n:named_thing) WHERE exists(n.{HUB_DEGREE_PROPERTY}) REMOVE n.{HUB_DEGREE_PROPERTY}
+            """)
+            response = await self.driver.run(f"""
+            MATCH (n:named_thing) WITH n, size((n)-[]-()) as degree
+            WHERE degree >= $min_degree
+            SET n.{HUB_DEGREE_PROPERTY} = degree
+            RETURN count(n) as nodes
+            """, {'min_degree': min_degree})
+            nodes = self.convert_to_dict(response)[0]['nodes']
+            logger.info(f'indexed {nodes} hub nodes in {time.time() - start:.2f} seconds.')
+            return {'min_degree': min_degree, 'nodes': nodes}
+
+        def save_snapshot(self):
+            if self.snapshot and self.schema is not None and self.summary is not None:
+                self.snapshot.save(self.schema, self.summary, self.fingerprint, self.hub_index)
+
+        def load_snapshot(self):
+            """
+            Loads schema and summary from the build's snapshot. If the graph changed since the snapshot was taken
+            the snapshot is still used, until `refresh_snapshot` replaces it.
+            """
+            snapshot = self.snapshot.load()
+            if not snapshot:
+                return
+            logger.info(f'Loaded graph schema and summary from {self.snapshot.path}.')
+            self.schema = snapshot['schema']
+            self.summary = snapshot['summary']
+            self.hub_index = snapshot.get('hub_index')
+            self.summary_progress['status'] = 'done'
+            if snapshot['fingerprint'] != self.fingerprint:
+                logger.warning(f'Graph changed since snapshot {self.snapshot.path} was taken, refreshing it once '
+                               f'the server is up.')
+                self.snapshot_stale = True
+
+        async def refresh_snapshot(self):
+            """
+            Regenerates schema, summary and hub index of a graph that changed since its snapshot was taken, and
+            saves them to the build's snapshot. Runs as a task of the server's event loop, which serves the old
+            ones meanwhile and swaps in the new ones at once.
+            """
+            if not self.snapshot_stale:
+                return
+            self.snapshot_stale = False
+            try:
+                schema = self.make_schema([row async for row in self.driver.stream(self.SCHEMA_QUERY)])
+                summary = await self.generate_summary_async()
+                self.schema, self.summary, self.hub_index = schema, summary, None
+                self.save_snapshot()
+                await self.build_hub_index()
+            except Exception as e:
+                logger.error(f'Failed to refresh graph snapshot -- {e}')
+                logger.debug(traceback.format_exc())
+
+        def get_fingerprint(self):
+            """
+            Cheap counts identifying the state of the graph. Uses apoc.meta.stats if available, otherwise
+            count store backed queries.
+            :return: node, relationship, label and relationship type counts.
+            :rtype: dict
+            """
+            if self.supports_apoc():
+                query = """
+                CALL apoc.meta.stats() YIELD nodeCount, relCount, labels, relTypesCount
+                RETURN nodeCount, relCount, labels, relTypesCount
+                """
+                return self.convert_to_dict(self.driver.run_sync(query))[0]
+            fingerprint = {}
+            for query in ['MATCH (n) RETURN count(n) as nodeCount',
+                          'MATCH ()-[r]->() RETURN count(r) as relCount',
+                          'CALL db.labels() YIELD label RETURN collect(label) as labels',
+                          'CALL db.relationshipTypes() YIELD relationshipType '
+                          'RETURN collect(relationshipType) as relTypes']:
+                fingerprint.update(self.convert_to_dict(self.driver.run_sync(query))[0])
+            fingerprint['labels'] = sorted(fingerprint['labels'])
+            fingerprint['relTypes'] = sorted(fingerprint['relTypes'])
+            return fingerprint
+
+        SCHEMA_QUERY = """
+                       MATCH (a)-[x]->(b) WITH
+                           filter(la in labels(a) where not la in ['Concept']) as las,
+                           filter(lb in labels(b) where not lb in ['Concept']) as lbs,
+                       type(x) as predicate
+                       UNWIND las as source_label
+                       UNWIND lbs as target_label 
+                       RETURN DISTINCT source_label, predicate, target_label
+                       """
+
+        def generate_schema(self):
+            """
+            Scans the graph for source label, predicate, target label triplets.
+            :return: schema
+            :rtype: dict
+            """
+            result = self.driver.run_sync(self.SCHEMA_QUERY)
+            return self.make_schema(self.convert_to_dict(result))
+
+        def make_schema(self, structured):
+            """
+            Arranges source label, predicate, target label triplets into the schema.
+            :param structured: rows of `SCHEMA_QUERY`.
+            :type structured: list
+            :return: schema
+            :rtype: dict
+            """
+            self.schema_raw_result = structured
+            schema_bag = {}
+            for triplet in structured:
+                subject = triplet['source_label']
+                predicate = triplet['predicate']
+                objct = triplet['target_label']
+                if subject not in schema_bag:
+                    schema_bag[subject] = {}
+                if objct not in schema_bag[subject]:
+                    schema_bag[subject][objct] = []
+                if predicate not in schema_bag[subject][objct]:
+                    schema_bag[subject][objct].append(predicate)
+                # do reverse
+                if objct not in schema_bag:
+                    schema_bag[objct] = {}
+                if subject not in schema_bag[objct]:
+                    schema_bag[objct][subject] = []
+                if predicate not in schema_bag[objct][subject]:
+                    schema_bag[objct][subject].append(predicate)
+            return schema_bag
+
+        def generate_summary(self):
+            """
+            Generates the summary of the graph, blocking until it's done. For use outside of a running event loop.
+            :return: summary
+            :rtype: dict
+            """
+            async def generate():
+                try:
+                    return await self.generate_summary_async()
+                finally:
+                    await self.driver.close()
+
+            event_loop = asyncio.new_event_loop()
+            try:
+                return event_loop.run_until_complete(generate())
+            finally:
+                event_loop.close()
+
+        async def generate_summary_async(self, concurrency=None):
+            """
+            Counts nodes per label combination, and edges per predicate and target label combination. Label
+            combinations are counted concurrently, at most `concurrency` (`summary_concurrency` config) at a time.
+            :param concurrency: max number of label combinations counted at once.
+            :type concurrency: int
+            :return: summary
+            :rtype: dict
+            """
+            concurrency = concurrency or int(config.get('summary_concurrency', 8))
+            logger.info(f'generating graph summary, {concurrency} label combinations at a time.')
+            start = time.time()
+            query = """
+            MATCH (c) RETURN DISTINCT labels(c) as types, count(c) as count                
+            """
+            raw = [row async for row in self.driver.stream(query)]
+            summary = {
+
+            }
+            self.partial_summary = summary
+            self.summary_progress = {'status': 'in_progress', 'total': len(raw), 'completed': 0, 'timings': {}}
+            limiter = asyncio.Semaphore(concurrency)
+
+            async def summarize(labels, count):
+                query = f"""
+                MATCH (:{':'.join(labels)})-[e]->(b) WITH DISTINCT e , b 
+                RETURN 
+                    type(e) as edge_types, 
+                    count(e) as edge_counts,
+                    labels(b) as target_labels 
+                """
+                async with limiter:
+                    label_start = time.time()
+                    rows = [row async for row in self.driver.stream(query)]
+                summary_key = ':'.join(labels)
+                summary[summary_key] = {
+                    'nodes_count': count
+                }
+                for row in rows:
+                    target_key = ':'.join(row['target_labels'])
+                    edge_name = row['edge_types']
+                    edge_count = row['edge_counts']
+                    summary[summary_key][target_key] = summary[summary_key].get(target_key, {})
+                    summary[summary_key][target_key][edge_name] = edge_count
+                self.summary_progress['timings'][summary_key] = time.time() - label_start
+                self.summary_progress['completed'] += 1
+                logger.debug(f'summarized {summary_key} in {self.summary_progress["timings"][summary_key]:.2f} '
+                             f'seconds ({self.summary_progress["completed"]}/{self.summary_progress["total"]}).')
+
+            try:
+                await asyncio.gather(*[summarize(node['types'], node['count']) for node in raw])
+            except Exception:
+                self.summary_progress['status'] = 'failed'
+                raise
+            self.summary_progress['status'] = 'done'
+            logger.info(f'generated summary for {len(summary)} node types in {time.time() - start:.2f} seconds.')
+            return summary
+
         async def get_mini_schema(self, source_id, target_id):
             """
             Given either id of source and/or target returns predicates that relate them. And their
@@ -326,9 +907,12 @@ class GraphInterface:
             if len(data):
                 from functools import reduce
                 rows = reduce(lambda x, y: x + y.get('row', []), data, [])
+            for node in rows:
+                node.pop(HUB_DEGREE_PROPERTY, None)
             return rows
 
-        async def get_single_hops(self, source_type: str, target_type: str, curie: str) -> list:
+        async def get_single_hops(self, source_type: str, target_type: str, curie: str, limit: int = None,
+                                  offset: int = 0) -> list:
             """
             Returns a triplets of source to target where source id is curie.
             :param source_type: Type of the source node.
@@ -337,28 +921,70 @@ class GraphInterface:
             :type target_type: str
             :param curie: Curie of source node.
             :type curie: str
+            :param limit: Max number of triplets to return, all if None.
+            :type limit: int
+            :param offset: Number of triplets to skip.
+            :type offset: int
             :return: list of triplets where each item contains source node, edge, target.
             :rtype: list
             """
-
-            query = f'MATCH (c:{source_type}{{id: \'{curie}\'}})-[e]->(b:{target_type}) return distinct c , e, b'
-            response = await self.driver.run(query)
-            rows = list(map(lambda data: data['row'], response['results'][0]['data']))
-            query = f'MATCH (c:{source_type}{{id: \'{curie}\'}})<-[e]-(b:{target_type}) return distinct b , e, c'
-            response = await self.driver.run(query)
-            rows += list(map(lambda data: data['row'], response['results'][0]['data']))
-
+            # outgoing and incoming edges in one go, each triplet is ordered by the edge's direction.
+            query = f"""
+            MATCH (c:{source_type}{{id: $curie}})-[e]-(b:{target_type})
+            WITH DISTINCT c, e, b
+            RETURN CASE WHEN startNode(e) = c THEN c ELSE b END AS source,
+                   e,
+                   CASE WHEN startNode(e) = c THEN b ELSE c END AS target
+            """
+            parameters = {'curie': curie}
+            if limit is not None or offset:
+                # stable order so pages don't overlap
+                query += ' ORDER BY id(e) SKIP $offset'
+                parameters['offset'] = offset
+                if limit is not None:
+                    query += ' LIMIT $limit'
+                    parameters['limit'] = limit
+            rows = [list(row.values()) async for row in self.driver.stream(query, parameters)]
+            for source, _, target in rows:
+                source.pop(HUB_DEGREE_PROPERTY, None)
+                target.pop(HUB_DEGREE_PROPERTY, None)
             return rows
 
-        async def run_cypher(self, cypher: str) -> list:
+        async def run_cypher(self, cypher: str, parameters: dict = None) -> list:
             """
             Runs cypher directly.
             :param cypher: cypher query.
             :type cypher: str
+            :param parameters: values for `$param` placeholders in the cypher.
+            :type parameters: dict
             :return: unprocessed neo4j response.
             :rtype: list
             """
-            return await self.driver.run(cypher)
+            return await self.driver.run(cypher, parameters)
+
+        async def run_cypher_batched(self, cypher: str, parameters: dict = None) -> list:
+            """
+            Runs cypher, in one transaction with any other cypher submitted around the same time.
+            :param cypher: cypher query.
+            :type cypher: str
+            :param parameters: values for `$param` placeholders in the cypher.
+            :type parameters: dict
+            :return: rows as dicts of column name to value.
+            :rtype: list
+            """
+            return self.convert_to_dict(await self.driver.run_batched(cypher, parameters))
+
+        async def stream_cypher(self, cypher: str, parameters: dict = None):
+            """
+            Runs cypher, yielding rows as they are read off the neo4j response.
+            :param cypher: cypher query.
+            :type cypher: str
+            :param parameters: values for `$param` placeholders in the cypher.
+            :type parameters: dict
+            :return: async generator of rows as dicts of column name to value.
+            """
+            async for row in self.driver.stream(cypher, parameters):
+                yield row
 
         async def get_sample(self, node_type):
             """
@@ -408,29 +1034,63 @@ class GraphInterface:
             :param ids:
             :return: dictionary of edges and source and target nodes ids
             """
-            query = f"""
+            query = """
                         MATCH (node:named_thing)
                         USING INDEX node:named_thing(id)
-                        WHERE node.id in {ids}
+                        WHERE node.id in $ids
                         WITH collect(node) as nodes
                         CALL apoc.algo.cover(nodes) yield rel
-                        WITH {{source_id: startNode(rel).id ,
+                        WITH {source_id: startNode(rel).id ,
                                target_id: endNode(rel).id,
-                               edge: rel }} as row
-                        return collect(row) as result                                        
+                               edge: rel } as row
+                        return collect(row) as result
+                        """
+            result = self.convert_to_dict(await self.driver.run(query, {'ids': ids}))
+            return result
+
+        async def run_node_set_edges(self, ids: list):
+            """
+            Finds the edges among a set of nodes without apoc, returns the same as `run_apoc_cover`.
+            :param ids: node ids.
+            :return: dictionary of edges and source and target nodes ids
+            """
+            # edges are matched from their source node only, so each one comes back once.
+            query = """
+                        UNWIND $ids as source_id
+                        MATCH (a:named_thing {id: source_id})-[rel]->(b:named_thing)
+                        WHERE b.id in $ids
+                        WITH {source_id: a.id,
+                              target_id: b.id,
+                              edge: rel } as row
+                        return collect(row) as result
                         """
-            result = self.convert_to_dict(self.driver.run_sync(query))
+            result = self.convert_to_dict(await self.driver.run(query, {'ids': ids}))
             return result
 
         def convert_to_dict(self, result):
             return self.driver.convert_to_dict(result)
 
+        async def close(self):
+            """
+            Releases driver connections held by the running event loop.
+            """
+            await self.driver.close()
+
+        def get_pool_stats(self):
+            """
+            Returns connection pool usage metrics of the driver.
+            :return: pool metrics.
+            :rtype: dict
+            """
+            return self.driver.get_pool_stats()
+
     instance = None
 
-    def __init__(self, host, port, auth):
+    def __init__(self, host, port, auth, build_tag=None):
         # create a new instance if not already created.
         if not GraphInterface.instance:
-            GraphInterface.instance = GraphInterface._GraphInterface(host=host, port=port, auth=auth)
+            GraphInterface.instance = GraphInterface._GraphInterface(host=host, port=port, auth=auth,
+                                                                     build_tag=build_tag)
 
     def __getattr__(self, item):
         # proxy function calls to the inner object.
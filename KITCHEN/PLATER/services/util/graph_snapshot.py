@@ -0,0 +1,69 @@
+import json
+import os
+import time
+
+from PLATER.services.config import config
+from PLATER.services.util.logutil import LoggingUtil
+
+logger = LoggingUtil.init_logging(__name__,
+                                  config.get('logging_level'),
+                                  config.get('logging_format')
+                                  )
+
+
+class GraphSnapshot:
+    """
+    Versioned file holding the schema, summary and hub index of a graph build, so they are computed once per build
+    instead of on every start up.
+    """
+    VERSION = 1
+
+    def __init__(self, build_tag: str, snapshot_dir: str = None):
+        self.build_tag = build_tag
+        self.snapshot_dir = snapshot_dir or os.path.join(os.path.dirname(__file__), '..', '..', 'logs')
+        self.path = os.path.join(self.snapshot_dir, f'graph_snapshot_{build_tag}.json')
+
+    def load(self):
+        """
+        Reads the snapshot of the build.
+        :return: snapshot with `schema`, `summary` and `fingerprint` keys, and `hub_index` once built. None if there
+        is no usable snapshot.
+        :rtype: dict
+        """
+        if not os.path.exists(self.path):
+            return None
+        try:
+            with open(self.path) as snapshot_file:
+                snapshot = json.load(snapshot_file)
+        except Exception as e:
+            logger.warning(f'Could not read graph snapshot {self.path} -- {e}')
+            return None
+        if snapshot.get('version') != GraphSnapshot.VERSION or snapshot.get('build_tag') != self.build_tag:
+            logger.info(f'Ignoring graph snapshot {self.path}, it was made by a different version or build.')
+            return None
+        return snapshot
+
+    def save(self, schema: dict, summary: dict, fingerprint: dict, hub_index: dict = None):
+        """
+        Writes the snapshot of the build.
+        :param schema: graph schema.
+        :param summary: graph summary.
+        :param fingerprint: counts identifying the state of the graph the snapshot was made from.
+        :param hub_index: marked high degree nodes, see `GraphInterface.build_hub_index`.
+        """
+        snapshot = {
+            'version': GraphSnapshot.VERSION,
+            'build_tag': self.build_tag,
+            'created': time.time(),
+            'fingerprint': fingerprint,
+            'schema': schema,
+            'summary': summary
+        }
+        if hub_index is not None:
+            snapshot['hub_index'] = hub_index
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+        # write to a temp file first so a crash can't leave a broken snapshot behind.
+        with open(self.path + '.tmp', 'w') as snapshot_file:
+            json.dump(snapshot, snapshot_file)
+        os.replace(self.path + '.tmp', self.path)
+        logger.info(f'Saved graph snapshot to {self.path}.')
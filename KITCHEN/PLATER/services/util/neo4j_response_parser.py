@@ -0,0 +1,157 @@
+import codecs
+import json
+
+
+class Neo4jResponseParser:
+    """
+    Incremental parser for responses of neo4j's transactional http endpoint. Looks like
+    ```
+    {
+        "results": [{"columns": ["a", "b"], "data": [{"row": [.., ..], "meta": [..]}, ...]}, ...],
+        "errors": [...]
+    }
+    ```
+    Rows are decoded one at a time as the body is read, so the whole body never has to be held in memory.
+    """
+    WHITE_SPACE = ' \t\n\r'
+
+    def __init__(self, chunks):
+        """
+        :param chunks: async iterable of the body as bytes.
+        """
+        self._chunks = chunks.__aiter__()
+        self._text_decoder = codecs.getincrementaldecoder('utf-8')()
+        self._json_decoder = json.JSONDecoder()
+        self._buffer = ''
+        self._position = 0
+        self._eof = False
+        # index of the statement rows being read belong to.
+        self.statement_index = -1
+        self.errors = []
+        # any other top level entries, eg. `commit` or `transaction` for open transactions.
+        self.extras = {}
+
+    async def _read_chunk(self):
+        """
+        Appends the next chunk to the buffer, dropping what was already consumed.
+        :return: False if there is nothing left to read.
+        """
+        if self._eof:
+            return False
+        try:
+            chunk = await self._chunks.__anext__()
+        except StopAsyncIteration:
+            self._eof = True
+            self._buffer = self._buffer[self._position:] + self._text_decoder.decode(b'', final=True)
+            self._position = 0
+            return False
+        self._buffer = self._buffer[self._position:] + self._text_decoder.decode(chunk)
+        self._position = 0
+        return True
+
+    async def _peek(self):
+        """
+        Returns next non white space character without consuming it.
+        """
+        while True:
+            while self._position < len(self._buffer) and self._buffer[self._position] in self.WHITE_SPACE:
+                self._position += 1
+            if self._position < len(self._buffer):
+                return self._buffer[self._position]
+            if not await self._read_chunk():
+                raise ValueError('Unexpected end of neo4j response.')
+
+    async def _expect(self, characters):
+        """
+        Consumes next non white space character, which should be one of `characters`.
+        """
+        character = await self._peek()
+        if character not in characters:
+            raise ValueError(f'Expected one of `{characters}` in neo4j response at {self._position} got `{character}`.')
+        self._position += 1
+        return character
+
+    async def _read_value(self):
+        """
+        Decodes next json value.
+        """
+        await self._peek()
+        while True:
+            try:
+                value, end = self._json_decoder.raw_decode(self._buffer, self._position)
+                # numbers at the end of the buffer might continue in the next chunk.
+                if end < len(self._buffer) or self._eof or \
+                        not isinstance(value, (int, float)) or isinstance(value, bool):
+                    self._position = end
+                    return value
+            except json.JSONDecodeError:
+                if self._eof:
+                    raise
+            # grow the buffer geometrically before retrying, so large values are decoded in linear time.
+            target_size = 2 * (len(self._buffer) - self._position)
+            while len(self._buffer) - self._position < target_size and await self._read_chunk():
+                pass
+
+    async def _read_key(self):
+        key = await self._read_value()
+        await self._expect(':')
+        return key
+
+    async def _members(self):
+        """
+        Iterates over keys of the object about to be read, the value of each key is to be consumed by the caller.
+        """
+        await self._expect('{')
+        if await self._peek() == '}':
+            self._position += 1
+            return
+        while True:
+            yield await self._read_key()
+            if await self._expect(',}') == '}':
+                return
+
+    async def _elements(self):
+        """
+        Iterates over elements of the array about to be read, each element is to be consumed by the caller.
+        """
+        await self._expect('[')
+        if await self._peek() == ']':
+            self._position += 1
+            return
+        while True:
+            yield
+            if await self._expect(',]') == ']':
+                return
+
+    async def rows(self):
+        """
+        Yields rows of every statement result as dicts of column name to value.
+        """
+        async for key in self._members():
+            if key == 'results':
+                async for _ in self._elements():
+                    self.statement_index += 1
+                    async for row in self._result_rows():
+                        yield row
+            elif key == 'errors':
+                self.errors = await self._read_value()
+            else:
+                self.extras[key] = await self._read_value()
+
+    async def _result_rows(self):
+        columns = None
+        data = None
+        async for key in self._members():
+            if key == 'data' and columns is not None:
+                async for _ in self._elements():
+                    item = await self._read_value()
+                    yield dict(zip(columns, item.get('row', [])))
+            elif key == 'data':
+                data = await self._read_value()
+            elif key == 'columns':
+                columns = await self._read_value()
+            else:
+                await self._read_value()
+        # columns came after data
+        for item in data or []:
+            yield dict(zip(columns or [], item.get('row', [])))
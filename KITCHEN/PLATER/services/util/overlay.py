@@ -1,11 +1,61 @@
+import asyncio
+from itertools import combinations
+
+from PLATER.services.config import config
+from PLATER.services.util.binding_index import BindingIndex
 from PLATER.services.util.graph_adapter import GraphInterface
 from PLATER.services.util.question import Question
-from functools import reduce
+from PLATER.services.util.support_edge_cache import SupportEdgeCache
+
+
+class NodePairIndex:
+    """
+    Support edges of a chunk of answers, as adjacency lists over interned node numbers so binding them to each
+    answer is a pass over the edges of its nodes.
+    """
+
+    def __init__(self, answer_node_ids: list):
+        """
+        :param answer_node_ids: distinct node ids of each answer, see `BindingIndex`.
+        """
+        self.node_numbers = {}
+        self.answer_nodes = [[self.intern(node_id) for node_id in node_ids] for node_ids in answer_node_ids]
+        # outgoing (target number, edge) pairs of each node.
+        self.adjacency = [[] for _ in self.node_numbers]
+
+    def intern(self, node_id):
+        number = self.node_numbers.get(node_id)
+        if number is None:
+            number = self.node_numbers[node_id] = len(self.node_numbers)
+        return number
+
+    def add_edge(self, edge: dict):
+        source = self.node_numbers.get(edge['source_id'])
+        target = self.node_numbers.get(edge['target_id'])
+        # self loops don't relate two nodes of an answer.
+        if source is not None and target is not None and source != target:
+            self.adjacency[source].append((target, edge))
+
+    def answer_edges(self, answer_number: int):
+        """
+        Yields the edges between the nodes of an answer.
+        """
+        nodes = self.answer_nodes[answer_number]
+        members = set(nodes)
+        for source in nodes:
+            for target, edge in self.adjacency[source]:
+                if target in members:
+                    yield edge
 
 
 class Overlay:
-    def __init__(self, graph_interface: GraphInterface):
+    def __init__(self, graph_interface: GraphInterface, support_edge_cache: SupportEdgeCache = None):
         self.graph_interface = graph_interface
+        # shared across requests by the endpoint, so overlays of overlapping answers reuse node pairs.
+        self.support_edge_cache = support_edge_cache if support_edge_cache is not None else SupportEdgeCache()
+        self.chunk_size = int(config.get('overlay_chunk_size', 1000))
+        # number of cover queries running at the same time for a single overlay request.
+        self.concurrency = int(config.get('overlay_concurrency', 4))
 
     async def overlay_support_edges(self, reasoner_graph):
         """
@@ -19,58 +69,20 @@ class Overlay:
         added_edge_ids = set()
         edges_to_add = list()
         overlayed_answers = list()
-        chunk_size = 1000
-        chunked_answers = [reasoner_graph[Question.ANSWERS_KEY][start: start + chunk_size]
-                           for start in range(0, len(reasoner_graph[Question.ANSWERS_KEY]), chunk_size)]
-        for answer in chunked_answers:
-            # 3. filter out kg ids
-            all_kg_nodes = set(
-                reduce(lambda a, b: a + b,
-                       map(lambda node_binding: node_binding[Question.KG_ID_KEY]
-                       if isinstance(node_binding[Question.KG_ID_KEY], list)
-                       # 3. convert every thing to array and reduce
-                       else [node_binding[Question.KG_ID_KEY]],
-                           # 2. merge them into single array
-                           reduce(lambda a, b: a + b,
-                                  # 1. get node bindings from all answers
-                                  map(lambda ans: ans[Question.NODE_BINDINGS_KEY], answer), [])), []))
-            # fun part summon APOC
-            if self.graph_interface.supports_apoc():
-                all_kg_nodes = list(all_kg_nodes)
-                apoc_result = (await self.graph_interface.run_apoc_cover(all_kg_nodes))[0]['result']
-                apoc_result = self.structure_for_easy_lookup(apoc_result)
-                # now go back to the answers and add the edges
-                for ans in answer:
-                    support_id_suffix = 0
-                    node_bindings = ans[Question.NODE_BINDINGS_KEY]
-                    ans_all_node_ids = set(
-                        reduce(lambda a, b: a + b,
-                               map(lambda x: x[Question.KG_ID_KEY]
-                               if isinstance(x[Question.KG_ID_KEY], list)
-                               else [x[Question.KG_ID_KEY]]
-                                   , node_bindings), []))
-                    for node_id in ans_all_node_ids:
-                        other_nodes = ans_all_node_ids.difference(set(node_id))
-                        # lookup current node in apoc_result
-                        current_node_relations = apoc_result.get(node_id, {})
-                        for other_node_id in other_nodes:
-                            # lookup for relations in apoc_result graph
-                            support_edges = current_node_relations.get(other_node_id, [])
-                            for support_edge in support_edges:
-                                q_graph_id = f's_{support_id_suffix}'
-                                support_id_suffix += 1
-                                k_graph_id = support_edge['id']
-                                ans['edge_bindings'].append(
-                                    {
-                                        Question.QG_ID_KEY: q_graph_id,
-                                        Question.KG_ID_KEY: k_graph_id
-                                    }
-                                )
-                                if k_graph_id not in added_edge_ids:
-                                    added_edge_ids.add(k_graph_id)
-                                    edges_to_add.append(support_edge)
-                    overlayed_answers.append(ans)
-                    # @TODO raise exception if apoc is not supported
+        answers = reasoner_graph[Question.ANSWERS_KEY]
+        chunked_answers = [answers[start: start + self.chunk_size]
+                           for start in range(0, len(answers), self.chunk_size)]
+        limiter = asyncio.Semaphore(self.concurrency)
+        # chunks are overlaid concurrently, results are merged back in answer order.
+        chunk_results = await asyncio.gather(
+            *[self.overlay_chunk(answer, limiter) for answer in chunked_answers]
+        )
+        for chunk_answers, support_edges in chunk_results:
+            overlayed_answers += chunk_answers
+            for support_edge in support_edges:
+                if support_edge['id'] not in added_edge_ids:
+                    added_edge_ids.add(support_edge['id'])
+                    edges_to_add.append(support_edge)
 
         final_response[Question.QUERY_GRAPH_KEY] = reasoner_graph[Question.QUERY_GRAPH_KEY]
         final_response[Question.ANSWERS_KEY] = overlayed_answers
@@ -78,11 +90,69 @@ class Overlay:
         final_response[Question.KNOWLEDGE_GRAPH_KEY][Question.EDGES_LIST_KEY] += edges_to_add
         return final_response
 
-    def structure_for_easy_lookup(self, result_set):
+    async def overlay_chunk(self, answer, limiter: asyncio.Semaphore):
         """
-        Converts apoc result into a mini graph
-        :param result_set:
-        :return:
+        Adds support edges to a chunk of answers.
+        :param answer: chunk of answers.
+        :param limiter: bounds the number of support edge queries in flight.
+        :return: the overlaid answers and the support edges bound to them.
+        :rtype: tuple
+        """
+        overlayed_answers = list()
+        support_edges_found = list()
+        # filter out kg ids
+        binding_index = BindingIndex(answer)
+        # fun part summon APOC, or plain cypher where there is no APOC
+        if self.graph_interface.supports_apoc():
+            find_support_edges = self.graph_interface.run_apoc_cover
+        else:
+            find_support_edges = self.graph_interface.run_node_set_edges
+        # edges between the node pairs of this chunk, from cache where possible
+        support_edges_by_pair = {}
+        missing_pairs = set()
+        for ans_node_ids in binding_index.answer_node_ids:
+            for node_id, other_node_id in combinations(ans_node_ids, 2):
+                pair = SupportEdgeCache.pair_key(node_id, other_node_id)
+                if pair in support_edges_by_pair or pair in missing_pairs:
+                    continue
+                cached_edges = self.support_edge_cache.get(pair)
+                if cached_edges is None:
+                    missing_pairs.add(pair)
+                else:
+                    support_edges_by_pair[pair] = cached_edges
+        if missing_pairs:
+            missing_node_ids = list({node_id for pair in missing_pairs for node_id in pair})
+            async with limiter:
+                found_edges = (await find_support_edges(missing_node_ids))[0]['result']
+            found_edges = self.structure_for_easy_lookup(found_edges, missing_pairs)
+            for pair in missing_pairs:
+                support_edges_by_pair[pair] = found_edges.get(pair, [])
+        node_pair_index = NodePairIndex(binding_index.answer_node_ids)
+        for support_edges in support_edges_by_pair.values():
+            for support_edge in support_edges:
+                node_pair_index.add_edge(support_edge)
+        # now go back to the answers and add the edges
+        for answer_number, ans in enumerate(answer):
+            support_id_suffix = 0
+            for support_edge in node_pair_index.answer_edges(answer_number):
+                q_graph_id = f's_{support_id_suffix}'
+                support_id_suffix += 1
+                ans['edge_bindings'].append(
+                    {
+                        Question.QG_ID_KEY: q_graph_id,
+                        Question.KG_ID_KEY: support_edge['id']
+                    }
+                )
+                support_edges_found.append(support_edge)
+            overlayed_answers.append(ans)
+        return overlayed_answers, support_edges_found
+
+    def structure_for_easy_lookup(self, result_set, pairs=()):
+        """
+        Groups support edge results by node pair and adds them to the support edge cache.
+        :param result_set: rows of apoc cover or of the plain cypher fallback.
+        :param pairs: node pairs the cover was run for, the ones without edges are cached as such.
+        :return: edges by node pair, see `SupportEdgeCache.pair_key`.
         """
         result = {}
         for r in result_set:
@@ -91,11 +161,13 @@ class Overlay:
             edge = r['edge']
             edge['source_id'] = source_id
             edge['target_id'] = target_id
-            m = result.get(source_id, {})
-            n = m.get(target_id, list())
-            n.append(edge)
-            m[target_id] = n
-            result[source_id] = m
+            result.setdefault(SupportEdgeCache.pair_key(source_id, target_id), []).append(edge)
+        # results hold every edge among the nodes, so the edges of each pair are complete.
+        for pair, edges in result.items():
+            self.support_edge_cache.put(pair, edges)
+        for pair in pairs:
+            if pair not in result:
+                self.support_edge_cache.put(pair, [])
         return result
 
 
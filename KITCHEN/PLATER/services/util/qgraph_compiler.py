@@ -1,4 +1,12 @@
 """Tools for compiling QGraph into Cypher query."""
+import json
+import re
+from functools import lru_cache
+
+from PLATER.services.config import config
+
+# marker standing in for literal values in a query graph shape.
+PARAMETER_PLACEHOLDER = '$'
 
 
 def cypher_prop_string(value):
@@ -11,11 +19,41 @@ def cypher_prop_string(value):
         raise ValueError(f'Unsupported property type: {type(value).__name__}.')
 
 
+def cypher_name(name):
+    """Quote a label or property key for cypher, doubling backticks so it can't end the quoting."""
+    return '`' + name.replace('`', '``') + '`'
+
+
+# property set on hub nodes to their degree, see `GraphInterface.build_hub_index`. It's left out of responses.
+HUB_DEGREE_PROPERTY = 'plater_degree'
+# parameter holding the degree from which nodes are excluded by `exclude_hubs`.
+MAX_CONNECTIVITY_PARAMETER = 'max_connectivity'
+
+
+def cypher_parameter_name(position, key):
+    """Name of the cypher parameter holding the value of a property of the query graph's `position`th node.
+    Characters other than ascii letters and digits in the key are escaped by their code, so every node and key get
+    a name of their own, and the `node` prefix keeps them apart from the other parameters of the query.
+    """
+    escaped_key = re.sub(r'[^A-Za-z0-9]', lambda match: f'_{ord(match.group()):x}_', key)
+    return f'node{position}_{escaped_key}'
+
+
+def is_pinned(curie):
+    """Tell if a query graph node's curie value pins it, a missing, null or empty curie leaves it unconstrained."""
+    return curie is not None and curie != []
+
+
 class NodeReference():
     """Node reference object."""
 
-    def __init__(self, node, anonymous=False):
-        """Create a node reference."""
+    def __init__(self, node, anonymous=False, parameters=None, exclude_hubs=False, position=0, max_connectivity=-1):
+        """Create a node reference.
+        If `parameters` is a dict, property values are emitted as `$param` placeholders and collected into it,
+        named after the node's `position` in the query graph.
+        If `exclude_hubs` is set, the node can't match hub nodes unless it's pinned to curies. Without it a
+        `max_connectivity` above -1 does the same by counting the node's edges.
+        """
         node = dict(node)
         node_id = node.pop("id")
         name = f'{node_id}' if not anonymous else ''
@@ -25,10 +63,14 @@ class NodeReference():
         props = {}
 
         curie = node.pop("curie", None)
-        if curie is not None:
+        if is_pinned(curie):
             if isinstance(curie, str):
                 props['id'] = curie
                 filters = ''
+            elif isinstance(curie, list) and parameters is not None:
+                param_name = cypher_parameter_name(position, 'curie')
+                parameters[param_name] = curie
+                filters = f"{name}.id IN ${param_name}"
             elif isinstance(curie, list):
                 filters = []
                 for ci in curie:
@@ -38,6 +80,10 @@ class NodeReference():
                 filters = ' OR '.join(filters)
             else:
                 raise TypeError("Curie should be a string or list of strings.")
+        elif exclude_hubs:
+            filters = f"coalesce({name}.{HUB_DEGREE_PROPERTY}, 0) < ${MAX_CONNECTIVITY_PARAMETER}"
+        elif max_connectivity > -1:
+            filters = f"size( ({name})-[]-() ) < {max_connectivity}"
         else:
             filters = ''
 
@@ -47,9 +93,17 @@ class NodeReference():
 
         self.name = name
         self.labels = labels
-        self.prop_string = ' {' + ', '.join([f"`{key}`: {cypher_prop_string(props[key])}" for key in props]) + '}'
+        if parameters is not None:
+            prop_values = {}
+            for key in props:
+                param_name = cypher_parameter_name(position, key)
+                parameters[param_name] = props[key]
+                prop_values[key] = f'${param_name}'
+        else:
+            prop_values = {key: cypher_prop_string(props[key]) for key in props}
+        self.prop_string = ' {' + ', '.join([f"{cypher_name(key)}: {prop_values[key]}" for key in prop_values]) + '}'
         self._filters = filters
-        if curie:
+        if is_pinned(curie):
             self._extras = f' USING INDEX {name}:{labels[0]}(id)'
         else:
             self._extras = ''
@@ -60,7 +114,7 @@ class NodeReference():
         self._num += 1
         if self._num == 1:
             return f'{self.name}' + \
-                   ''.join(f':`{label}`' for label in self.labels) + \
+                   ''.join(f':{cypher_name(label)}' for label in self.labels) + \
                    f'{self.prop_string}'
         return self.name
 
@@ -116,12 +170,18 @@ class EdgeReference():
 
     def __str__(self):
         """Return the cypher edge reference."""
+        return self.pattern()
+
+    def pattern(self, reverse=False):
+        """Return the cypher edge reference, pointing from right to left if `reverse`."""
         self._num += 1
         if self._num == 1:
             innards = f'{self.name}{":" + self.label if self.label else ""}'
         else:
             innards = self.name
-        if self.directed:
+        if self.directed and reverse:
+            return f'<-[{innards}]-'
+        elif self.directed:
             return f'-[{innards}]->'
         else:
             return f'-[{innards}]-'
@@ -137,15 +197,22 @@ class EdgeReference():
             return ''
 
 
-def cypher_query_fragment_match(qgraph, max_connectivity=-1):
+def cypher_query_fragment_match(qgraph, max_connectivity=-1, parameters=None, edge_order=None, exclude_hubs=False):
     """Generate a Cypher query fragment to match the nodes and edges that correspond to a question.
     This is used internally for cypher_query_answer_map and cypher_query_knowledge_graph
+    If `edge_order` is given, a list of (edge id, reverse) pairs as made by `qgraph_planner.plan_edge_order`,
+    edges are matched in that order, reversed ones starting from their target node.
+    `max_connectivity` counts the degree of every node not pinned to curies while matching. `exclude_hubs` instead
+    compares the precomputed degree of the same nodes to the `$max_connectivity` parameter, which the caller has to
+    fill in.
     Returns the query fragment as a string.
     """
     nodes, edges = qgraph['nodes'], qgraph['edges']
 
     # generate internal node and edge variable names
-    node_references = {n['id']: NodeReference(n) for n in nodes}
+    node_references = {n['id']: NodeReference(n, parameters=parameters, exclude_hubs=exclude_hubs, position=position,
+                                              max_connectivity=max_connectivity)
+                       for position, n in enumerate(nodes)}
     edge_references = [EdgeReference(e) for e in edges]
 
     match_strings = []
@@ -163,14 +230,21 @@ def cypher_query_fragment_match(qgraph, max_connectivity=-1):
             match_strings.append("WHERE " + node_references[n].filters)
 
     # match edges
-    for e, eref in zip(edges, edge_references):
+    if edge_order:
+        edges_by_id = {e['id']: (e, eref) for e, eref in zip(edges, edge_references)}
+        ordered_edges = [edges_by_id[edge_id] + (reverse,) for edge_id, reverse in edge_order]
+    else:
+        ordered_edges = [(e, eref, False) for e, eref in zip(edges, edge_references)]
+    for e, eref, reverse in ordered_edges:
         source_node = node_references[e['source_id']]
         target_node = node_references[e['target_id']]
-        match_strings.append(f"MATCH ({source_node}){eref}({target_node})")
-        match_strings[-1] += source_node.extras + target_node.extras
+        if reverse:
+            match_strings.append(f"MATCH ({target_node}){eref.pattern(reverse=True)}({source_node})")
+            match_strings[-1] += target_node.extras + source_node.extras
+        else:
+            match_strings.append(f"MATCH ({source_node}){eref}({target_node})")
+            match_strings[-1] += source_node.extras + target_node.extras
         filters = [f'({c})' for c in [source_node.filters, target_node.filters, eref.filters] if c]
-        if max_connectivity > -1:
-            filters.append(f"(size( ({target_node})-[]-() ) < {max_connectivity})")
         if filters:
             match_strings.append("WHERE " + " AND ".join(filters))
 
@@ -185,7 +259,11 @@ def cypher_query_answer_map(qgraph, **kwargs):
     """
     clauses = []
 
-    match_string = cypher_query_fragment_match(qgraph, max_connectivity=kwargs.pop('max_connectivity', -1))
+    match_string = cypher_query_fragment_match(qgraph,
+                                               max_connectivity=kwargs.pop('max_connectivity', -1),
+                                               parameters=kwargs.pop('parameters', None),
+                                               edge_order=kwargs.pop('edge_order', None),
+                                               exclude_hubs=kwargs.pop('exclude_hubs', False))
     if match_string:
         clauses.append(match_string)
 
@@ -197,17 +275,34 @@ def cypher_query_answer_map(qgraph, **kwargs):
 
     # deal with sets
     node_id_accessor = [f"collect(DISTINCT {n['id']}) AS {n['id']}" if 'set' in n and n['set'] else f"[{n['id']}] AS {n['id']}" for n in nodes]
-    if kwargs.get('relationship_id', 'property') == 'internal':
-        edge_id_accessor = [f"collect(DISTINCT toString(id({e['id']}))) AS {e['id']}" for e in edges]
-    else:
-        edge_id_accessor = [f"collect(DISTINCT {e['id']}) AS {e['id']}" for e in edges]
+    edge_id_accessor = [f"collect(DISTINCT {e['id']}) AS {e['id']}" for e in edges]
     if node_id_accessor or edge_id_accessor:
         with_string = f"WITH {', '.join(node_id_accessor+edge_id_accessor)}"
         clauses.append(with_string)
 
     # add bound fields and return map
-    node_dicts = [f"[ni IN {n} | {{qg_id:'{n}', kg_id:ni.id, node: ni, type: labels(ni) }}]" for n in node_names]
-    edge_dicts = [f"[ei IN {e} | {{qg_id:'{e}', kg_id:ei.id, edge: ei, type: type(ei) }}]" for e in edge_names]
+    # with relationship_id='internal' edges also carry neo4j's id, so their properties can be looked up by it.
+    if kwargs.get('relationship_id', 'property') == 'internal':
+        edge_internal_id = ' internal_id:id(ei),'
+    else:
+        edge_internal_id = ''
+    # with inline_knowledge_graph edges also carry their end points, making the maps enough to build the
+    # knowledge graph from.
+    if kwargs.get('inline_knowledge_graph', False):
+        edge_end_points = ' source_id:startNode(ei).id, target_id:endNode(ei).id,'
+    else:
+        edge_end_points = ''
+    # node_attributes and edge_attributes limit the properties returned.
+    node_value = 'ni'
+    if kwargs.get('node_attributes') is not None:
+        node_value = 'ni{' + ', '.join(f'.{cypher_name(key)}' for key in kwargs['node_attributes']) + '}'
+    edge_value = 'ei'
+    if kwargs.get('edge_attributes') is not None:
+        edge_value = 'ei{' + ', '.join(f'.{cypher_name(key)}' for key in kwargs['edge_attributes']) + '}'
+    node_dicts = [f"[ni IN {n} | {{qg_id:'{n}', kg_id:ni.id, node: {node_value}, type: labels(ni) }}]"
+                  for n in node_names]
+    edge_dicts = [f"[ei IN {e} | {{qg_id:'{e}', kg_id:ei.id,{edge_internal_id}{edge_end_points} edge: {edge_value}, "
+                  f"type: type(ei) }}]" for e in edge_names]
     answer_return_string = f"RETURN {' + '.join(node_dicts) or '[]'} AS nodes, {' + '.join(edge_dicts) or '[]'} AS edges"
     clauses.append(answer_return_string)
 
@@ -221,6 +316,64 @@ def cypher_query_answer_map(qgraph, **kwargs):
     return query_string
 
 
+def query_graph_shape(qgraph, parameters=None):
+    """Strip the literal values off a query graph.
+    Returns a canonical (JSON) representation of what is left, which is what the compiled cypher depends on
+    when values are passed as parameters. If `parameters` is a dict the stripped values are collected into it,
+    named the same way NodeReference names its placeholders.
+    """
+    shape_nodes = []
+    for position, node in enumerate(qgraph['nodes']):
+        shape_node = {}
+        for key, value in node.items():
+            if key in ('id', 'type', 'set'):
+                shape_node[key] = value
+            elif key == 'name':
+                # ignored by the compiler
+                continue
+            elif key == 'curie':
+                if not is_pinned(value):
+                    # same shape as a node without a curie
+                    continue
+                if isinstance(value, list):
+                    shape_node[key] = [PARAMETER_PLACEHOLDER]
+                    if parameters is not None:
+                        parameters[cypher_parameter_name(position, 'curie')] = value
+                else:
+                    shape_node[key] = PARAMETER_PLACEHOLDER
+                    if parameters is not None:
+                        parameters[cypher_parameter_name(position, 'id')] = value
+            else:
+                shape_node[key] = PARAMETER_PLACEHOLDER
+                if parameters is not None:
+                    parameters[cypher_parameter_name(position, key)] = value
+        shape_nodes.append(shape_node)
+    shape_edges = [
+        {key: edge[key] for key in ('id', 'type', 'source_id', 'target_id', 'directed') if key in edge}
+        for edge in qgraph['edges']
+    ]
+    return json.dumps({'nodes': shape_nodes, 'edges': shape_edges}, sort_keys=True)
+
+
+@lru_cache(maxsize=int(config.get('cypher_template_cache_size', 256)))
+def _compile_cypher_template(shape, options):
+    """Compile a query graph shape into a parameterized cypher. Cached per shape and compile options."""
+    return cypher_query_answer_map(json.loads(shape), parameters={}, **dict(options))
+
+
+def cypher_query_answer_map_parameterized(qgraph, **kwargs):
+    """Generate a parameterized Cypher query to extract the answer maps for a question.
+    Literal values of the query graph (curies and properties) are replaced by `$param` placeholders, so
+    questions that only differ in their curies share a query string, which Neo4j plans once. Compiled
+    queries are cached per query graph shape.
+    Returns the query as a string and the parameters as a dict.
+    """
+    parameters = {}
+    shape = query_graph_shape(qgraph, parameters)
+    query_string = _compile_cypher_template(shape, tuple(sorted(kwargs.items())))
+    return query_string, parameters
+
+
 def flatten_semilist(x):
     """Convert a semi-nested list - a list of (lists and scalars) - to a flat list."""
     # convert to a list of lists
@@ -0,0 +1,130 @@
+"""Tools for ordering the MATCH clauses of a QGraph using counts from the graph summary."""
+
+
+class GraphStatistics:
+    """Node and edge counts read off a graph summary, see `GraphInterface.generate_summary`."""
+
+    def __init__(self, summary):
+        """Index the summary.
+        The summary maps source label combinations (eg. `named_thing:gene`) to their `nodes_count` and to
+        target label combinations, which map predicates to edge counts.
+        """
+        self.label_counts = {}
+        # (source labels, target labels, predicate, count) of each summary entry.
+        self.edge_counts = []
+        for source_key, source_summary in summary.items():
+            source_labels = frozenset(source_key.split(':'))
+            for label in source_labels:
+                self.label_counts[label] = self.label_counts.get(label, 0) + source_summary.get('nodes_count', 0)
+            for target_key, predicates in source_summary.items():
+                if not isinstance(predicates, dict):
+                    continue
+                target_labels = frozenset(target_key.split(':'))
+                for predicate, count in predicates.items():
+                    self.edge_counts.append((source_labels, target_labels, predicate, count))
+
+    def node_count(self, labels):
+        """Estimate the number of nodes having all the labels."""
+        return min(self.label_counts.get(label, 0) for label in labels)
+
+    def edge_count(self, source_labels, target_labels, predicates=None):
+        """Estimate the number of edges between nodes with the source and target labels."""
+        return sum(
+            count for edge_source, edge_target, predicate, count in self.edge_counts
+            if edge_source.issuperset(source_labels) and edge_target.issuperset(target_labels)
+            and (predicates is None or predicate in predicates)
+        )
+
+
+_statistics = (None, None)
+
+
+def get_statistics(summary):
+    """Statistics of a summary, reused for as long as the same summary is passed in."""
+    global _statistics
+    if _statistics[0] is not summary:
+        _statistics = (summary, GraphStatistics(summary))
+    return _statistics[1]
+
+
+def node_labels(node):
+    labels = node.get('type', 'named_thing')
+    return labels if isinstance(labels, list) else [labels]
+
+
+def node_cardinality(node, statistics):
+    """Estimate the number of nodes matching a query graph node."""
+    curie = node.get('curie')
+    if isinstance(curie, str):
+        return 1
+    if isinstance(curie, list) and curie:
+        return len(curie)
+    return statistics.node_count(node_labels(node))
+
+
+def edge_predicates(edge):
+    predicates = edge.get('type')
+    if not predicates:
+        return None
+    return predicates if isinstance(predicates, list) else [predicates]
+
+
+def plan_edge_order(qgraph, summary):
+    """Order the edges of a query graph so that matching starts at the most selective node and always expands
+    along the edge expected to produce the fewest rows.
+    Returns a list of (edge id, reverse) pairs, reverse meaning the edge is best matched from its target node.
+    Returns None when there is nothing to plan with.
+    """
+    nodes = {node['id']: node for node in qgraph['nodes']}
+    edges = list(qgraph['edges'])
+    if not summary or len(edges) < 1:
+        return None
+    statistics = get_statistics(summary)
+    cardinalities = {node_id: node_cardinality(node, statistics) for node_id, node in nodes.items()}
+
+    def fan_out(edge, reverse):
+        # average number of neighbours reached crossing the edge from its bound end.
+        source_labels = node_labels(nodes[edge['source_id']])
+        target_labels = node_labels(nodes[edge['target_id']])
+        predicates = edge_predicates(edge)
+        count = statistics.edge_count(source_labels, target_labels, predicates)
+        directed = edge.get('directed', bool(edge.get('type')))
+        if not directed:
+            count += statistics.edge_count(target_labels, source_labels, predicates)
+        bound_labels = target_labels if reverse else source_labels
+        far_end = edge['source_id'] if reverse else edge['target_id']
+        bound_count = max(statistics.node_count(bound_labels), 1)
+        # a pinned far end only keeps the matches landing on it.
+        far_end_selectivity = min(cardinalities[far_end] / max(statistics.node_count(
+            node_labels(nodes[far_end])), 1), 1)
+        return count / bound_count * far_end_selectivity
+
+    order = []
+    bound = set()
+    rows = 1
+    remaining = edges
+    while remaining:
+        candidates = []
+        for edge in remaining:
+            source_bound = edge['source_id'] in bound
+            target_bound = edge['target_id'] in bound
+            if source_bound and target_bound:
+                # closes a cycle, only filters rows.
+                selectivity = fan_out(edge, False) / max(statistics.node_count(
+                    node_labels(nodes[edge['target_id']])), 1)
+                candidates.append((rows * min(selectivity, 1), edge, False))
+            elif source_bound or target_bound:
+                candidates.append((rows * fan_out(edge, target_bound), edge, target_bound))
+        if not candidates:
+            # nothing connected to what is matched so far, start from the most selective node left.
+            start = min((node_id for edge in remaining for node_id in (edge['source_id'], edge['target_id'])),
+                        key=lambda node_id: cardinalities[node_id])
+            bound.add(start)
+            rows = max(rows * cardinalities[start], 1)
+            continue
+        estimate, edge, reverse = min(candidates, key=lambda candidate: candidate[0])
+        order.append((edge['id'], reverse))
+        bound.update((edge['source_id'], edge['target_id']))
+        rows = max(estimate, 1)
+        remaining = [other for other in remaining if other is not edge]
+    return order
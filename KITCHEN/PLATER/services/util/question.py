@@ -1,9 +1,22 @@
 import copy
+import re
 from functools import reduce
+from PLATER.services.config import config
+from PLATER.services.util.logutil import LoggingUtil
+from PLATER.services.util.binding_index import BindingIndex, binding_kg_ids
 from PLATER.services.util.graph_adapter import GraphInterface
-from PLATER.services.util.qgraph_compiler import cypher_query_answer_map, flatten_semilist
+from PLATER.services.util.qgraph_compiler import cypher_query_answer_map_parameterized, cypher_name, \
+    HUB_DEGREE_PROPERTY, MAX_CONNECTIVITY_PARAMETER
+from PLATER.services.util.qgraph_planner import plan_edge_order
 import time
 import asyncio
+import json
+
+logger = LoggingUtil.init_logging(__name__,
+                                  config.get('logging_level'),
+                                  config.get('logging_format')
+                                  )
+
 
 class Question:
 
@@ -22,101 +35,439 @@ class Question:
     EDGE_BINDINGS_KEY='edge_bindings'
     CURIE_KEY = 'curie'
 
-    def __init__(self, question_json):
+    # knowledge graph modes, `yank` looks up the bound nodes and edges after reading the answers, `inline`
+    # builds the knowledge graph from the answer query itself.
+    YANK_KNOWLEDGE_GRAPH = 'yank'
+    INLINE_KNOWLEDGE_GRAPH = 'inline'
+    # attributes knowledge graph nodes and edges always have, whatever is asked for.
+    NODE_REQUIRED_ATTRIBUTES = ['id']
+    EDGE_REQUIRED_ATTRIBUTES = ['id', 'source_id', 'target_id', 'type']
+    # added to responses cut short by max_results.
+    TRUNCATED_KEY = 'truncated'
+    MAX_RESULTS_KEY = 'max_results'
+
+    def __init__(self, question_json, knowledge_graph_mode=None, attributes=None, max_results=None,
+                 max_connectivity=None):
+        """
+        :param question_json: TrAPI message.
+        :param knowledge_graph_mode: `yank` or `inline`, defaults to `knowledge_graph_mode` config.
+        :param attributes: node and edge attributes to return in the knowledge graph, all if None.
+        :param max_results: most results to return, all if None.
+        :param max_connectivity: nodes not pinned to curies only match nodes with fewer edges, no limit if None.
+        """
         self._question_json = copy.deepcopy(question_json)
+        self.knowledge_graph_mode = knowledge_graph_mode or config.get('knowledge_graph_mode',
+                                                                       Question.YANK_KNOWLEDGE_GRAPH)
+        self.attributes = attributes
+        self.max_results = max_results
+        self.max_connectivity = max_connectivity
+        # set once the query turned out to have more than max_results results.
+        self.truncated = False
+        # brackets `answer_stream` has left open, None until it starts, and whether it has written everything.
+        self._stream_closers = None
+        self._stream_key_separator = ''
+        self._stream_done = False
         self.__validate()
 
-    def compile_cypher(self):
-        return cypher_query_answer_map(self._question_json[Question.QUERY_GRAPH_KEY])
+    @property
+    def node_attributes(self):
+        if self.attributes is None:
+            return None
+        return list(dict.fromkeys(Question.NODE_REQUIRED_ATTRIBUTES + list(self.attributes)))
 
-    async def answer(self, graph_interface: GraphInterface, yank=True):
-        cypher = self.compile_cypher()
-        print(cypher)
-        s = time.time()
-        results = await graph_interface.run_cypher(cypher)
-        end = time.time()
-        print(f'grabbing results took {end - s}')
-        results_dict = graph_interface.convert_to_dict(results)
-        answer_bindings = []
-        for result in results_dict:
-            edge_bindings = []
-            for e in result.get('edges', []):
-                edge_binding = {
-                    Question.KG_ID_KEY: e.get('kg_id'),
-                    Question.QG_ID_KEY: e.get('qg_id')
-                }
-                edge_bindings.append(edge_binding)
+    @property
+    def edge_attributes(self):
+        if self.attributes is None:
+            return None
+        return list(dict.fromkeys(Question.EDGE_REQUIRED_ATTRIBUTES + list(self.attributes)))
 
-            node_bindings = []
-            for n in result.get('nodes', []):
-                node_bindings.append(
-                    {
-                        Question.KG_ID_KEY: n['kg_id'],
-                        Question.QG_ID_KEY: n['qg_id']
-                    }
-                )
-            answer = {
-                Question.EDGE_BINDINGS_KEY: edge_bindings,
-                Question.NODE_BINDINGS_KEY: node_bindings
+    def compile_cypher(self, summary=None, hub_index=False):
+        """
+        Compiles the query graph into a parameterized cypher.
+        :param summary: graph summary, when given MATCH clauses are ordered by their estimated cost.
+        :param hub_index: if the hub index covers max_connectivity, when it doesn't degrees are counted by the
+        query.
+        :return: cypher and its parameters.
+        :rtype: tuple
+        """
+        options = {}
+        if summary and str(config.get('cost_based_planning', True)).lower() in ('true', '1', 'yes'):
+            edge_order = plan_edge_order(self._question_json[Question.QUERY_GRAPH_KEY], summary)
+            if edge_order:
+                options['edge_order'] = tuple(edge_order)
+        if self.knowledge_graph_mode == Question.INLINE_KNOWLEDGE_GRAPH:
+            options['inline_knowledge_graph'] = True
+            if self.attributes is not None:
+                options['node_attributes'] = tuple(self.node_attributes)
+                # end points and type come from the relationship, not its properties.
+                options['edge_attributes'] = tuple(attribute for attribute in self.edge_attributes
+                                                   if attribute not in ('source_id', 'target_id', 'type'))
+        if self.max_connectivity is not None and hub_index:
+            options['exclude_hubs'] = True
+        elif self.max_connectivity is not None:
+            options['max_connectivity'] = self.max_connectivity
+        if self.max_results is not None:
+            # one more than needed, to tell if there were more.
+            options['limit'] = '$result_limit'
+        cypher, parameters = cypher_query_answer_map_parameterized(
+            self._question_json[Question.QUERY_GRAPH_KEY],
+            relationship_id='internal',
+            **options
+        )
+        if self.max_results is not None:
+            parameters['result_limit'] = self.max_results + 1
+        if self.max_connectivity is not None and hub_index:
+            parameters[MAX_CONNECTIVITY_PARAMETER] = self.max_connectivity
+        return cypher, parameters
+
+    def truncation(self) -> dict:
+        """
+        Response keys telling the results were cut short by max_results, empty if they weren't.
+        """
+        if not self.truncated:
+            return {}
+        return {
+            Question.TRUNCATED_KEY: True,
+            Question.MAX_RESULTS_KEY: self.max_results
+        }
+
+    def stream_interruption(self, message: str) -> str:
+        """
+        Json text closing a response of `answer_stream` that was cut off partway, marked as truncated.
+        :param message: why the response was cut off.
+        :return: rest of the response, empty if it was written completely.
+        """
+        ending = {Question.TRUNCATED_KEY: True, 'Error': message}
+        if self._stream_closers is None:
+            return json.dumps(ending)
+        if self._stream_done:
+            return ''
+        return (''.join(reversed(self._stream_closers)) + self._stream_key_separator +
+                ', '.join(f'{json.dumps(key)}: {json.dumps(value)}' for key, value in ending.items()) + '}')
+
+    @staticmethod
+    def drop_missing_attributes(item: dict) -> dict:
+        """
+        Projected attributes an item doesn't have come back as null, leave them out like a full fetch would.
+        """
+        return {key: value for key, value in item.items() if value is not None}
+
+    def format_result(self, result, edge_internal_ids=None):
+        """
+        Converts a row of the answer cypher into a result with node and edge bindings.
+        :param result: row of the answer cypher.
+        :type result: dict
+        :param edge_internal_ids: if given, neo4j ids of the bound edges are collected into it by kg id.
+        :type edge_internal_ids: dict
+        :return: result
+        :rtype: dict
+        """
+        edge_bindings = []
+        for e in result.get('edges', []):
+            edge_binding = {
+                Question.KG_ID_KEY: e.get('kg_id'),
+                Question.QG_ID_KEY: e.get('qg_id')
             }
+            edge_bindings.append(edge_binding)
+            if edge_internal_ids is not None and e.get('internal_id') is not None:
+                edge_internal_ids[e.get('kg_id')] = e['internal_id']
 
-            answer_bindings.append(answer)
-        self._question_json[Question.ANSWERS_KEY] = answer_bindings
+        node_bindings = []
+        for n in result.get('nodes', []):
+            node_bindings.append(
+                {
+                    Question.KG_ID_KEY: n['kg_id'],
+                    Question.QG_ID_KEY: n['qg_id']
+                }
+            )
+        return {
+            Question.EDGE_BINDINGS_KEY: edge_bindings,
+            Question.NODE_BINDINGS_KEY: node_bindings
+        }
+
+    def collect_knowledge_graph(self, result, nodes: dict, edges: dict):
+        """
+        Adds the nodes and edges carried by a row of the inline answer cypher to the knowledge graph.
+        :param result: row of the answer cypher.
+        :type result: dict
+        :param nodes: knowledge graph nodes by id.
+        :type nodes: dict
+        :param edges: knowledge graph edges by id.
+        :type edges: dict
+        """
+        for n in result.get('nodes', []):
+            if n['kg_id'] not in nodes:
+                node = dict(n['node'])
+                node.pop(HUB_DEGREE_PROPERTY, None)
+                if self.attributes is not None:
+                    node = self.drop_missing_attributes(node)
+                node['type'] = n['type']
+                nodes[n['kg_id']] = node
+        for e in result.get('edges', []):
+            if e['kg_id'] not in edges:
+                edge = dict(e['edge'])
+                if self.attributes is not None:
+                    edge = self.drop_missing_attributes(edge)
+                edge.update({
+                    'source_id': e['source_id'],
+                    'target_id': e['target_id'],
+                    'type': e['type']
+                })
+                edges[e['kg_id']] = edge
+
+    async def answer(self, graph_interface: GraphInterface, yank=True):
+        self._question_json = await self.answer_rows(graph_interface, self.run_query(graph_interface), yank)
+        return self._question_json
+
+    async def run_query(self, graph_interface: GraphInterface):
+        """
+        Runs the answer cypher, stopping after max_results rows.
+        :param graph_interface: graph interface.
+        :return: async iterator of answer rows.
+        """
+        hub_index = self.max_connectivity is not None and hasattr(graph_interface, 'covers_connectivity') and \
+            graph_interface.covers_connectivity(self.max_connectivity)
+        cypher, parameters = self.compile_cypher(getattr(graph_interface, 'summary', None), hub_index)
+        logger.debug(cypher)
+        rows = graph_interface.stream_cypher(cypher, parameters)
+        count = 0
+        try:
+            async for row in rows:
+                if self.max_results is not None and count >= self.max_results:
+                    self.truncated = True
+                    break
+                count += 1
+                yield row
+        finally:
+            # stop reading the response right away, not whenever the generator is collected.
+            await rows.aclose()
+
+    async def answer_rows(self, graph_interface: GraphInterface, rows, yank=True):
+        """
+        Makes the response for rows of the answer cypher, eg. a page of them.
+        :param graph_interface: graph interface.
+        :param rows: async iterable of answer rows, see `run_query`.
+        :param yank: whether to pull in the knowledge graph.
+        :return: response with results and knowledge graph.
+        :rtype: dict
+        """
+        response = dict(self._question_json)
+        s = time.time()
+        answer_bindings = []
+        edge_internal_ids = {}
+        inline = yank and self.knowledge_graph_mode == Question.INLINE_KNOWLEDGE_GRAPH
+        nodes = {}
+        edges = {}
+        async for result in rows:
+            answer_bindings.append(self.format_result(result, edge_internal_ids))
+            if inline:
+                self.collect_knowledge_graph(result, nodes, edges)
+        end = time.time()
+        logger.debug(f'grabbing results took {end - s}')
+        response[Question.ANSWERS_KEY] = answer_bindings
         s = time.time()
-        if yank == True:
-            self._question_json[Question.KNOWLEDGE_GRAPH_KEY] = await self.yank(answer_bindings, graph_interface)
+        if inline:
+            response[Question.KNOWLEDGE_GRAPH_KEY] = {
+                Question.NODES_LIST_KEY: list(nodes.values()),
+                Question.EDGES_LIST_KEY: list(edges.values())
+            }
+        elif yank == True:
+            response[Question.KNOWLEDGE_GRAPH_KEY] = await self.yank(answer_bindings, graph_interface,
+                                                                     edge_internal_ids)
         e = time.time()
-        print(f'pulling answers back took {e - s}')
-        return self._question_json
+        logger.debug(f'pulling answers back took {e - s}')
+        response.update(self.truncation())
+        return response
+
+    async def answer_stream(self, graph_interface: GraphInterface, yank=True):
+        """
+        Same as `answer` but yields the response json in pieces, results are written out as soon as they are
+        read and knowledge graph nodes and edges as soon as their chunk is fetched. Only the ids needed to
+        yank the knowledge graph are held onto, or in inline mode the knowledge graph itself.
+        :param graph_interface: graph interface.
+        :param yank: whether to pull in the knowledge graph.
+        :return: async generator of json text pieces.
+        """
+        envelope = {key: value for key, value in self._question_json.items()
+                    if key not in (Question.ANSWERS_KEY, Question.KNOWLEDGE_GRAPH_KEY)}
+        # the stack of brackets to close is kept up to date right before each yield, so a stream cut off
+        # between pieces can be ended by `stream_interruption`.
+        closers = self._stream_closers = []
+        yield '{' + ''.join(f'{json.dumps(key)}: {json.dumps(value)}, ' for key, value in envelope.items())
+        closers.append(']')
+        self._stream_key_separator = ', '
+        yield f'"{Question.ANSWERS_KEY}": ['
+        node_ids = set()
+        edge_ids = set()
+        edge_internal_ids = {}
+        inline = yank and self.knowledge_graph_mode == Question.INLINE_KNOWLEDGE_GRAPH
+        nodes = {}
+        edges = {}
+        separator = ''
+        async for result in self.run_query(graph_interface):
+            answer = self.format_result(result, edge_internal_ids)
+            if inline:
+                self.collect_knowledge_graph(result, nodes, edges)
+            else:
+                node_ids.update(binding_kg_ids(answer[self.NODE_BINDINGS_KEY]))
+                edge_ids.update(binding_kg_ids(answer[self.EDGE_BINDINGS_KEY]))
+            yield separator + json.dumps(answer)
+            separator = ', '
+        closers.pop()
+        yield ']'
+        if inline:
+            closers.extend(['}', ']'])
+            yield f', "{Question.KNOWLEDGE_GRAPH_KEY}": {{"{Question.NODES_LIST_KEY}": ['
+            yield ', '.join(json.dumps(node) for node in nodes.values())
+            yield f'], "{Question.EDGES_LIST_KEY}": ['
+            yield ', '.join(json.dumps(edge) for edge in edges.values())
+            del closers[-2:]
+            yield ']}'
+        elif yank:
+            limiter = self.make_yank_limiter()
+            # edges are fetched while nodes are written, and held until it is their turn.
+            edge_chunks = asyncio.Queue()
+
+            async def fetch_edges():
+                try:
+                    async for edges in self.iter_edge_properties(graph_interface, list(edge_ids),
+                                                                 self.edge_attributes, edge_internal_ids, limiter):
+                        await edge_chunks.put(edges)
+                finally:
+                    await edge_chunks.put(None)
 
-    async def yank(self, answers, graph_interface: GraphInterface):
+            edge_task = asyncio.ensure_future(fetch_edges())
+            try:
+                closers.extend(['}', ']'])
+                yield f', "{Question.KNOWLEDGE_GRAPH_KEY}": {{"{Question.NODES_LIST_KEY}": ['
+                separator = ''
+                async for nodes in self.iter_node_properties(graph_interface, list(node_ids), limiter):
+                    if nodes:
+                        yield separator + ', '.join(json.dumps(node) for node in nodes)
+                        separator = ', '
+                yield f'], "{Question.EDGES_LIST_KEY}": ['
+                separator = ''
+                edges = await edge_chunks.get()
+                while edges is not None:
+                    if edges:
+                        yield separator + ', '.join(json.dumps(edge) for edge in edges)
+                        separator = ', '
+                    edges = await edge_chunks.get()
+                # surfaces errors of the edge fetch
+                await edge_task
+            finally:
+                edge_task.cancel()
+            del closers[-2:]
+            yield ']}'
+        self._stream_done = True
+        yield ''.join(f', {json.dumps(key)}: {json.dumps(value)}' for key, value in self.truncation().items()) + '}'
+
+    async def yank(self, answers, graph_interface: GraphInterface, edge_internal_ids=None):
         """
         Pull neo4j data for all the mini ids
         :param answer_bindings:
+        :param edge_internal_ids: neo4j ids of edges by kg id, see `format_result`.
         :return:
         """
-        node_ids = []
-        edge_ids = []
-        for answer in answers:
-            node_ids += list(map(lambda node_binding: node_binding[self.KG_ID_KEY], answer[self.NODE_BINDINGS_KEY]))
-            edge_ids += list(map(lambda edge_binding: edge_binding[self.KG_ID_KEY], answer[self.EDGE_BINDINGS_KEY]))
-        node_ids = list(set(flatten_semilist(node_ids)))
-        edge_ids = list(set(flatten_semilist(edge_ids)))
-        return await self.get_properties(graph_interface, edge_ids, node_ids)
-
-    async def get_properties(self, graph_interface: GraphInterface, edge_ids, node_ids):
-        """Get properties associated with edges and nodes."""
-        cypher_get_nodes = f"""
-        MATCH (node) where node.id in {node_ids} return collect({{node: node, type: labels(node)}}) as nodes 
-        """
-        s = time.time()
-        nodes_full = await graph_interface.run_cypher(cypher_get_nodes)
-        e = time.time()
-        print(f'grabbing nodes toolk {e -s}')
-        nodes_full = graph_interface.convert_to_dict(nodes_full)
-        nodes_full = nodes_full[0]['nodes']
-        nodes = []
-        for node in nodes_full:
-            node_properties = node['node']
-            node_properties.update({
-                'type': node['type']
-            })
-            nodes.append(
-                node_properties
-            )
-        s = time.time()
+        binding_index = BindingIndex(answers)
+        return await self.get_properties(graph_interface, list(binding_index.edge_ids), list(binding_index.node_ids),
+                                         edge_internal_ids)
 
-        edges = await self.get_edge_properties(graph_interface, edge_ids)
+    async def get_properties(self, graph_interface: GraphInterface, edge_ids, node_ids, edge_internal_ids=None):
+        """Get properties associated with edges and nodes, nodes and edges are fetched together."""
+        s = time.time()
+        limiter = self.make_yank_limiter()
+        nodes, edges = await asyncio.gather(
+            self.get_node_properties(graph_interface, node_ids, limiter),
+            self.get_edge_properties(graph_interface, edge_ids, self.edge_attributes, edge_internal_ids, limiter)
+        )
         e = time.time()
-        print(f'grabbing endges took {e-s}')
+        logger.debug(f'grabbing nodes and edges took {e - s}')
         return {
             self.NODES_LIST_KEY: nodes,
             self.EDGES_LIST_KEY: edges
         }
 
-    async def get_edge_properties(self, graph_interface: GraphInterface, edge_ids, fields=None):
+    @staticmethod
+    def make_yank_limiter():
+        """
+        Bounds the number of node and edge chunk queries of a yank running at the same time.
+        """
+        return asyncio.Semaphore(int(config.get('yank_concurrency', 8)))
+
+    async def get_node_properties(self, graph_interface: GraphInterface, node_ids, limiter=None):
+        nodes = []
+        async for chunk in self.iter_node_properties(graph_interface, node_ids, limiter):
+            nodes += chunk
+        return nodes
+
+    async def iter_node_properties(self, graph_interface: GraphInterface, node_ids, limiter=None):
+        """
+        Fetches node properties in chunks, all chunks are requested at once and yielded as they arrive.
+        :param limiter: bounds the chunk queries in flight, see `make_yank_limiter`.
+        """
+        if not node_ids:
+            return
+        limiter = limiter or self.make_yank_limiter()
+        fields = self.node_attributes
+        if fields is not None:
+            node_projection = 'node{' + ', '.join(f'.{cypher_name(key)}' for key in fields) + '}'
+        else:
+            node_projection = 'node'
+        # the label lets neo4j look chunks up through the id index instead of scanning all nodes. Nodes without it
+        # are looked up without the label.
+        cypher_get_nodes = f"""
+        MATCH (node:named_thing) WHERE node.id IN $node_ids
+        RETURN collect({{node: {node_projection}, type: labels(node)}}) as nodes
+        """
+        cypher_get_unlabelled_nodes = f"""
+        MATCH (node) WHERE node.id IN $node_ids AND NOT node:named_thing
+        RETURN collect({{node: {node_projection}, type: labels(node)}}) as nodes
+        """
+        chunk_size = 1024
+        chunks = [node_ids[start: start + chunk_size] for start in range(0, len(node_ids), chunk_size)]
+
+        async def fetch(ids):
+            async with limiter:
+                rows = await graph_interface.run_cypher_batched(cypher_get_nodes, {'node_ids': ids})
+                found = {node['node'].get('id') for row in rows for node in row['nodes']}
+                missing = [node_id for node_id in ids if node_id not in found]
+                if missing:
+                    rows += await graph_interface.run_cypher_batched(cypher_get_unlabelled_nodes,
+                                                                     {'node_ids': missing})
+            nodes = []
+            for row in rows:
+                for node in row['nodes']:
+                    node_properties = node['node']
+                    node_properties.pop(HUB_DEGREE_PROPERTY, None)
+                    if fields is not None:
+                        node_properties = self.drop_missing_attributes(node_properties)
+                    node_properties.update({
+                        'type': node['type']
+                    })
+                    nodes.append(node_properties)
+            return nodes
+
+        for task in asyncio.as_completed([fetch(ids) for ids in chunks]):
+            yield await task
+
+    async def get_edge_properties(self, graph_interface: GraphInterface, edge_ids, fields=None, edge_internal_ids=None,
+                                  limiter=None):
+        response = []
+        async for edges in self.iter_edge_properties(graph_interface, edge_ids, fields, edge_internal_ids, limiter):
+            response += edges
+        return response
+
+    async def iter_edge_properties(self, graph_interface: GraphInterface, edge_ids, fields=None,
+                                   edge_internal_ids=None, limiter=None):
+        """
+        Fetches edge properties in chunks, all chunks are requested at once and yielded as they arrive. Edges
+        with a known neo4j id are looked up by it, the rest through the edge id full-text index.
+        :param edge_internal_ids: neo4j ids of edges by kg id, see `format_result`.
+        :param limiter: bounds the chunk queries in flight, see `make_yank_limiter`.
+        """
         if not edge_ids:
-            return []
+            return
         functions = {
             'source_id': 'startNode(e).id',
             'target_id': 'endNode(e).id',
@@ -125,29 +476,40 @@ class Question:
 
         if fields is not None:
             prop_string = ', '.join(
-                [f'{key}:{functions[key]}' if key in functions else f'{key}:e.{key}' for key in fields])
+                [f'{key}:{functions[key]}' if key in functions else f'{cypher_name(key)}:e.{cypher_name(key)}' for key in fields])
         else:
             prop_string = ', '.join([f'{key}:{functions[key]}' for key in functions] + ['.*'])
+        edge_internal_ids = edge_internal_ids or {}
+        internal_ids = [edge_internal_ids[edge_id] for edge_id in edge_ids if edge_id in edge_internal_ids]
+        indexed_ids = [edge_id for edge_id in edge_ids if edge_id not in edge_internal_ids]
         chunk_size = 1024
-        chunks = [edge_ids[start: start + chunk_size] for start in range(0, len(edge_ids), chunk_size)]
-        tasks = []
-        for ids in chunks:
-            batch = ' '.join(ids)
-            statement = f"" \
-                f"CALL db.index.fulltext.queryRelationships('edge_id_index', '{batch}') YIELD relationship " \
-                f"WITH relationship as e RETURN collect(e{{{prop_string}}}) as edges"
-            print(f'grabbing enges{statement}')
-            tasks.append(graph_interface.run_cypher(statement))
-
-        answers = await asyncio.gather(*tasks)
-        response = []
-        for answer in answers:
-            if answer.get('errors'):
-                print(f'got neo4j error {answer.get("errors")}')
-            answer = graph_interface.convert_to_dict(answer)
-            if len(answer):
-                response += answer[0]['edges']
-        return response
+        id_statement = f"MATCH ()-[e]->() WHERE id(e) IN $ids RETURN collect(e{{{prop_string}}}) as edges"
+        index_statement = f"" \
+            f"CALL db.index.fulltext.queryRelationships('edge_id_index', $batch) YIELD relationship " \
+            f"WITH relationship as e RETURN collect(e{{{prop_string}}}) as edges"
+        statements = [
+            (id_statement, {'ids': internal_ids[start: start + chunk_size]})
+            for start in range(0, len(internal_ids), chunk_size)
+        ] + [
+            (index_statement, {'batch': ' '.join(indexed_ids[start: start + chunk_size])})
+            for start in range(0, len(indexed_ids), chunk_size)
+        ]
+        logger.debug(f'grabbing edges by id {len(internal_ids)}, by index {len(indexed_ids)}')
+
+        limiter = limiter or self.make_yank_limiter()
+
+        async def fetch(statement, parameters):
+            edges = []
+            async with limiter:
+                rows = await graph_interface.run_cypher_batched(statement, parameters)
+            for row in rows:
+                edges += row['edges']
+            if fields is not None:
+                edges = [self.drop_missing_attributes(edge) for edge in edges]
+            return edges
+
+        for task in asyncio.as_completed([fetch(statement, parameters) for statement, parameters in statements]):
+            yield await task
 
     def __validate(self):
         assert Question.QUERY_GRAPH_KEY in self._question_json, "No question graph in json."
@@ -163,6 +525,9 @@ class Question:
             assert 'id' in edge, f"Expected `id` in {edge}"
             assert Question.SOURCE_KEY in edge, f"Expected {Question.SOURCE_KEY} in {edge}"
             assert Question.TARGET_KEY in edge, f"Expected {Question.TARGET_KEY} in {edge}"
+        # attribute names end up in the cypher as property keys.
+        for attribute in self.attributes or []:
+            assert re.fullmatch(r'\w+', attribute), f"Expected attribute names made of word characters, got {attribute!r}"
         # make sure everything mentioned in edges is actually refering something in the node list.
         node_ids = list(map(lambda node: node['id'], question_graph[Question.NODES_LIST_KEY]))
         mentions = reduce(lambda accu, value: accu + value,
@@ -0,0 +1,166 @@
+import asyncio
+import time
+import uuid
+from collections import OrderedDict
+
+from PLATER.services.config import config
+from PLATER.services.util import deadline
+from PLATER.services.util.logutil import LoggingUtil
+
+logger = LoggingUtil.init_logging(__name__,
+                                  config.get('logging_level'),
+                                  config.get('logging_format')
+                                  )
+
+
+class CursorStoreFull(Exception):
+    """Raised when no cursor can be opened, every open cursor being busy reading a page."""
+
+
+class ResultCursor:
+    """
+    Rows of an answer query being read a page at a time. The query runs once, the cursor keeps its open result
+    stream and hands out the next rows on every page. The query isn't bound to the deadline of the request
+    starting it, each page's read is bound to its own request's instead; a read cut off terminates the query.
+    """
+
+    def __init__(self, question, rows, ttl: float):
+        """
+        :param question: question being answered.
+        :param rows: async iterator of answer query rows.
+        :param ttl: seconds the cursor is kept after its last use.
+        """
+        self.id = uuid.uuid4().hex
+        self.question = question
+        self.ttl = ttl
+        self.expires = time.monotonic() + ttl
+        self.exhausted = False
+        # one page at a time per cursor.
+        self.lock = asyncio.Lock()
+        self._rows = rows
+        self._next_row = None
+
+    @property
+    def expired(self):
+        return time.monotonic() > self.expires
+
+    async def take(self, count: int) -> list:
+        """
+        Reads the next rows. One row is read ahead so the cursor knows if there is a next page.
+        :param count: number of rows to read.
+        :type count: int
+        :return: up to `count` rows.
+        :rtype: list
+        """
+        rows = [] if self._next_row is None else [self._next_row]
+        self._next_row = None
+        try:
+            while not self.exhausted and len(rows) <= count:
+                try:
+                    with deadline.unbounded():
+                        rows.append(await self._rows.__anext__())
+                except StopAsyncIteration:
+                    self.exhausted = True
+        except BaseException:
+            # a read cut off (deadline passed, client gone) leaves the result stream unusable.
+            self.exhausted = True
+            raise
+        if len(rows) > count:
+            self._next_row = rows.pop()
+        self.expires = time.monotonic() + self.ttl
+        return rows
+
+    @property
+    def has_next(self):
+        return self._next_row is not None
+
+    @staticmethod
+    async def iterate(rows: list):
+        """
+        Async iterator over rows taken from a cursor, for `Question.answer_rows`.
+        """
+        for row in rows:
+            yield row
+
+    async def close(self):
+        """
+        Stops the answer query.
+        """
+        self.exhausted = True
+        self._next_row = None
+        if hasattr(self._rows, 'aclose'):
+            await self._rows.aclose()
+
+
+class CursorStore:
+    """
+    Open result cursors by id. Cursors are dropped once read to the end, after `ttl` seconds without use, or when
+    `max_cursors` newer ones are opened, least recently used first. Cursors busy reading a page are never dropped.
+    Every open cursor holds a connection and a transaction of neo4j, terminated when it's dropped, so keep
+    `max_cursors` below the driver's connection pool size. Cursors live in the process that opened them, with
+    several workers the pages of a cursor have to reach the same one.
+    """
+
+    def __init__(self, ttl: float = 300, max_cursors: int = 16):
+        self.ttl = ttl
+        self.max_cursors = max_cursors
+        self._cursors = OrderedDict()
+
+    def create(self, question, rows) -> ResultCursor:
+        """
+        Opens a cursor over rows of an answer query.
+        :param question: question being answered.
+        :param rows: async iterator of answer query rows.
+        :return: new cursor.
+        :rtype: ResultCursor
+        :raises CursorStoreFull: if `max_cursors` cursors are open and all of them are busy.
+        """
+        self.expire()
+        while len(self._cursors) >= self.max_cursors:
+            oldest = next((cursor for cursor in self._cursors.values() if not cursor.lock.locked()), None)
+            if oldest is None:
+                raise CursorStoreFull(f'All {self.max_cursors} result cursors are busy, try again later.')
+            del self._cursors[oldest.id]
+            logger.info(f'Dropping result cursor {oldest.id}, too many cursors open.')
+            asyncio.ensure_future(oldest.close())
+        cursor = ResultCursor(question, rows, self.ttl)
+        self._cursors[cursor.id] = cursor
+        return cursor
+
+    def get(self, cursor_id: str):
+        """
+        Looks up an open cursor.
+        :param cursor_id: id of the cursor.
+        :type cursor_id: str
+        :return: cursor, None if it's unknown or expired.
+        :rtype: ResultCursor
+        """
+        self.expire()
+        cursor = self._cursors.get(cursor_id)
+        if cursor is not None:
+            self._cursors.move_to_end(cursor_id)
+        return cursor
+
+    async def release(self, cursor: ResultCursor):
+        """
+        Drops a cursor if it has no rows left.
+        """
+        if not cursor.has_next:
+            self._cursors.pop(cursor.id, None)
+            await cursor.close()
+
+    def expire(self):
+        # cursors busy reading a page are left alone.
+        for cursor in [cursor for cursor in self._cursors.values() if cursor.expired and not cursor.lock.locked()]:
+            logger.debug(f'Result cursor {cursor.id} expired.')
+            del self._cursors[cursor.id]
+            asyncio.ensure_future(cursor.close())
+
+    async def close(self):
+        """
+        Closes all cursors.
+        """
+        cursors = list(self._cursors.values())
+        self._cursors.clear()
+        for cursor in cursors:
+            await cursor.close()
@@ -0,0 +1,110 @@
+import json
+from collections import OrderedDict
+
+from PLATER.services.config import config
+from PLATER.services.util.logutil import LoggingUtil
+
+logger = LoggingUtil.init_logging(__name__,
+                                  config.get('logging_level'),
+                                  config.get('logging_format')
+                                  )
+
+
+class SupportEdgeCache:
+    """
+    LRU cache of the edges between pairs of knowledge graph nodes, used by overlay to skip cover queries for
+    node pairs it has already seen. A pair maps to every edge between the two nodes, in either direction, or to
+    an empty list if they are not connected. Bounded by an estimate of the bytes held. Entries are only valid
+    for the graph they were read from, which is identified by the build tag and the graph fingerprint.
+    """
+    # rough per entry overhead of the key tuple and the ordered dict slot.
+    ENTRY_OVERHEAD = 200
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._sizes = {}
+        self._size = 0
+        self._validated_against = None
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
+
+    @staticmethod
+    def pair_key(node_id_1: str, node_id_2: str) -> tuple:
+        """
+        Key of a node pair, the same regardless of the order of the nodes.
+        """
+        return (node_id_1, node_id_2) if node_id_1 <= node_id_2 else (node_id_2, node_id_1)
+
+    def validate(self, build_tag: str, graph_fingerprint: dict):
+        """
+        Drops all entries if the graph changed since they were cached.
+        :param build_tag: build tag of the graph.
+        :type build_tag: str
+        :param graph_fingerprint: counts identifying the state of the graph, see `GraphInterface.get_fingerprint`.
+        None if not known.
+        :type graph_fingerprint: dict
+        """
+        validated_against = json.dumps([build_tag, graph_fingerprint], sort_keys=True)
+        if self._validated_against == validated_against:
+            return
+        if self._validated_against is not None and self._entries:
+            logger.info(f'Graph changed, dropping {len(self._entries)} cached node pairs.')
+        self._validated_against = validated_against
+        self.clear()
+
+    def clear(self):
+        self._entries.clear()
+        self._sizes.clear()
+        self._size = 0
+
+    def get(self, pair: tuple):
+        """
+        Looks up the edges between a node pair.
+        :param pair: key see `pair_key`.
+        :type pair: tuple
+        :return: list of edges, None if the pair was never looked up.
+        :rtype: list
+        """
+        edges = self._entries.get(pair)
+        if edges is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(pair)
+        self.hits += 1
+        return edges
+
+    def put(self, pair: tuple, edges: list):
+        """
+        Stores all the edges between a node pair.
+        :param pair: key see `pair_key`.
+        :type pair: tuple
+        :param edges: every edge between the nodes, empty if there is none.
+        :type edges: list
+        """
+        if not self.enabled:
+            return
+        size = SupportEdgeCache.ENTRY_OVERHEAD + (len(json.dumps(edges, default=str)) if edges else 0)
+        if size > self.max_bytes:
+            return
+        if pair in self._entries:
+            self._size -= self._sizes[pair]
+        self._entries[pair] = edges
+        self._entries.move_to_end(pair)
+        self._sizes[pair] = size
+        self._size += size
+        while self._size > self.max_bytes:
+            evicted, _ = self._entries.popitem(last=False)
+            self._size -= self._sizes.pop(evicted)
+
+    def get_stats(self) -> dict:
+        return {
+            'pairs': len(self._entries),
+            'bytes': self._size,
+            'hits': self.hits,
+            'misses': self.misses
+        }
@@ -5,4 +5,8 @@ setup(
     name='PLATER',
     version='0.1',
     packages=find_packages(),
+    extras_require={
+        # NEO4J_DRIVER=bolt
+        'bolt': ['neo4j>=5.0'],
+    },
 )
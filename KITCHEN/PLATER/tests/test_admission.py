@@ -0,0 +1,123 @@
+import asyncio
+import gc
+from starlette.responses import JSONResponse, StreamingResponse
+from PLATER.services.util.admission import AdmissionController, AdmissionGroup, AdmissionRejected
+import pytest
+
+
+def run(coroutine):
+    event_loop = asyncio.new_event_loop()
+    try:
+        return event_loop.run_until_complete(coroutine)
+    finally:
+        event_loop.close()
+
+
+def test_group_queues_in_order():
+    group = AdmissionGroup('query', max_concurrent=2, max_queued=2, queue_timeout=1)
+    admitted = []
+
+    async def request(number):
+        await group.acquire()
+        admitted.append(number)
+        await asyncio.sleep(0.01)
+        group.release()
+
+    async def requests():
+        await asyncio.gather(*[request(number) for number in range(4)])
+
+    run(requests())
+    assert admitted == [0, 1, 2, 3]
+    stats = group.get_stats()
+    assert stats['queued'] == 2 and stats['running'] == 0 and stats['waiting'] == 0
+
+
+def test_group_rejects_when_full():
+    group = AdmissionGroup('query', max_concurrent=1, max_queued=1, queue_timeout=0.01)
+
+    async def requests():
+        await group.acquire()
+        waiting = asyncio.ensure_future(group.acquire())
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejected) as full:
+            await group.acquire()
+        with pytest.raises(AdmissionRejected) as timed_out:
+            await waiting
+        group.release()
+        return full.value.status_code, timed_out.value.status_code
+
+    assert run(requests()) == (429, 503)
+    assert group.running == 0
+
+
+def test_guard():
+    controller = AdmissionController(retry_after=7)
+    controller.add_group('query', max_concurrent=1, max_queued=0)
+    controller.add_group('lookup', max_concurrent=0)
+    # unlimited groups aren't guarded
+    handler = lambda request: None
+    assert controller.guard('lookup', handler) is handler
+
+    class Request:
+        class url:
+            path = '/query'
+
+    async def chunks():
+        yield b'{}'
+
+    async def stream_handler(request):
+        return StreamingResponse(chunks())
+
+    async def json_handler(request):
+        return JSONResponse({})
+
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    async def disconnected(message):
+        raise OSError('client went away')
+
+    async def requests():
+        streamed = await controller.guard('query', stream_handler)(Request())
+        assert streamed.status_code == 200
+        # the slot is held until the response is sent
+        rejected = await controller.guard('query', json_handler)(Request())
+        await streamed({'type': 'http'}, None, send)
+        answered = await controller.guard('query', json_handler)(Request())
+        # or fails to be
+        streamed = await controller.guard('query', stream_handler)(Request())
+        with pytest.raises(OSError):
+            await streamed({'type': 'http'}, None, disconnected)
+        return rejected, answered
+
+    rejected, answered = run(requests())
+    assert sent[1]['body'] == b'{}'
+    assert rejected.status_code == 429
+    assert rejected.headers['Retry-After'] == '7'
+    assert answered.status_code == 200
+    assert controller.get_stats()['query']['running'] == 0
+
+
+def test_unsent_streamed_response_releases_its_slot():
+    controller = AdmissionController()
+    controller.add_group('query', max_concurrent=1, max_queued=0)
+
+    class Request:
+        class url:
+            path = '/query'
+
+    async def chunks():
+        yield b'{}'
+
+    async def stream_handler(request):
+        return StreamingResponse(chunks())
+
+    async def requests():
+        # the body is never consumed, the response is just dropped
+        await controller.guard('query', stream_handler)(Request())
+        gc.collect()
+        return await controller.guard('query', stream_handler)(Request())
+
+    assert run(requests()).status_code == 200
@@ -0,0 +1,77 @@
+import asyncio
+from PLATER.services.util.answer_cache import AnswerCache
+
+
+def run(coroutine):
+    return asyncio.get_event_loop().run_until_complete(coroutine)
+
+
+def test_key_is_canonical():
+    assert AnswerCache.make_key({'a': 1, 'b': [1, 2]}) == AnswerCache.make_key({'b': [1, 2], 'a': 1})
+    assert AnswerCache.make_key({'a': 1}) != AnswerCache.make_key({'a': 2})
+    assert AnswerCache.make_key({'a': 1}) != AnswerCache.make_key({'a': 1}, {'stream': 'true'})
+
+
+def test_lru_eviction_by_entries_and_bytes():
+    cache = AnswerCache(max_entries=2, max_bytes=10)
+    run(cache.put('a', b'1234'))
+    run(cache.put('b', b'1234'))
+    # touch a so b is the least recently used
+    assert run(cache.get('a')) == b'1234'
+    run(cache.put('c', b'1234'))
+    assert run(cache.get('b')) is None
+    assert run(cache.get('a')) == b'1234'
+    # too many bytes
+    run(cache.put('d', b'123456789'))
+    assert run(cache.get('c')) is None
+    assert run(cache.get('a')) is None
+    assert run(cache.get('d')) == b'123456789'
+    assert cache.get_stats()['bytes'] == 9
+
+
+def test_disk_tier_and_invalidation(tmpdir):
+    cache = AnswerCache(cache_dir=str(tmpdir))
+    cache.validate('build-1', {'nodeCount': 1})
+    run(cache.put('a', b'answer'))
+    # a new process on the same graph reads from disk
+    restarted = AnswerCache(cache_dir=str(tmpdir))
+    restarted.validate('build-1', {'nodeCount': 1})
+    assert run(restarted.get('a')) == b'answer'
+    # graph changed
+    restarted.validate('build-1', {'nodeCount': 2})
+    assert run(restarted.get('a')) is None
+    assert len(tmpdir.join(AnswerCache.DISK_DIRECTORY).listdir()[0].listdir()) == 1
+
+
+def test_disk_tier_keeps_to_its_own_files(tmpdir):
+    tmpdir.join('other.log').write('kept')
+    cache = AnswerCache(cache_dir=str(tmpdir))
+    cache.validate('build-1', {'nodeCount': 1})
+    run(cache.put('a', b'answer'))
+    other_build = AnswerCache(cache_dir=str(tmpdir))
+    other_build.validate('build-2', {'nodeCount': 5})
+    run(other_build.put('a', b'other answer'))
+    cache.validate('build-1', {'nodeCount': 1})
+    assert run(cache.get('a')) == b'answer'
+    assert tmpdir.join('other.log').read() == 'kept'
+    # concurrent writes of the same key each use a temp file of their own
+    run(asyncio.gather(cache.put('b', b'first'), cache.put('b', b'second')))
+    restarted = AnswerCache(cache_dir=str(tmpdir))
+    restarted.validate('build-1', {'nodeCount': 1})
+    assert run(restarted.get('b')) in (b'first', b'second')
+    assert not [path for path in tmpdir.visit() if path.ext == '.tmp']
+
+
+def test_disk_tier_is_left_alone_until_the_graph_is_known(tmpdir):
+    cache = AnswerCache(cache_dir=str(tmpdir))
+    cache.validate('build-1', {'nodeCount': 1})
+    run(cache.put('a', b'answer'))
+    starting = AnswerCache(cache_dir=str(tmpdir))
+    starting.validate('build-1', None)
+    run(starting.put('b', b'answer'))
+    assert run(starting.get('a')) is None
+    assert run(starting.get('b')) == b'answer'
+    build_directory, = tmpdir.join(AnswerCache.DISK_DIRECTORY).listdir()
+    assert len(build_directory.listdir()) == 1
+    starting.validate('build-1', {'nodeCount': 1})
+    assert run(starting.get('a')) == b'answer'
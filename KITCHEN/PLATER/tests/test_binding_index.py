@@ -0,0 +1,27 @@
+from PLATER.services.util.binding_index import BindingIndex, binding_kg_ids
+
+
+def test_binding_kg_ids_flattens_set_bindings():
+    bindings = [{'qg_id': 'n0', 'kg_id': 'A'}, {'qg_id': 'n1', 'kg_id': ['B', 'C']}, {'qg_id': 'n2', 'kg_id': []}]
+    assert list(binding_kg_ids(bindings)) == ['A', 'B', 'C']
+
+
+def test_binding_index():
+    answers = [
+        {
+            'node_bindings': [{'qg_id': 'n0', 'kg_id': 'A'}, {'qg_id': 'n1', 'kg_id': ['B', 'A']}],
+            'edge_bindings': [{'qg_id': 'e0', 'kg_id': ['e1', 'e2']}]
+        },
+        {
+            'node_bindings': [{'qg_id': 'n0', 'kg_id': 'C'}, {'qg_id': 'n1', 'kg_id': 'B'}],
+            'edge_bindings': [{'qg_id': 'e0', 'kg_id': 'e3'}]
+        },
+        # answers without edge bindings are fine too
+        {'node_bindings': [{'qg_id': 'n0', 'kg_id': 'D'}]}
+    ]
+    index = BindingIndex(answers)
+    assert index.node_ids == {'A', 'B', 'C', 'D'}
+    assert index.edge_ids == {'e1', 'e2', 'e3'}
+    assert index.answer_node_ids == [['A', 'B'], ['C', 'B'], ['D']]
+    empty = BindingIndex([])
+    assert empty.node_ids == set() and empty.edge_ids == set() and empty.answer_node_ids == []
@@ -0,0 +1,77 @@
+import asyncio
+import pytest
+from PLATER.services.util import deadline
+
+
+def run(coroutine):
+    event_loop = asyncio.new_event_loop()
+    try:
+        return event_loop.run_until_complete(coroutine)
+    finally:
+        event_loop.close()
+
+
+def test_run_within():
+    remaining = []
+
+    async def work(seconds):
+        remaining.append(deadline.remaining())
+        await asyncio.sleep(seconds)
+        return seconds
+
+    assert run(deadline.run_within(work(0), 10)) == 0
+    assert 9 < remaining[0] <= 10
+    with pytest.raises(asyncio.TimeoutError):
+        run(deadline.run_within(work(10), 0.01))
+    # no deadline outside of the work
+    assert deadline.remaining() is None
+    assert run(deadline.run_within(work(0), None)) == 0
+    assert remaining[-1] is None
+
+
+def test_run_within_stops_on_disconnect():
+    cancelled = []
+
+    async def work():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    with pytest.raises(deadline.ClientDisconnected):
+        run(deadline.run_within(work(), 10, asyncio.sleep(0.01)))
+    assert cancelled == [True]
+
+
+def test_iterate_within():
+    closed = []
+
+    async def items():
+        try:
+            for item in range(10):
+                await asyncio.sleep(0.01 if item < 3 else 10)
+                yield item
+        finally:
+            closed.append(True)
+
+    async def collect(timeout):
+        return [item async for item in deadline.iterate_within(items(), timeout)]
+
+    assert run(collect(0.2)) == [0, 1, 2]
+    assert closed == [True]
+
+
+def test_iterate_within_closes_on_timeout():
+    async def items():
+        yield '['
+        await asyncio.sleep(10)
+        yield ']'
+
+    async def collect(disconnected=None):
+        return [item async for item in deadline.iterate_within(items(), 0.05, disconnected,
+                                                               lambda message: f'"{message}"]')]
+
+    assert run(collect()) == ['[', '"Timed out after 0.05 seconds."]']
+    # a client that went away gets nothing more
+    assert run(collect(asyncio.sleep(0.01))) == ['[']
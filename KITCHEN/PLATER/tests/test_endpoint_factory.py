@@ -43,10 +43,11 @@ class MockGraphInterface(GraphInterface):
         with open(node_list_file_path) as j_file:
             return json.load(j_file)[0]
 
-    async def get_single_hops(self, source_type, target_type, curie):
+    async def get_single_hops(self, source_type, target_type, curie, limit=None, offset=0):
         single_hop_triplets_file_path = os.path.join(os.path.dirname(__file__), 'data', 'single_hop_triplets.json')
         with open(single_hop_triplets_file_path) as j_file:
-            return json.load(j_file)
+            triplets = json.load(j_file)
+        return triplets[offset: offset + limit if limit is not None else None]
 
     async def run_cypher(self, cypher):
 
@@ -54,6 +55,23 @@ class MockGraphInterface(GraphInterface):
             'cypher': cypher
         }
 
+    queries_run = 0
+
+    async def stream_cypher(self, cypher, parameters=None):
+        # answers n0 -> n1 questions with five results
+        MockGraphInterface.queries_run += 1
+        for i in range(5):
+            yield {
+                'nodes': [{'qg_id': 'n0', 'kg_id': 'NODE:0'}, {'qg_id': 'n1', 'kg_id': f'NODE:{i + 1}'}],
+                'edges': [{'qg_id': 'e0', 'kg_id': f'EDGE:{i}'}]
+            }
+
+    async def run_cypher_batched(self, cypher, parameters=None):
+        if 'node_ids' in parameters:
+            return [{'nodes': [{'node': {'id': node_id}, 'type': ['named_thing']}
+                               for node_id in parameters['node_ids']]}]
+        return [{'edges': [{'id': edge_id} for edge_id in parameters['batch'].split(' ')]}]
+
     async def get_examples(self, source, target=None):
         single_hop_triplets_file_path = os.path.join(os.path.dirname(__file__), 'data', 'single_hop_triplets.json')
         with open(single_hop_triplets_file_path) as j_file:
@@ -107,6 +125,17 @@ def test_one_hop_response(client, graph_interface):
     assert response.json() == graph_response
 
 
+def test_one_hop_response_paging(client, graph_interface):
+    event_loop = asyncio.get_event_loop()
+    graph_response = event_loop.run_until_complete(graph_interface.get_single_hops('chemical_substance', 'gene',
+                                                                                   'CHEBI:11492'))
+    response = client.get('/chemical_substance/gene/CHEBI:11492?limit=1&offset=1')
+    assert response.status_code == 200
+    assert response.json() == graph_response[1:2]
+    response = client.get('/chemical_substance/gene/CHEBI:11492?limit=-1')
+    assert response.status_code == 400
+
+
 def test_open_api_schema_endpoint_creation(endpoint_factory):
     route = endpoint_factory.create_endpoint(EndpointFactory.OPEN_API_ENDPOINT_TYPE, **{
         'build_tag': 'test-tag'
@@ -206,3 +235,69 @@ def test_simple_one_hop_spec_response(client, graph_interface):
     assert response.status_code == 200
     response = client.get(f'/simple_spec?target=SOME:CURIE')
     assert response.status_code == 200
+
+
+def test_query_paging(client, graph_interface):
+    question = {
+        'query_graph': {
+            'nodes': [{'id': 'n0', 'type': 'named_thing', 'curie': 'NODE:0'}, {'id': 'n1', 'type': 'named_thing'}],
+            'edges': [{'id': 'e0', 'source_id': 'n0', 'target_id': 'n1'}]
+        }
+    }
+    MockGraphInterface.queries_run = 0
+    pages = []
+    response = client.post('/query?page_size=2', json=question)
+    while True:
+        assert response.status_code == 200
+        page = response.json()
+        pages.append(page)
+        if 'next_cursor' not in page:
+            break
+        response = client.post(f'/query?page_size=2&cursor={page["next_cursor"]}', json=question)
+    assert [len(page['results']) for page in pages] == [2, 2, 1]
+    assert [binding['kg_id'] for page in pages for result in page['results']
+            for binding in result['edge_bindings']] == [f'EDGE:{i}' for i in range(5)]
+    assert sorted(edge['id'] for edge in pages[1]['knowledge_graph']['edges']) == ['EDGE:2', 'EDGE:3']
+    # the query only ran once
+    assert MockGraphInterface.queries_run == 1
+    # finished cursors are dropped
+    response = client.post(f'/query?cursor={pages[0]["next_cursor"]}', json=question)
+    assert response.status_code == 404
+    response = client.post('/query?page_size=0', json=question)
+    assert response.status_code == 400
+
+
+def test_query_timeout(client, graph_interface):
+    cancelled = []
+
+    async def run_cypher(cypher):
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(cypher)
+            raise
+
+    graph_interface.run_cypher = run_cypher
+    response = client.post('/cypher?timeout=0.05', json={'query': 'MATCH (n) RETURN n'})
+    assert response.status_code == 504
+    # the query was stopped, not left running
+    assert cancelled == ['MATCH (n) RETURN n']
+    response = client.post('/cypher?timeout=-1', json={'query': 'MATCH (n) RETURN n'})
+    assert response.status_code == 400
+
+
+def test_paged_answers_are_not_capped(client, monkeypatch):
+    question = {
+        'query_graph': {
+            'nodes': [{'id': 'n0', 'type': 'named_thing', 'curie': 'NODE:0'}, {'id': 'n1', 'type': 'named_thing'}],
+            'edges': [{'id': 'e0', 'source_id': 'n0', 'target_id': 'n1'}]
+        }
+    }
+    monkeypatch.setattr('PLATER.services.endpoint_factory.config', {'max_results': 3})
+    response = client.post('/query', json=question).json()
+    assert len(response['results']) == 3 and response['truncated'] is True
+    response = client.post('/query?page_size=4', json=question).json()
+    results = len(response['results'])
+    response = client.post(f'/query?cursor={response["next_cursor"]}', json=question).json()
+    assert results + len(response['results']) == 5
+    assert 'truncated' not in response
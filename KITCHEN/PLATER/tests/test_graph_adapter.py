@@ -0,0 +1,367 @@
+import asyncio
+from contextlib import asynccontextmanager
+import json
+import pytest
+from PLATER.services.util import deadline
+from PLATER.services.util.graph_adapter import GraphInterface, Neo4jHTTPDriver
+from PLATER.services.util.graph_snapshot import GraphSnapshot
+from PLATER.services.util.neo4j_response_parser import Neo4jResponseParser
+
+
+@pytest.fixture()
+def driver(monkeypatch):
+    # skip contacting neo4j on construction
+    monkeypatch.setattr(Neo4jHTTPDriver, 'ping', lambda self: None)
+    monkeypatch.setattr(Neo4jHTTPDriver, 'make_indexes', lambda self, index_name: [])
+    monkeypatch.setattr(Neo4jHTTPDriver, 'check_apoc_support', lambda self: True)
+    return Neo4jHTTPDriver('localhost', 7474, ('neo4j', 'pass'))
+
+
+def test_session_is_shared_within_event_loop(driver):
+    async def get_sessions():
+        first = driver.get_session()
+        second = driver.get_session()
+        stats = driver.get_pool_stats()
+        await driver.close()
+        return first, second, stats
+
+    event_loop = asyncio.new_event_loop()
+    first, second, stats = event_loop.run_until_complete(get_sessions())
+    event_loop.close()
+    assert first is second
+    assert first.closed
+    assert stats['sessions_created'] == 1
+    assert stats['open_sessions'] == 1
+    assert driver.get_pool_stats()['open_sessions'] == 0
+
+
+def parse_rows(body, chunk_size):
+    async def chunks():
+        encoded = body.encode('utf-8')
+        for start in range(0, len(encoded), chunk_size):
+            yield encoded[start: start + chunk_size]
+
+    async def collect():
+        parser = Neo4jResponseParser(chunks())
+        rows = [row async for row in parser.rows()]
+        return rows, parser
+
+    return asyncio.new_event_loop().run_until_complete(collect())
+
+
+@pytest.mark.parametrize('chunk_size', [1, 7, 4096])
+def test_response_parser_yields_rows(chunk_size):
+    body = json.dumps({
+        'results': [
+            {'columns': ['a', 'b'], 'data': [
+                {'row': [{'id': 'NODE:1', 'name': 'ünïcode'}, 12345], 'meta': [None, None]},
+                {'row': [[1.5, True, None], -7], 'meta': [None, None]}
+            ]},
+            {'columns': ['c'], 'data': []},
+            {'columns': ['d'], 'data': [{'row': ['x'], 'meta': [None]}]}
+        ],
+        'errors': []
+    }, indent=1)
+    rows, parser = parse_rows(body, chunk_size)
+    assert rows == [
+        {'a': {'id': 'NODE:1', 'name': 'ünïcode'}, 'b': 12345},
+        {'a': [1.5, True, None], 'b': -7},
+        {'d': 'x'}
+    ]
+    assert parser.statement_index == 2
+    assert parser.errors == []
+
+
+def test_response_parser_reports_errors():
+    body = '{"results":[],"errors":[{"code":"Neo.ClientError","message":"bad"}]}'
+    rows, parser = parse_rows(body, 5)
+    assert rows == []
+    assert parser.errors == [{'code': 'Neo.ClientError', 'message': 'bad'}]
+
+
+def test_snapshot_round_trip(tmpdir):
+    snapshot = GraphSnapshot('build-1', str(tmpdir))
+    assert snapshot.load() is None
+    snapshot.save({'gene': {}}, {'gene': {'nodes_count': 1}}, {'nodeCount': 1})
+    loaded = snapshot.load()
+    assert loaded['schema'] == {'gene': {}}
+    assert loaded['summary'] == {'gene': {'nodes_count': 1}}
+    assert loaded['fingerprint'] == {'nodeCount': 1}
+    assert GraphSnapshot('build-2', str(tmpdir)).load() is None
+
+
+def test_schema_is_read_from_snapshot(driver, tmpdir, monkeypatch):
+    monkeypatch.setattr(GraphInterface._GraphInterface, 'get_fingerprint', lambda self: {'nodeCount': 1})
+    generated = []
+    monkeypatch.setattr(GraphInterface._GraphInterface, 'generate_schema',
+                        lambda self: generated.append('schema') or {'gene': {}})
+    monkeypatch.setattr(GraphInterface._GraphInterface, 'generate_summary',
+                        lambda self: generated.append('summary') or {'gene': {'nodes_count': 1}})
+    monkeypatch.setattr('PLATER.services.util.graph_adapter.config', {'graph_snapshot_dir': str(tmpdir)})
+    graph_interface = GraphInterface._GraphInterface('localhost', 7474, ('neo4j', 'pass'), build_tag='build-1')
+    assert graph_interface.get_summary() == {'gene': {'nodes_count': 1}}
+    assert generated == ['schema', 'summary']
+    # next start up reads the snapshot
+    graph_interface = GraphInterface._GraphInterface('localhost', 7474, ('neo4j', 'pass'), build_tag='build-1')
+    assert graph_interface.get_schema() == {'gene': {}}
+    assert graph_interface.summary == {'gene': {'nodes_count': 1}}
+    assert generated == ['schema', 'summary']
+
+
+def test_stale_snapshot_is_refreshed_on_the_event_loop(driver, tmpdir, monkeypatch):
+    GraphSnapshot('build-1', str(tmpdir)).save({'gene': {}}, {'gene': {'nodes_count': 1}}, {'nodeCount': 1},
+                                               {'min_degree': 1000, 'nodes': 2})
+    monkeypatch.setattr(GraphInterface._GraphInterface, 'get_fingerprint', lambda self: {'nodeCount': 2})
+
+    async def stream(query, parameters=None):
+        yield {'source_label': 'gene', 'predicate': 'related_to', 'target_label': 'disease'}
+
+    async def generate_summary_async(self):
+        return {'gene': {'nodes_count': 2}}
+
+    async def generate_hub_index(self, min_degree):
+        return {'min_degree': min_degree, 'nodes': 3}
+
+    monkeypatch.setattr(driver, 'stream', stream)
+    monkeypatch.setattr(GraphInterface._GraphInterface, 'generate_summary_async', generate_summary_async)
+    monkeypatch.setattr(GraphInterface._GraphInterface, 'generate_hub_index', generate_hub_index)
+    monkeypatch.setattr('PLATER.services.util.graph_adapter.Neo4jHTTPDriver', lambda **kwargs: driver)
+    monkeypatch.setattr('PLATER.services.util.graph_adapter.config', {'graph_snapshot_dir': str(tmpdir),
+                                                                       'hub_min_degree': 1000,
+                                                                       'hub_index_write': 'true'})
+    graph_interface = GraphInterface._GraphInterface('localhost', 7474, ('neo4j', 'pass'), build_tag='build-1')
+    # the old snapshot is served until the refresh is done
+    assert graph_interface.get_schema() == {'gene': {}}
+    assert graph_interface.snapshot_stale
+    event_loop = asyncio.new_event_loop()
+    event_loop.run_until_complete(graph_interface.refresh_snapshot())
+    event_loop.close()
+    assert graph_interface.schema == {'gene': {'disease': ['related_to']}, 'disease': {'gene': ['related_to']}}
+    assert graph_interface.summary == {'gene': {'nodes_count': 2}}
+    assert graph_interface.hub_index == {'min_degree': 1000, 'nodes': 3}
+    snapshot = graph_interface.snapshot.load()
+    assert snapshot['fingerprint'] == {'nodeCount': 2} and snapshot['hub_index']['nodes'] == 3
+
+
+def test_summary_is_generated_concurrently(driver, monkeypatch):
+    in_flight = []
+    peak = []
+
+    async def stream(query, parameters=None):
+        if 'DISTINCT labels(c)' in query:
+            for index in range(10):
+                yield {'types': [f'label_{index}', 'named_thing'], 'count': index}
+            return
+        in_flight.append(query)
+        peak.append(len(in_flight))
+        await asyncio.sleep(0.01)
+        in_flight.remove(query)
+        yield {'edge_types': 'related_to', 'edge_counts': 3, 'target_labels': ['named_thing']}
+
+    monkeypatch.setattr(driver, 'stream', stream)
+    monkeypatch.setattr('PLATER.services.util.graph_adapter.Neo4jHTTPDriver', lambda **kwargs: driver)
+    graph_interface = GraphInterface._GraphInterface('localhost', 7474, ('neo4j', 'pass'))
+    event_loop = asyncio.new_event_loop()
+    summary = event_loop.run_until_complete(graph_interface.generate_summary_async(concurrency=3))
+    event_loop.close()
+    assert max(peak) == 3
+    assert len(summary) == 10
+    assert summary['label_4:named_thing'] == {'nodes_count': 4, 'named_thing': {'related_to': 3}}
+    assert graph_interface.summary_progress['status'] == 'done'
+    assert graph_interface.summary_progress['completed'] == 10
+    assert len(graph_interface.summary_progress['timings']) == 10
+
+
+def test_concurrent_statements_are_batched(driver, monkeypatch):
+    payloads = []
+
+    async def post_request_json(payload):
+        payloads.append(payload)
+        statements = payload['statements']
+        if any('bad' in statement['statement'] for statement in statements):
+            return {'results': [], 'errors': [{'message': 'bad statement'}]}
+        return {
+            'results': [{'columns': ['q'], 'data': [{'row': [statement['statement']]}]} for statement in statements],
+            'errors': []
+        }
+
+    monkeypatch.setattr(driver, 'post_request_json', post_request_json)
+
+    async def run_all(queries):
+        return await asyncio.gather(*[driver.run_batched(query) for query in queries], return_exceptions=True)
+
+    event_loop = asyncio.new_event_loop()
+    results = event_loop.run_until_complete(run_all(['q1', 'q2', 'q3']))
+    assert len(payloads) == 1
+    assert [driver.convert_to_dict(result) for result in results] == [[{'q': 'q1'}], [{'q': 'q2'}], [{'q': 'q3'}]]
+    # a failing statement only fails its own caller
+    payloads.clear()
+    results = event_loop.run_until_complete(run_all(['q1', 'bad']))
+    event_loop.close()
+    assert len(payloads) == 3
+    assert driver.convert_to_dict(results[0]) == [{'q': 'q1'}]
+    assert isinstance(results[1], RuntimeWarning)
+
+
+def test_failed_requests_raise(driver, monkeypatch):
+    class Response:
+        status = 500
+
+        async def text(self):
+            return 'out of memory'
+
+    @asynccontextmanager
+    async def transaction_request(payload):
+        yield Response()
+
+    monkeypatch.setattr(driver, 'transaction_request', transaction_request)
+    event_loop = asyncio.new_event_loop()
+    with pytest.raises(RuntimeWarning, match='500 -- out of memory'):
+        event_loop.run_until_complete(driver.run('MATCH (n) RETURN n'))
+    # batched callers see the failure too
+    with pytest.raises(RuntimeWarning, match='500'):
+        event_loop.run_until_complete(driver.run_batched('MATCH (n) RETURN n'))
+    event_loop.close()
+
+
+def test_batches_run_until_their_last_caller_gives_up(driver, monkeypatch):
+    remaining = []
+
+    async def post_request_json(payload):
+        remaining.append(deadline.remaining())
+        return {
+            'results': [{'columns': ['q'], 'data': [{'row': [1]}]} for _ in payload['statements']],
+            'errors': []
+        }
+
+    monkeypatch.setattr(driver, 'post_request_json', post_request_json)
+
+    async def run_all(timeouts):
+        return await asyncio.gather(*[deadline.run_within(driver.run_batched('q'), timeout) for timeout in timeouts])
+
+    event_loop = asyncio.new_event_loop()
+    event_loop.run_until_complete(run_all([5, 20]))
+    event_loop.run_until_complete(run_all([5, None]))
+    event_loop.close()
+    assert 15 < remaining[0] <= 20
+    assert remaining[1] is None
+
+
+def test_hub_nodes_are_indexed_once(driver, tmpdir, monkeypatch):
+    queries = []
+
+    async def run(query, parameters=None):
+        queries.append((query, parameters, deadline.remaining()))
+        return {'results': [{'columns': ['nodes'], 'data': [{'row': [2]}]}], 'errors': []}
+
+    monkeypatch.setattr(driver, 'run', run)
+    monkeypatch.setattr('PLATER.services.util.graph_adapter.Neo4jHTTPDriver', lambda **kwargs: driver)
+    monkeypatch.setattr('PLATER.services.util.graph_adapter.config', {'graph_snapshot_dir': str(tmpdir),
+                                                                       'hub_min_degree': 1000,
+                                                                       'hub_index_write': 'true'})
+    graph_interface = GraphInterface._GraphInterface('localhost', 7474, ('neo4j', 'pass'), build_tag='build-1')
+    graph_interface.schema, graph_interface.summary = {'gene': {}}, {'gene': {'nodes_count': 1}}
+    assert not graph_interface.covers_connectivity(3000)
+    event_loop = asyncio.new_event_loop()
+    # even when started from within a request, the scan runs without its deadline
+    event_loop.run_until_complete(deadline.run_within(graph_interface.build_hub_index(), 10))
+    event_loop.run_until_complete(graph_interface.build_hub_index())
+    event_loop.close()
+    assert len(queries) == 2
+    assert 'REMOVE n.plater_degree' in queries[0][0]
+    assert 'SET n.plater_degree = degree' in queries[1][0] and queries[1][1] == {'min_degree': 1000}
+    assert [remaining for _, _, remaining in queries] == [None, None]
+    assert graph_interface.covers_connectivity(3000)
+    # below what the index holds
+    assert not graph_interface.covers_connectivity(10)
+    assert graph_interface.snapshot.load()['hub_index'] == {'min_degree': 1000, 'nodes': 2}
+
+
+def test_hub_index_is_only_written_when_asked_for(driver, monkeypatch):
+    queries = []
+
+    async def run(query, parameters=None):
+        queries.append(query)
+        raise RuntimeWarning('Writing is not allowed on a read only database.')
+
+    monkeypatch.setattr(driver, 'run', run)
+    monkeypatch.setattr('PLATER.services.util.graph_adapter.Neo4jHTTPDriver', lambda **kwargs: driver)
+    monkeypatch.setattr('PLATER.services.util.graph_adapter.config', {})
+    graph_interface = GraphInterface._GraphInterface('localhost', 7474, ('neo4j', 'pass'))
+    event_loop = asyncio.new_event_loop()
+    assert event_loop.run_until_complete(graph_interface.build_hub_index()) is None
+    assert queries == []
+    # a failed write leaves the index unbuilt, queries count degrees
+    monkeypatch.setattr('PLATER.services.util.graph_adapter.config', {'hub_index_write': 'true'})
+    assert event_loop.run_until_complete(graph_interface.build_hub_index()) is None
+    event_loop.close()
+    assert len(queries) == 1
+    assert not graph_interface.covers_connectivity(3000)
+
+
+def test_queries_under_a_deadline_run_in_open_transactions(driver, monkeypatch):
+    calls = []
+
+    class Content:
+        eof = False
+
+        def at_eof(self):
+            return self.eof
+
+    class Response:
+        def __init__(self, delay=0):
+            self.status = 201
+            self.headers = {'Location': 'http://localhost:7474/db/data/transaction/7'}
+            self.content = Content()
+            self.delay = delay
+
+        async def json(self):
+            await asyncio.sleep(self.delay)
+            self.content.eof = True
+            return {'results': [{'columns': ['n'], 'data': [{'row': [1]}]}], 'errors': []}
+
+        async def __aenter__(self):
+            return self
+
+        async def __aexit__(self, *args):
+            pass
+
+    class Session:
+        delay = 0
+
+        def post(self, url, json=None, timeout=None):
+            calls.append(('POST', url))
+            return Response(self.delay)
+
+        def delete(self, url):
+            calls.append(('DELETE', url))
+            return Response()
+
+    session = Session()
+    monkeypatch.setattr(driver, 'get_session', lambda: session)
+
+    async def run_query(timeout):
+        try:
+            return await deadline.run_within(driver.run('RETURN 1'), timeout)
+        finally:
+            # let the termination go out
+            await asyncio.sleep(0.01)
+
+    event_loop = asyncio.new_event_loop()
+    response = event_loop.run_until_complete(run_query(10))
+    assert driver.convert_to_dict(response) == [{'n': 1}]
+    assert calls == [('POST', 'http://localhost:7474/db/data/transaction'),
+                     ('POST', 'http://localhost:7474/db/data/transaction/7/commit')]
+    # abandoned queries are terminated on neo4j
+    calls.clear()
+    session.delay = 10
+    with pytest.raises(asyncio.TimeoutError):
+        event_loop.run_until_complete(run_query(0.01))
+    assert calls == [('POST', 'http://localhost:7474/db/data/transaction'),
+                     ('DELETE', 'http://localhost:7474/db/data/transaction/7')]
+    # without a deadline statements commit on their own
+    calls.clear()
+    session.delay = 0
+    event_loop.run_until_complete(driver.run('RETURN 1'))
+    assert calls == [('POST', 'http://localhost:7474/db/data/transaction/commit')]
+    event_loop.close()
@@ -1,6 +1,8 @@
 import asyncio
+import copy
 import pytest
 from PLATER.services.util.overlay import Overlay
+from PLATER.services.util.support_edge_cache import SupportEdgeCache
 
 
 @pytest.fixture()
@@ -42,10 +44,14 @@ def graph_interface_apoc_supported():
 
 
 @pytest.fixture()
-def graph_interface_apoc_unsupported():
+def graph_interface_apoc_unsupported(graph_interface_apoc_supported):
     class MockGI:
         def supports_apoc(self):
-            return True
+            return False
+
+        async def run_node_set_edges(self, idlist):
+            # same edges apoc would have found
+            return await graph_interface_apoc_supported.run_apoc_cover(idlist)
 
     return MockGI()
 
@@ -132,3 +138,100 @@ def test_overlay_adds_support_bindings(graph_interface_apoc_supported, reasoner_
             assert 'SUPPORT_EDGE_KG_ID_1' in all_edge_kg_ids or 'SUPPORT_EDGE_KG_ID_2' in all_edge_kg_ids
             checked = True
     assert checked
+
+
+def test_overlay_runs_chunks_concurrently(graph_interface_apoc_supported, reasoner_json):
+    run_apoc_cover = graph_interface_apoc_supported.run_apoc_cover
+    in_flight = {'now': 0, 'peak': 0}
+
+    async def slow_apoc_cover(idlist):
+        in_flight['now'] += 1
+        in_flight['peak'] = max(in_flight['peak'], in_flight['now'])
+        # earlier chunks finish last
+        await asyncio.sleep(0.01 if 'NODE:0' in idlist else 0)
+        in_flight['now'] -= 1
+        return await run_apoc_cover(idlist)
+
+    graph_interface_apoc_supported.run_apoc_cover = slow_apoc_cover
+    ov = Overlay(graph_interface=graph_interface_apoc_supported)
+    ov.chunk_size = 1
+    ov.concurrency = 2
+    expected_order = [answer['node_bindings'][0]['kg_id'] for answer in reasoner_json['results']]
+    event_loop = asyncio.get_event_loop()
+    response = event_loop.run_until_complete(ov.overlay_support_edges(reasoner_json))
+    assert in_flight['peak'] == 2
+    # answers keep their order
+    assert [answer['node_bindings'][0]['kg_id'] for answer in response['results']] == expected_order
+    edge_ids = [edge['id'] for edge in response['knowledge_graph']['edges']]
+    assert sorted(edge_ids) == ['SUPPORT_EDGE_KG_ID_1', 'SUPPORT_EDGE_KG_ID_2']
+    assert response['results'][0]['edge_bindings'][-1] == {'qg_id': 's_0', 'kg_id': 'SUPPORT_EDGE_KG_ID_1'}
+
+
+def test_overlay_reuses_cached_node_pairs(graph_interface_apoc_supported, reasoner_json):
+    run_apoc_cover = graph_interface_apoc_supported.run_apoc_cover
+    queried = []
+
+    async def recording_apoc_cover(idlist):
+        queried.append(sorted(idlist))
+        return await run_apoc_cover(idlist)
+
+    graph_interface_apoc_supported.run_apoc_cover = recording_apoc_cover
+    cache = SupportEdgeCache()
+    event_loop = asyncio.get_event_loop()
+    first = event_loop.run_until_complete(
+        Overlay(graph_interface_apoc_supported, cache).overlay_support_edges(copy.deepcopy(reasoner_json)))
+    assert len(queried) == 1
+    second = event_loop.run_until_complete(
+        Overlay(graph_interface_apoc_supported, cache).overlay_support_edges(copy.deepcopy(reasoner_json)))
+    # every pair was seen before, neo4j is not asked again
+    assert len(queried) == 1
+    assert first == second
+    # only the new answer's nodes are looked up
+    reasoner_json['results'].append({
+        'node_bindings': [{'qg_id': 'n0', 'kg_id': 'NODE:0'}, {'qg_id': 'n1', 'kg_id': 'NODE:3'}],
+        'edge_bindings': []
+    })
+    event_loop.run_until_complete(Overlay(graph_interface_apoc_supported, cache).overlay_support_edges(reasoner_json))
+    assert queried[1] == ['NODE:0', 'NODE:3']
+
+
+def test_overlay_without_apoc(graph_interface_apoc_supported, graph_interface_apoc_unsupported, reasoner_json):
+    event_loop = asyncio.get_event_loop()
+    with_apoc = event_loop.run_until_complete(
+        Overlay(graph_interface_apoc_supported).overlay_support_edges(copy.deepcopy(reasoner_json)))
+    without_apoc = event_loop.run_until_complete(
+        Overlay(graph_interface_apoc_unsupported).overlay_support_edges(copy.deepcopy(reasoner_json)))
+    assert len(without_apoc['results']) == len(reasoner_json['results'])
+    assert with_apoc == without_apoc
+
+
+def test_overlay_set_bindings_and_self_loops():
+    class MockGI:
+        def supports_apoc(self):
+            return True
+
+        async def run_apoc_cover(self, idlist):
+            return [{'result': [
+                {'source_id': 'A', 'target_id': 'A', 'edge': {'id': 'SELF_LOOP'}},
+                {'source_id': 'A', 'target_id': 'B', 'edge': {'id': 'A_B'}},
+                {'source_id': 'C', 'target_id': 'A', 'edge': {'id': 'C_A'}},
+                {'source_id': 'B', 'target_id': 'C', 'edge': {'id': 'B_C'}}
+            ]}]
+
+    reasoner_json = {
+        'query_graph': {},
+        'knowledge_graph': {'nodes': [], 'edges': []},
+        'results': [
+            {'node_bindings': [{'qg_id': 'n0', 'kg_id': 'A'}, {'qg_id': 'n1', 'kg_id': ['B', 'C']}],
+             'edge_bindings': []},
+            {'node_bindings': [{'qg_id': 'n0', 'kg_id': 'A'}, {'qg_id': 'n1', 'kg_id': 'A'}],
+             'edge_bindings': []}
+        ]
+    }
+    response = asyncio.get_event_loop().run_until_complete(Overlay(MockGI()).overlay_support_edges(reasoner_json))
+    first, second = response['results']
+    assert sorted(binding['kg_id'] for binding in first['edge_bindings']) == ['A_B', 'B_C', 'C_A']
+    assert sorted(binding['qg_id'] for binding in first['edge_bindings']) == ['s_0', 's_1', 's_2']
+    # a node is not related to itself
+    assert second['edge_bindings'] == []
+    assert sorted(edge['id'] for edge in response['knowledge_graph']['edges']) == ['A_B', 'B_C', 'C_A']
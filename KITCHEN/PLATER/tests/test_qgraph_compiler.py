@@ -1,4 +1,5 @@
-from PLATER.services.util.qgraph_compiler import cypher_query_answer_map
+from PLATER.services.util.qgraph_compiler import cypher_query_answer_map, cypher_query_answer_map_parameterized, \
+    _compile_cypher_template, cypher_name, cypher_parameter_name
 import pytest
 
 @pytest.fixture()
@@ -59,3 +60,77 @@ def test_cypher_generated_for_a_query_graph(question_graph, question_graph_with_
     cypher = cypher_query_answer_map(question_graph)
     cypher_expected = """MATCH (n0:`type1` {`id`: 'SOME:CURIE'})-[e0:edge-type]->(n1:`type2`) USING INDEX n0:type1(id) WITH [n0] AS n0, [n1] AS n1, collect(DISTINCT e0) AS e0 RETURN [ni IN n0 | {qg_id:'n0', kg_id:ni.id, node: ni, type: labels(ni) }] + [ni IN n1 | {qg_id:'n1', kg_id:ni.id, node: ni, type: labels(ni) }] AS nodes, [ei IN e0 | {qg_id:'e0', kg_id:ei.id, edge: ei, type: type(ei) }] AS edges"""
     assert cypher == cypher_expected
+
+
+def test_parameterized_cypher_generated_for_a_query_graph(question_graph_with_properties):
+    cypher, parameters = cypher_query_answer_map_parameterized(question_graph_with_properties)
+    assert "SOME:CURIE" not in cypher
+    assert "SOME:OTHER_CURIE1" not in cypher
+    assert "(n0:`type1` {`id`: $node0_id})" in cypher
+    assert "n1.id IN $node1_curie" in cypher
+    assert parameters == {'node0_id': 'SOME:CURIE', 'node1_curie': ['SOME:OTHER_CURIE1']}
+
+
+def test_parameterized_cypher_is_shared_by_query_graphs_of_same_shape(question_graph):
+    _compile_cypher_template.cache_clear()
+    cypher, parameters = cypher_query_answer_map_parameterized(question_graph)
+    question_graph['nodes'][0]['curie'] = 'SOME:OTHER_CURIE'
+    other_cypher, other_parameters = cypher_query_answer_map_parameterized(question_graph)
+    assert cypher == other_cypher
+    assert parameters == {'node0_id': 'SOME:CURIE'}
+    assert other_parameters == {'node0_id': 'SOME:OTHER_CURIE'}
+    assert _compile_cypher_template.cache_info().hits == 1
+
+
+@pytest.mark.parametrize('curie', [None, []])
+def test_unset_curies_leave_nodes_unpinned(question_graph, curie):
+    unpinned_cypher, _ = cypher_query_answer_map_parameterized(question_graph)
+    question_graph['nodes'][1]['curie'] = curie
+    cypher, parameters = cypher_query_answer_map_parameterized(question_graph)
+    assert cypher == unpinned_cypher
+    assert parameters == {'node0_id': 'SOME:CURIE'}
+    assert 'USING INDEX n1' not in cypher
+    assert 'USING INDEX n1' not in cypher_query_answer_map(question_graph)
+
+
+def test_parameter_names_are_distinct(question_graph):
+    question_graph['nodes'] = [{'id': 'n-0', 'type': 'type1', 'curie': 'A:1'},
+                               {'id': 'n_0', 'type': 'type1', 'curie': 'A:2'}]
+    question_graph['edges'][0].update(source_id='n-0', target_id='n_0')
+    _, parameters = cypher_query_answer_map_parameterized(question_graph)
+    assert sorted(parameters.values()) == ['A:1', 'A:2']
+    assert cypher_parameter_name(0, 'a-b') != cypher_parameter_name(0, 'a_b')
+    assert cypher_parameter_name(0, 'a_b') != cypher_parameter_name(0, 'a_2d_b')
+    assert all(name.startswith('node') for name in parameters)
+
+
+def test_internal_relationship_ids(question_graph):
+    cypher, _ = cypher_query_answer_map_parameterized(question_graph, relationship_id='internal')
+    assert "[ei IN e0 | {qg_id:'e0', kg_id:ei.id, internal_id:id(ei), edge: ei, type: type(ei) }]" in cypher
+    cypher, _ = cypher_query_answer_map_parameterized(question_graph)
+    assert 'internal_id' not in cypher
+
+
+def test_exclude_hubs(question_graph):
+    cypher, parameters = cypher_query_answer_map_parameterized(question_graph, exclude_hubs=True)
+    # only the node not pinned to a curie is filtered.
+    assert 'WHERE (coalesce(n1.plater_degree, 0) < $max_connectivity)' in cypher
+    assert 'n0.plater_degree' not in cypher
+    cypher, _ = cypher_query_answer_map_parameterized(question_graph)
+    assert 'plater_degree' not in cypher
+
+
+def test_max_connectivity_filters_the_nodes_exclude_hubs_does(question_graph):
+    # pinning a hub still finds it while the hub index isn't there
+    question_graph['edges'][0].update(source_id='n1', target_id='n0')
+    cypher, _ = cypher_query_answer_map_parameterized(question_graph, max_connectivity=100)
+    assert 'WHERE (size( (n1)-[]-() ) < 100)' in cypher
+    assert 'size( (n0)' not in cypher
+
+
+def test_attribute_projection_quoting(question_graph):
+    assert cypher_name('name') == '`name`'
+    assert cypher_name('na`me') == '`na``me`'
+    cypher, _ = cypher_query_answer_map_parameterized(question_graph, node_attributes=('id', 'na`me'),
+                                                      edge_attributes=('id',))
+    assert 'ni{.`id`, .`na``me`}' in cypher
@@ -0,0 +1,81 @@
+import pytest
+from PLATER.services.util.qgraph_compiler import cypher_query_answer_map_parameterized
+from PLATER.services.util.qgraph_planner import GraphStatistics, plan_edge_order
+from PLATER.services.util.question import Question
+
+
+@pytest.fixture()
+def summary():
+    return {
+        'named_thing:gene': {
+            'nodes_count': 20000,
+            'named_thing:disease': {'gene_to_disease': 100000}
+        },
+        'named_thing:disease': {
+            'nodes_count': 10000
+        },
+        'named_thing:chemical_substance': {
+            'nodes_count': 50000,
+            'named_thing:disease': {'treats': 5000}
+        }
+    }
+
+
+@pytest.fixture()
+def two_hop_question_graph():
+    # the only pinned node is at the end of the query graph
+    return {
+        'nodes': [
+            {'id': 'n0', 'type': 'gene'},
+            {'id': 'n1', 'type': 'disease'},
+            {'id': 'n2', 'type': 'chemical_substance', 'curie': 'CHEBI:1'}
+        ],
+        'edges': [
+            {'id': 'e0', 'type': 'gene_to_disease', 'source_id': 'n0', 'target_id': 'n1'},
+            {'id': 'e1', 'type': 'treats', 'source_id': 'n2', 'target_id': 'n1'}
+        ]
+    }
+
+
+def test_graph_statistics(summary):
+    statistics = GraphStatistics(summary)
+    assert statistics.node_count(['named_thing']) == 80000
+    assert statistics.node_count(['gene']) == 20000
+    assert statistics.edge_count(['named_thing'], ['disease']) == 105000
+    assert statistics.edge_count(['chemical_substance'], ['disease'], ['treats']) == 5000
+    assert statistics.edge_count(['disease'], ['gene']) == 0
+
+
+def test_plan_starts_at_pinned_node(summary, two_hop_question_graph):
+    assert plan_edge_order(two_hop_question_graph, summary) == [('e1', False), ('e0', True)]
+    assert plan_edge_order(two_hop_question_graph, None) is None
+    cypher, _ = cypher_query_answer_map_parameterized(
+        two_hop_question_graph, edge_order=tuple(plan_edge_order(two_hop_question_graph, summary)))
+    assert cypher.startswith(
+        "MATCH (n2:`chemical_substance` {`id`: $node2_id})-[e1:treats]->(n1:`disease` {}) "
+        "USING INDEX n2:chemical_substance(id) MATCH (n1)<-[e0:gene_to_disease]-(n0:`gene` {}) "
+    )
+
+
+def test_plan_prefers_selective_expansion(summary):
+    # from a pinned disease, treats (0.5 per disease) is cheaper to cross than gene_to_disease (10 per disease)
+    question_graph = {
+        'nodes': [
+            {'id': 'n0', 'type': 'gene'},
+            {'id': 'n1', 'type': 'disease', 'curie': 'MONDO:1'},
+            {'id': 'n2', 'type': 'chemical_substance'}
+        ],
+        'edges': [
+            {'id': 'e0', 'type': 'gene_to_disease', 'source_id': 'n0', 'target_id': 'n1'},
+            {'id': 'e1', 'type': 'treats', 'source_id': 'n2', 'target_id': 'n1'}
+        ]
+    }
+    assert plan_edge_order(question_graph, summary) == [('e1', True), ('e0', True)]
+
+
+def test_question_uses_plan_when_summary_is_known(summary, two_hop_question_graph):
+    question = Question({'query_graph': two_hop_question_graph})
+    planned, _ = question.compile_cypher(summary)
+    assert planned.startswith('MATCH (n2:`chemical_substance`')
+    unplanned, _ = question.compile_cypher()
+    assert unplanned.startswith('MATCH (n0:`gene`')
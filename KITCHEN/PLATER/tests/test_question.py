@@ -0,0 +1,242 @@
+import asyncio
+import json
+import pytest
+from PLATER.services.util.question import Question
+
+
+@pytest.fixture()
+def graph_interface():
+    class MockGI:
+        answer_rows = [
+            {
+                'nodes': [{'qg_id': 'n0', 'kg_id': 'NODE:0'}, {'qg_id': 'n1', 'kg_id': 'NODE:1'}],
+                'edges': [{'qg_id': 'e0', 'kg_id': 'EDGE:0', 'internal_id': 0}]
+            },
+            {
+                'nodes': [{'qg_id': 'n0', 'kg_id': 'NODE:0'}, {'qg_id': 'n1', 'kg_id': 'NODE:2'}],
+                'edges': [{'qg_id': 'e0', 'kg_id': 'EDGE:1'}]
+            }
+        ]
+
+        async def run_cypher_batched(self, cypher, parameters=None):
+            return [row async for row in self.stream_cypher(cypher, parameters)]
+
+        edges_by_index = []
+        cyphers = []
+
+        async def stream_cypher(self, cypher, parameters=None):
+            self.cyphers.append(cypher)
+            if 'queryRelationships' in cypher:
+                self.edges_by_index += parameters['batch'].split(' ')
+                yield {'edges': [{'id': edge_id, 'type': 'related_to'}
+                                 for edge_id in parameters['batch'].split(' ')]}
+            elif 'id(e) IN $ids' in cypher:
+                yield {'edges': [{'id': f'EDGE:{internal_id}', 'type': 'related_to'}
+                                 for internal_id in parameters['ids']]}
+            elif 'MATCH (node:named_thing)' in cypher:
+                yield {'nodes': [{'node': {'id': node_id}, 'type': ['named_thing']}
+                                 for node_id in parameters['node_ids']]}
+            else:
+                for row in self.answer_rows:
+                    yield row
+
+    return MockGI()
+
+
+@pytest.fixture()
+def question_json():
+    return {
+        'query_graph': {
+            'nodes': [
+                {'id': 'n0', 'type': 'named_thing', 'curie': 'NODE:0'},
+                {'id': 'n1', 'type': 'named_thing'}
+            ],
+            'edges': [
+                {'id': 'e0', 'source_id': 'n0', 'target_id': 'n1'}
+            ]
+        }
+    }
+
+
+def sort_kg(response):
+    for key in ['nodes', 'edges']:
+        response['knowledge_graph'][key].sort(key=lambda item: item['id'])
+    return response
+
+
+def test_answer(graph_interface, question_json):
+    event_loop = asyncio.get_event_loop()
+    response = event_loop.run_until_complete(Question(question_json).answer(graph_interface))
+    assert len(response['results']) == 2
+    assert response['results'][0]['node_bindings'] == [{'kg_id': 'NODE:0', 'qg_id': 'n0'},
+                                                      {'kg_id': 'NODE:1', 'qg_id': 'n1'}]
+    assert set(node['id'] for node in response['knowledge_graph']['nodes']) == {'NODE:0', 'NODE:1', 'NODE:2'}
+    assert set(edge['id'] for edge in response['knowledge_graph']['edges']) == {'EDGE:0', 'EDGE:1'}
+    # only the edge without a neo4j id goes through the full-text index
+    assert graph_interface.edges_by_index == ['EDGE:1']
+    assert 'internal_id' not in json.dumps(response['results'])
+
+
+def test_answer_stream_matches_answer(graph_interface, question_json):
+    async def collect():
+        return ''.join([piece async for piece in Question(question_json).answer_stream(graph_interface)])
+
+    event_loop = asyncio.get_event_loop()
+    streamed = json.loads(event_loop.run_until_complete(collect()))
+    response = event_loop.run_until_complete(Question(question_json).answer(graph_interface))
+    assert sort_kg(streamed) == sort_kg(response)
+
+
+def test_inline_knowledge_graph(graph_interface, question_json):
+    graph_interface.answer_rows = [
+        {
+            'nodes': [{'qg_id': 'n0', 'kg_id': 'NODE:0', 'node': {'id': 'NODE:0'}, 'type': ['named_thing']},
+                      {'qg_id': 'n1', 'kg_id': 'NODE:1', 'node': {'id': 'NODE:1'}, 'type': ['named_thing']}],
+            'edges': [{'qg_id': 'e0', 'kg_id': 'EDGE:0', 'internal_id': 0, 'source_id': 'NODE:0',
+                       'target_id': 'NODE:1', 'edge': {'id': 'EDGE:0'}, 'type': 'related_to'}]
+        },
+        {
+            'nodes': [{'qg_id': 'n0', 'kg_id': 'NODE:0', 'node': {'id': 'NODE:0'}, 'type': ['named_thing']},
+                      {'qg_id': 'n1', 'kg_id': 'NODE:2', 'node': {'id': 'NODE:2'}, 'type': ['named_thing']}],
+            'edges': [{'qg_id': 'e0', 'kg_id': 'EDGE:1', 'internal_id': 1, 'source_id': 'NODE:2',
+                       'target_id': 'NODE:0', 'edge': {'id': 'EDGE:1'}, 'type': 'related_to'}]
+        }
+    ]
+    question = Question(question_json, knowledge_graph_mode=Question.INLINE_KNOWLEDGE_GRAPH)
+    assert 'source_id:startNode(ei).id' in question.compile_cypher()[0]
+
+    async def collect():
+        return ''.join([piece async for piece in question.answer_stream(graph_interface)])
+
+    event_loop = asyncio.get_event_loop()
+    response = event_loop.run_until_complete(question.answer(graph_interface))
+    assert graph_interface.edges_by_index == []
+    assert response['knowledge_graph'] == {
+        'nodes': [{'id': 'NODE:0', 'type': ['named_thing']}, {'id': 'NODE:1', 'type': ['named_thing']},
+                  {'id': 'NODE:2', 'type': ['named_thing']}],
+        'edges': [{'id': 'EDGE:0', 'source_id': 'NODE:0', 'target_id': 'NODE:1', 'type': 'related_to'},
+                  {'id': 'EDGE:1', 'source_id': 'NODE:2', 'target_id': 'NODE:0', 'type': 'related_to'}]
+    }
+    assert json.loads(event_loop.run_until_complete(collect())) == response
+
+
+def test_attribute_projection(graph_interface, question_json):
+    event_loop = asyncio.get_event_loop()
+    question = Question(question_json, attributes=['name'])
+    response = event_loop.run_until_complete(question.answer(graph_interface))
+    node_cypher = [cypher for cypher in graph_interface.cyphers if 'MATCH (node:named_thing)' in cypher][0]
+    assert 'node{.`id`, .`name`}' in node_cypher
+    edge_cyphers = [cypher for cypher in graph_interface.cyphers if 'edges' in cypher and 'RETURN collect' in cypher]
+    assert edge_cyphers and all('`name`:e.`name`' in cypher and '.*' not in cypher for cypher in edge_cyphers)
+    assert set(node['id'] for node in response['knowledge_graph']['nodes']) == {'NODE:0', 'NODE:1', 'NODE:2'}
+    inline = Question(question_json, knowledge_graph_mode=Question.INLINE_KNOWLEDGE_GRAPH, attributes=['name'])
+    cypher, _ = inline.compile_cypher()
+    assert 'node: ni{.`id`, .`name`}' in cypher
+    assert 'edge: ei{.`id`, .`name`}' in cypher
+    assert Question.drop_missing_attributes({'id': 'NODE:0', 'name': None}) == {'id': 'NODE:0'}
+
+
+def test_nodes_without_the_named_thing_label_are_yanked(graph_interface, question_json):
+    labelled_cypher = []
+    run_other_cypher = graph_interface.run_cypher_batched
+
+    async def run_cypher_batched(cypher, parameters=None):
+        if 'MATCH (node' not in cypher:
+            return await run_other_cypher(cypher, parameters)
+        labelled_cypher.append('NOT node:named_thing' not in cypher)
+        if 'NOT node:named_thing' in cypher:
+            return [{'nodes': [{'node': {'id': node_id}, 'type': ['gene']} for node_id in parameters['node_ids']]}]
+        return [{'nodes': [{'node': {'id': 'NODE:0'}, 'type': ['named_thing']}]}]
+
+    graph_interface.run_cypher_batched = run_cypher_batched
+    response = asyncio.get_event_loop().run_until_complete(Question(question_json).answer(graph_interface))
+    assert sorted((node['id'], node['type']) for node in response['knowledge_graph']['nodes']) == [
+        ('NODE:0', ['named_thing']), ('NODE:1', ['gene']), ('NODE:2', ['gene'])]
+    # the unlabelled lookup only runs for the ids the labelled one missed
+    assert labelled_cypher.count(False) == 1
+
+
+def test_attribute_names_are_checked(question_json):
+    for attribute in ['name`}) DETACH DELETE n //', 'na me', '']:
+        with pytest.raises(AssertionError):
+            Question(question_json, attributes=[attribute])
+
+
+def test_nodes_and_edges_are_yanked_together(question_json):
+    class MockGI:
+        in_flight = 0
+        peak = 0
+        node_chunks = []
+
+        async def run_cypher_batched(self, cypher, parameters=None):
+            MockGI.in_flight += 1
+            MockGI.peak = max(MockGI.peak, MockGI.in_flight)
+            await asyncio.sleep(0.01)
+            MockGI.in_flight -= 1
+            if 'MATCH (node:named_thing)' in cypher:
+                MockGI.node_chunks.append(len(parameters['node_ids']))
+                return [{'nodes': [{'node': {'id': node_id}, 'type': ['named_thing']}
+                                   for node_id in parameters['node_ids']]}]
+            return [{'edges': [{'id': edge_id} for edge_id in parameters['batch'].split(' ')]}]
+
+    node_ids = [f'NODE:{i}' for i in range(1500)]
+    properties = asyncio.get_event_loop().run_until_complete(
+        Question(question_json).get_properties(MockGI(), ['EDGE:0'], node_ids))
+    assert sorted(MockGI.node_chunks) == [476, 1024]
+    # both node chunks and the edge chunk were in flight at once
+    assert MockGI.peak == 3
+    assert len(properties['nodes']) == 1500
+    assert properties['edges'] == [{'id': 'EDGE:0'}]
+
+
+def test_max_results(graph_interface, question_json):
+    question = Question(question_json, max_results=1)
+    cypher, parameters = question.compile_cypher()
+    assert cypher.endswith(' LIMIT $result_limit')
+    assert parameters['result_limit'] == 2
+
+    async def collect():
+        return ''.join([piece async for piece in Question(question_json, max_results=1).answer_stream(graph_interface)])
+
+    event_loop = asyncio.get_event_loop()
+    response = event_loop.run_until_complete(question.answer(graph_interface))
+    assert len(response['results']) == 1
+    assert response['truncated'] is True and response['max_results'] == 1
+    assert sort_kg(json.loads(event_loop.run_until_complete(collect()))) == sort_kg(response)
+    # nothing is said when everything fit
+    response = event_loop.run_until_complete(Question(question_json, max_results=2).answer(graph_interface))
+    assert len(response['results']) == 2
+    assert 'truncated' not in response
+
+
+def test_max_connectivity(graph_interface, question_json):
+    question = Question(question_json, max_connectivity=5000)
+    # without a hub index degrees are counted by the query
+    cypher, parameters = question.compile_cypher()
+    assert 'size( (n1)-[]-() ) < 5000' in cypher
+    cypher, parameters = question.compile_cypher(hub_index=True)
+    assert 'coalesce(n1.plater_degree, 0) < $max_connectivity' in cypher and 'size(' not in cypher
+    assert parameters['max_connectivity'] == 5000
+
+    graph_interface.covers_connectivity = lambda max_connectivity: max_connectivity >= 1000
+    asyncio.get_event_loop().run_until_complete(question.answer(graph_interface))
+    assert 'coalesce(n1.plater_degree, 0) < $max_connectivity' in graph_interface.cyphers[0]
+
+
+def test_interrupted_answer_stream_is_valid_json(graph_interface, question_json):
+    question = Question(question_json)
+    endings = [json.loads(question.stream_interruption('Timed out.'))]
+
+    async def collect():
+        pieces = []
+        async for piece in question.answer_stream(graph_interface):
+            pieces.append(piece)
+            ending = question.stream_interruption('Timed out.')
+            if ending:
+                endings.append(json.loads(''.join(pieces) + ending))
+        return ''.join(pieces)
+
+    event_loop = asyncio.get_event_loop()
+    assert 'truncated' not in json.loads(event_loop.run_until_complete(collect()))
+    assert all(ending['truncated'] and ending['Error'] == 'Timed out.' for ending in endings)
+    assert len(endings[-1]['results']) == 2
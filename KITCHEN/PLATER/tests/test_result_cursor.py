@@ -0,0 +1,98 @@
+import asyncio
+import pytest
+from PLATER.services.util import deadline
+from PLATER.services.util.result_cursor import CursorStore, CursorStoreFull
+
+
+def run(coroutine):
+    return asyncio.get_event_loop().run_until_complete(coroutine)
+
+
+async def count_to(n, closed):
+    try:
+        for i in range(n):
+            yield i
+    finally:
+        closed.append(True)
+
+
+def test_cursor_pages():
+    closed = []
+    store = CursorStore()
+    cursor = store.create('question', count_to(5, closed))
+    assert run(cursor.take(2)) == [0, 1] and cursor.has_next
+    assert store.get(cursor.id) is cursor
+    assert run(cursor.take(3)) == [2, 3, 4] and not cursor.has_next
+    run(store.release(cursor))
+    assert store.get(cursor.id) is None
+    assert closed == [True]
+
+
+def test_cursor_expiry_and_limit():
+    closed = []
+    store = CursorStore(ttl=0, max_cursors=2)
+    cursor = store.create('question', count_to(5, closed))
+    run(cursor.take(1))
+    cursor.expires = 0
+    assert store.get(cursor.id) is None
+    store.ttl = 300
+    first = store.create('question', count_to(5, closed))
+    run(first.take(1))
+    second = store.create('question', count_to(5, closed))
+    third = store.create('question', count_to(5, closed))
+    # oldest cursor makes room for the new one
+    assert store.get(first.id) is None
+    assert store.get(second.id) is second and store.get(third.id) is third
+    run(asyncio.sleep(0))
+    assert closed == [True, True]
+
+
+def test_busy_cursors_are_not_dropped():
+    closed = []
+    store = CursorStore(max_cursors=2)
+
+    async def open_cursors():
+        busy = store.create('question', count_to(5, closed))
+        idle = store.create('question', count_to(5, closed))
+        async with busy.lock:
+            # the idle cursor makes room, even though the busy one is older
+            newest = store.create('question', count_to(5, closed))
+            assert store.get(busy.id) is busy and store.get(idle.id) is None
+            async with newest.lock:
+                with pytest.raises(CursorStoreFull):
+                    store.create('question', count_to(5, closed))
+        await store.close()
+
+    run(open_cursors())
+
+
+def test_page_reads_are_bound_to_their_request():
+    closed = []
+    timeouts = []
+
+    async def slow_rows():
+        try:
+            for i in range(5):
+                # the query outlives the request starting it
+                timeouts.append(deadline.call_timeout())
+                await asyncio.sleep(0 if i < 2 else 10)
+                yield i
+        finally:
+            closed.append(True)
+
+    store = CursorStore()
+    cursor = store.create('question', slow_rows())
+    assert run(deadline.run_within(cursor.take(1), 10)) == [0]
+
+    async def take_page():
+        try:
+            await cursor.take(2)
+        finally:
+            await store.release(cursor)
+
+    # a page cut off by its deadline ends the cursor, and its query
+    with pytest.raises(asyncio.TimeoutError):
+        run(deadline.run_within(take_page(), 0.05))
+    assert timeouts == [None, None, None]
+    assert store.get(cursor.id) is None
+    assert closed == [True]
@@ -0,0 +1,29 @@
+from PLATER.services.util.support_edge_cache import SupportEdgeCache
+
+
+def test_pair_key_is_unordered():
+    assert SupportEdgeCache.pair_key('A', 'B') == SupportEdgeCache.pair_key('B', 'A') == ('A', 'B')
+
+
+def test_lru_eviction_by_bytes():
+    cache = SupportEdgeCache(max_bytes=3 * SupportEdgeCache.ENTRY_OVERHEAD)
+    cache.put(('A', 'B'), [])
+    cache.put(('A', 'C'), [])
+    # touch A-B so A-C is the least recently used
+    assert cache.get(('A', 'B')) == []
+    cache.put(('B', 'C'), [{'id': 'edge'}])
+    assert cache.get(('A', 'C')) is None
+    assert cache.get(('A', 'B')) == []
+    assert cache.get(('B', 'C')) == [{'id': 'edge'}]
+    assert cache.get_stats()['pairs'] == 2
+
+
+def test_validate_drops_entries_when_graph_changes():
+    cache = SupportEdgeCache()
+    cache.validate('build', {'nodeCount': 1})
+    cache.put(('A', 'B'), [])
+    # an equal fingerprint, even if a different object, keeps the entries
+    cache.validate('build', {'nodeCount': 1})
+    assert cache.get(('A', 'B')) == []
+    cache.validate('build', {'nodeCount': 2})
+    assert cache.get(('A', 'B')) is None
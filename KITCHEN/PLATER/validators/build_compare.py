@@ -14,8 +14,7 @@ class BuildComparisionValidator:
     def __init__(self, graph_interface, reset_summary=False):
         logger.info('initializing build comparision validator')
         self.graph_interface = graph_interface
-        self.graph_interface.get_schema()
-        self.summary = self.graph_interface.summary
+        self.summary = self.graph_interface.get_summary()
         self.reset_summary = reset_summary
         self.summary_file = os.path.join(os.path.dirname(__file__), '..', 'logs', 'graph_summary.json')
         # create new summary file if reset is set